@@ -4,41 +4,17 @@ import joblib
 from sklearn.ensemble import GradientBoostingClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
+import os
+import sys
 
-# --- 1. Cargar y procesar datos ---
-df = pd.read_csv("Training/training.csv")
-df.columns = df.columns.str.strip()
-df["fecha"] = pd.to_datetime(df["fecha"], format="%Y-%m-%d")
-df["mes"] = df["fecha"].dt.month
-df["anio"] = df["fecha"].dt.year
-df_2022 = df[df["anio"] == 2022]
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.future.features import features_entrenamiento_incremento, FEATURES_INCREMENTO
 
-# --- 2. Codificar variables categóricas ---
-for col in ["id", "comercio", "giro_comercio", "tipo_venta"]:
-    df_2022[col] = df_2022[col].astype(str).str.strip()
-
-giro_map = {v: i for i, v in enumerate(df_2022["giro_comercio"].unique())}
-tipo_map = {v: i for i, v in enumerate(df_2022["tipo_venta"].unique())}
-
-df_2022["giro_id"] = df_2022["giro_comercio"].map(giro_map).fillna(-1).astype(int)
-df_2022["tipo_venta_id"] = df_2022["tipo_venta"].map(tipo_map).fillna(-1).astype(int)
-
-# --- 3. Gasto mensual por cliente-comercio ---
-agg_monto = df_2022.groupby(["id", "comercio", "mes"])["monto"].sum().reset_index()
-pivot = agg_monto.pivot(index=["id", "comercio"], columns="mes", values="monto").fillna(0)
-pivot.columns = [f"mes_{col}" for col in pivot.columns]
-
-# --- 4. Enriquecer con variables adicionales ---
-agg_features = df_2022.groupby(["id", "comercio"]).agg({
-    "giro_id": lambda x: x.mode()[0] if not x.mode().empty else -1,
-    "tipo_venta_id": lambda x: x.mode()[0] if not x.mode().empty else -1
-}).reset_index()
-
-pivot = pivot.merge(agg_features, on=["id", "comercio"], how="left")
-
-# --- 5. Clasificar incremento ---
-pivot["delta"] = pivot["mes_8"] - pivot["mes_1"]
+# --- 1-4. Gasto mensual por cliente-comercio, con la moda de giro y tipo de venta ---
+# Se lee por bloques y se guarda en data/store/features/ (ver src/future/features.py)
+pivot = features_entrenamiento_incremento("Training/training.csv", anio=2022)
 
+# --- 5. Clasificar incremento (delta = mes_8 - mes_1) ---
 def clasificar_incremento(x):
     if x > 50:
         return "alto"
@@ -52,12 +28,7 @@ def clasificar_incremento(x):
 pivot["clase_inc"] = pivot["delta"].apply(clasificar_incremento)
 
 # --- 6. Features ---
-for m in range(1, 8):
-    col = f"mes_{m}"
-    if col not in pivot.columns:
-        pivot[col] = 0.0
-
-features = [f"mes_{m}" for m in range(1, 8)] + ["giro_id", "tipo_venta_id"]
+features = FEATURES_INCREMENTO
 X = pivot[features]
 y = pivot["clase_inc"]
 
@@ -4,59 +4,22 @@ import joblib
 from sklearn.ensemble import GradientBoostingRegressor, GradientBoostingClassifier
 from sklearn.metrics import mean_squared_error, mean_absolute_error, accuracy_score, f1_score
 from sklearn.model_selection import train_test_split
-
-# --- 1. Cargar CSVs ---
-train_df = pd.read_csv("Training/training.csv")
-val_df = pd.read_csv("Training/validation.csv")
-test_df = pd.read_csv("Training/test.csv")
-
-# --- 2. Procesar fechas y columnas ---
-for df in [train_df, val_df, test_df]:
-    df.columns = df.columns.str.strip()
-    df["fecha"] = pd.to_datetime(df["fecha"], format="%Y-%m-%d")
-    df["mes"] = df["fecha"].dt.month
-    df["anio"] = df["fecha"].dt.year
-    df["dia_semana"] = df["fecha"].dt.dayofweek
-    df["trimestre"] = df["fecha"].dt.quarter
-    df["es_fin_de_semana"] = df["dia_semana"].isin([5, 6]).astype(int)
-
-# --- 3. Crear diccionarios de codificación ---
-cliente_map = {v: i for i, v in enumerate(train_df["id"].astype(str).str.strip().unique())}
-comercio_map = {v: i for i, v in enumerate(train_df["comercio"].astype(str).str.strip().unique())}
-giro_map = {v: i for i, v in enumerate(train_df["giro_comercio"].astype(str).str.strip().unique())}
-tipo_map = {v: i for i, v in enumerate(train_df["tipo_venta"].astype(str).str.strip().unique())}
-
-# --- 4. Función de mapeo robusto ---
-def mapear(df):
-    df["id"] = df["id"].astype(str).str.strip()
-    df["comercio"] = df["comercio"].astype(str).str.strip()
-    df["giro_comercio"] = df["giro_comercio"].astype(str).str.strip()
-    df["tipo_venta"] = df["tipo_venta"].astype(str).str.strip()
-
-    df["cliente_id"] = df["id"].map(cliente_map).fillna(-1).astype(int)
-    df["comercio_id"] = df["comercio"].map(comercio_map).fillna(-1).astype(int)
-    df["giro_id"] = df["giro_comercio"].map(giro_map).fillna(-1).astype(int)
-    df["tipo_venta_id"] = df["tipo_venta"].map(tipo_map).fillna(-1).astype(int)
-    return df
-
-train_df = mapear(train_df)
-val_df = mapear(val_df)
-test_df = mapear(test_df)
-
-# --- 5. Agregar columna de clasificación binaria ---
-for df in [train_df, val_df, test_df]:
-    df["comprara"] = (df["monto"] > 0).astype(int)
-
-# --- 6. Agrupar por cliente y comercio ---
-def agregar_por_comercio(df):
-    return df.groupby([
-        "cliente_id", "comercio_id", "giro_id", "tipo_venta_id",
-        "mes", "anio", "dia_semana", "trimestre", "es_fin_de_semana"
-    ]).agg(monto=("monto", "sum"), comprara=("comprara", "max")).reset_index()
-
-train_agg = agregar_por_comercio(train_df)
-val_agg = agregar_por_comercio(val_df)
-test_agg = agregar_por_comercio(test_df)
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.future.features import features_entrenamiento_dual, FEATURES_DUAL
+
+# --- 1-6. Features: fechas, mapas de codificación y agregado por cliente y comercio ---
+# Se leen por bloques y se guardan en data/store/features/ (ver src/future/features.py):
+# mientras los CSV no cambien, las siguientes corridas empiezan desde ahí.
+mapas, (train_agg, val_agg, test_agg) = features_entrenamiento_dual(
+    "Training/training.csv", ["Training/validation.csv", "Training/test.csv"]
+)
+cliente_map = mapas["map_cliente"]
+comercio_map = mapas["map_comercio"]
+giro_map = mapas["map_giro"]
+tipo_map = mapas["map_tipo"]
 
 # --- 7. Limitar valores extremos ---
 clip_val = train_agg["monto"].quantile(0.95)
@@ -76,10 +39,7 @@ ejemplos_sinteticos = pd.DataFrame([
 train_agg = pd.concat([train_agg, ejemplos_sinteticos], ignore_index=True)
 
 # --- 9. Preparar features y targets ---
-features = [
-    "cliente_id", "comercio_id", "giro_id", "tipo_venta_id",
-    "mes", "anio", "dia_semana", "trimestre", "es_fin_de_semana"
-]
+features = FEATURES_DUAL
 
 X_train = train_agg[features]
 y_train_reg = np.log1p(train_agg["monto"])
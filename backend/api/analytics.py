@@ -1,165 +1,292 @@
 # api/routes.py
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Body, Request, Response
+from fastapi.encoders import jsonable_encoder
 from src.past.read import *
 from src.past.wrapped import *
 from src.past.frequency import *
+import os
 import json
+import time
+import asyncio
+import hashlib
 from src.future.incremento import *
+from src.past.usuarios import datos_usuario, usuarios_cache
+from src.past.rollups import rollups_vigentes, construir_rollups, instalar_rollups, _firma, TRANSACCIONES_PATH, CLIENTES_PATH
+from src.past.suscripciones import get_suscripciones_precalculadas
+from src.future.precalculo import get_prediccion_precalculada
 import pandas as pd
 from datetime import datetime
 import calendar
+from typing import Optional
+from fastapi.responses import JSONResponse
+from src.past.ingest import ingestar, estadisticas_ingesta
+from src.ejecucion import modelos, analisis, PoolSaturado
+from src.cache import LRUCache, singleflight
+from src.past.snapshots import SLIDES_PASADO, get_snapshot
+from src.past.agregados import normalizar_consulta, ConsultaInvalida, PresupuestoExcedido
+from src.past.store import get_store
+from api import tareas
 
 router = APIRouter()
 
-# Configura tu usuario y fechas
-user_id = "6895dcebb7d7daf7e40aae43a2ea0cce91bffd4d"
-month = 5
-year = 2022
-movements = get_transaction(user_id)
-movements_year = get_transaction_year(movements, year)
-movements_month = get_transaction_month(movements_year, month)
-total_spend = yearly_total_spent(movements_year)
-state_name, coord = get_estado_from_person_id(user_id)
+# Usuario y año por defecto cuando el frontend no los manda
+DEFAULT_USER_ID = "6895dcebb7d7daf7e40aae43a2ea0cce91bffd4d"
+DEFAULT_YEAR = 2022
 
 # 6895dcebb7d7daf7e40aae43a2ea0cce91bffd4d
 
-# Sample path for the CSV file - change this to your actual path
-CSV_PATH = "data/base_transacciones_final.csv"
+# Las rutas async hacen en el event loop solo lo barato (tablas precalculadas, caches) y
+# mandan el cálculo pesado a un pool de procesos (src/ejecucion.py, api/tareas.py).
+# Si el pool está lleno, main.py contesta 503.
 
-def read_and_process_data():
-    try:
-        # Read the CSV file
-        df = pd.read_csv(CSV_PATH)
-        
-        # Convert fecha to datetime
-        # sample format: 2022-01-01
-        df['fecha'] = pd.to_datetime(df['fecha'], format='%Y-%m-%d')
-        
-        # Extract month and year
-        df['month'] = df['fecha'].dt.month
-        df['year'] = df['fecha'].dt.year
-        
-        return df
-    except Exception as e:
-        print(f"Error reading CSV file: {e}")
-        return None
+async def en_pool(pool, tarea, user_id, year=None):
+    """
+    Corre tarea en el pool. Las peticiones idénticas que llegan mientras tanto (misma tarea,
+    usuario, año y versión de datos) esperan esa misma tarea en lugar de encolar otra.
+    """
+    args = (user_id,) if year is None else (user_id, year)
+    key = (tarea.__name__, user_id, year, get_data_version(user_id))
+    return await singleflight.hacer_async(key, lambda: pool.ejecutar(tarea, *args))
+
+
+async def suscripciones_usuario(user_id, year):
+    # Primero la tabla precalculada (python -m src.past.suscripciones <year>), si no, en vivo
+    precalculadas = get_suscripciones_precalculadas(user_id, year)
+    if precalculadas is not None:
+        return precalculadas
+    return await en_pool(analisis, tareas.suscripciones, user_id, year)
+
+
+# --- Bundle del Wrapped: todas las slides de un usuario y año de una sola carga ---
+
+BUNDLE_CACHE_SIZE = int(os.environ.get("BUNDLE_CACHE_SIZE", 1024))
+# Cambiarla cuando cambie el contenido de alguna slide: invalida los ETag que tengan los clientes
+VERSION_BUNDLE = "1"
+
+bundle_cache = LRUCache(maxsize=BUNDLE_CACHE_SIZE, nombre="bundles")
+
+
+def etag_bundle(user_id, year):
+    """
+    ETag fuerte del bundle: depende solo de la versión de los datos del usuario, así que
+    se puede comparar sin calcular nada.
+    """
+    version = get_data_version(user_id)
+    huella = hashlib.sha1(json.dumps([VERSION_BUNDLE, user_id, year, version]).encode("utf-8")).hexdigest()
+    return f'"{huella}"', version
+
+
+def _no_modificado(request, etag):
+    # If-None-Match compara en débil: "W/" se ignora; también acepta varios valores o "*"
+    valor = request.headers.get("if-none-match")
+    if not valor:
+        return False
+    etags = [v.strip().removeprefix("W/") for v in valor.split(",")]
+    return "*" in etags or etag in etags
+
+
+async def obtener_parte(parte, user_id, year, version):
+    """
+    Una parte del bundle ("pasado" o "futuro", ver api/tareas.py), cacheada por separado:
+    las slides del pasado van al pool de análisis y las del futuro al de modelos.
+    """
+    key = (parte, user_id, year, version)
+    resultado = bundle_cache.get(key)
+    if resultado is None:
+        if parte == "pasado":
+            # Directo del snapshot nocturno si está vigente, sin ir al pool
+            resultado = get_snapshot(user_id, year)
+            if resultado is None:
+                resultado = await singleflight.hacer_async(
+                    ("bundle", *key), lambda: analisis.ejecutar(tareas.bundle_pasado, user_id, year)
+                )
+        else:
+            resultado = await singleflight.hacer_async(
+                ("bundle", *key), lambda: modelos.ejecutar(tareas.bundle_futuro, user_id, year)
+            )
+        bundle_cache.set(key, resultado)
+    return resultado
+
+
+async def obtener_bundle(user_id, year, version):
+    pasado, futuro = await asyncio.gather(
+        obtener_parte("pasado", user_id, year, version),
+        obtener_parte("futuro", user_id, year, version),
+    )
+    return {
+        "user_id": user_id,
+        "year": year,
+        "slides": {**pasado["slides"], **futuro["slides"]},
+        "errores": pasado["errores"] + futuro["errores"],
+    }
+
+
+async def vista_slide(request, nombre, user_id, year):
+    """
+    Respuesta de una ruta de slide: su parte del bundle, o 304 si el cliente ya la tiene.
+    Sin nombre regresa el bundle completo.
+    """
+    etag, version = etag_bundle(user_id, year)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _no_modificado(request, etag):
+        return Response(status_code=304, headers=headers)
+    if nombre is None:
+        bundle = await obtener_bundle(user_id, year, version)
+    else:
+        bundle = await obtener_parte("pasado" if nombre in SLIDES_PASADO else "futuro", user_id, year, version)
+    contenido = jsonable_encoder(bundle["slides"][nombre] if nombre else bundle)
+    if nombre in bundle["errores"]:
+        return JSONResponse(content=contenido, status_code=500)
+    return JSONResponse(content=contenido, headers=headers)
+
+
+#http://localhost:8000/wrapped/...?year=2022
+@router.get("/wrapped/{user_id}")
+async def get_wrapped(request: Request, user_id: str, year: int = DEFAULT_YEAR):
+    return await vista_slide(request, None, user_id, year)
+
+
+async def rollups_actuales():
+    # Si los CSV cambiaron desde la última vez, los rollups se recalculan en el pool
+    rollups = rollups_vigentes()
+    if rollups is None:
+        try:
+            key = ("construir_rollups", None, None, _firma(TRANSACCIONES_PATH, CLIENTES_PATH))
+            rollups = instalar_rollups(*await singleflight.hacer_async(key, lambda: analisis.ejecutar(construir_rollups)))
+        except PoolSaturado:
+            raise
+        except Exception as e:
+            print(f"Error reading CSV file: {e}")
+            return None
+    return rollups
 
 #Get id_user
-@app.get("/get-id-user")
-def get_id_user():
-    return user_id
+@router.get("/get-id-user")
+async def get_id_user():
+    return DEFAULT_USER_ID
+
+# Ingesta de transacciones nuevas: lista de {id, fecha, comercio, giro_comercio, tipo_venta, monto}
+@router.post("/ingest")
+def post_ingest(transacciones: list = Body(...)):
+    recibido = time.time()
+    try:
+        return ingestar(pd.DataFrame(transacciones), recibido=recibido)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+
+@router.get("/ingest-stats")
+async def get_ingest_stats():
+    return estadisticas_ingesta()
+
+@router.get("/cache-stats")
+async def get_cache_stats():
+    return [usuarios_cache.stats(), prediccion_cache.stats(), bundle_cache.stats(), singleflight.stats()]
     
 #Slider 1
-#http://localhost:8000/top-commerce-year/2022
+#http://localhost:8000/top-commerce-year/2022?user_id=...
 @router.get("/top-commerce-year/{year}")
-def get_top_commerce(year: int):
-    filtered = get_transaction_year(movements, year)
-    return topCommerce(filtered)
+async def get_top_commerce(request: Request, year: int, user_id: str = DEFAULT_USER_ID):
+    return await vista_slide(request, "top_commerce", user_id, year)
 
 #Slider 2
-#http://localhost:8000/favorite-commerce/2022
+#http://localhost:8000/favorite-commerce/2022?user_id=...
 @router.get("/favorite-commerce/{year}")
-def get_favorite_commerce(year: int):
-    filtered = get_transaction_year(movements, year)
-    return favoriteCommerce(filtered)
+async def get_favorite_commerce(request: Request, year: int, user_id: str = DEFAULT_USER_ID):
+    return await vista_slide(request, "favorite_commerce", user_id, year)
 
 #Slider 3
-#http://localhost:8000/day-more-spent
+#http://localhost:8000/day-more-spent?user_id=...&year=2022
 @router.get("/day-more-spent")
-def get_day_more_spent():
-    return dayMoreSpent(movements_year)
+async def get_day_more_spent(request: Request, user_id: str = DEFAULT_USER_ID, year: int = DEFAULT_YEAR):
+    return await vista_slide(request, "day_more_spent", user_id, year)
 
 #Slider 4
-#http://localhost:8000/favorite-categorie
+#http://localhost:8000/favorite-categorie?user_id=...&year=2022
 @router.get("/favorite-categorie")
-def get_top_categories():
-    return favoriteCategory(movements_year, total_spend)
+async def get_top_categories(request: Request, user_id: str = DEFAULT_USER_ID, year: int = DEFAULT_YEAR):
+    return await vista_slide(request, "favorite_category", user_id, year)
 
 #Slider 5
-#http://localhost:8000/average-spending-daily
+#http://localhost:8000/average-spending-daily?user_id=...&year=2022
 @router.get("/average-spending-daily")
-def get_promedio_gasto_diario_router():
-    resultado = promedio_gasto_diario(movements_year)
-    return resultado 
+async def get_promedio_gasto_diario_router(request: Request, user_id: str = DEFAULT_USER_ID, year: int = DEFAULT_YEAR):
+    return await vista_slide(request, "average_spending_daily", user_id, year)
 
 #Slider 7
-#http://localhost:8000/annual-summary
+#http://localhost:8000/annual-summary?user_id=...&year=2022
 @router.get("/annual-summary")
-def get_annual_summary():
-    resumen = annual_summary(movements_year)
-    return resumen 
+async def get_annual_summary(request: Request, user_id: str = DEFAULT_USER_ID, year: int = DEFAULT_YEAR):
+    return await vista_slide(request, "annual_summary", user_id, year)
 
 ## Slider de predicciones
 
 
 # Los POST para ML también están bien:
+# Probabilidades de incremento por comercio (precalculadas con python -m src.future.precalculo)
 @router.get("/predecir-incremento/{user_id}")
-def predecir_incremento(user_id: str):
+async def predecir_incremento(user_id: str, year: int = DEFAULT_YEAR):
     try:
-        transactions = get_transaction(user_id)
-        resultados = cambio_mensual_func(transactions)
+        resultados = get_prediccion_precalculada(user_id, year, "incremento")
+        if resultados is None:
+            resultados = await en_pool(modelos, tareas.predecir_incremento, user_id, year)
         return JSONResponse(content=resultados)
+    except PoolSaturado:
+        raise
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 #Slider 1 future
-#http://localhost:8000/cambio-mensual
+#http://localhost:8000/cambio-mensual?user_id=...&year=2022
 @router.get("/cambio-mensual")
-def cambio_mensual():
-    try:
-        resultados = cambio_mensual_func(movements_year)
-        return JSONResponse(content=resultados)
-    except Exception as e:
-        return JSONResponse(content={"error": str(e)}, status_code=500)
+async def cambio_mensual(request: Request, user_id: str = DEFAULT_USER_ID, year: int = DEFAULT_YEAR):
+    return await vista_slide(request, "cambio_mensual", user_id, year)
     
 # Slider 2 - Nuevos lugares
 #Maneja el error para "category": "Unknown",
 @router.get("/get_top_places")
-def get_top_places_coord():
-    return get_top_places(movements_year, state_name, coord[0], coord[1])
+def get_top_places_coord(user_id: str = DEFAULT_USER_ID, year: int = DEFAULT_YEAR):
+    datos = datos_usuario(user_id)
+    state_name, coord = datos.estado()
+    if coord is None:
+        return JSONResponse(content={"error": f"Cliente no encontrado: {user_id}"}, status_code=404)
+    return get_top_places(datos.resumen(year), state_name, coord[0], coord[1])
 
 #Slider 3 future
-#http://localhost:8000/predicted-future
+#http://localhost:8000/predicted-future?user_id=...&year=2022
 @router.get("/predicted-future")
-def get_predicted_future():
-    result = predictedFuture(movements_year)
-    return result
+async def get_predicted_future(request: Request, user_id: str = DEFAULT_USER_ID, year: int = DEFAULT_YEAR):
+    return await vista_slide(request, "predicted_future", user_id, year)
 
 # Slider 4
-#http://127.0.0.1:8000/subscriptions
+#http://127.0.0.1:8000/subscriptions?user_id=...&year=2022
 @router.get("/subscriptions")
-def subscriptions():
-    result = analizar_gastos_usuario(movements_year)
-    
-    ordenado = sorted(result.items(), key=lambda item: item[1]["promedio_monto"], reverse=True)
-    top_5 = dict(ordenado[:5])
-    
-    return top_5
+async def subscriptions(request: Request, user_id: str = DEFAULT_USER_ID, year: int = DEFAULT_YEAR):
+    return await vista_slide(request, "subscriptions", user_id, year)
 
 
 
+#http://127.0.0.1:8000/monthly-spending?year=2022&state_id=19
 @router.get("/monthly-spending")
-def get_monthly_spending():
-    df = read_and_process_data()
-    if df is None:
+async def get_monthly_spending(year: Optional[int] = None, state_id: Optional[int] = None):
+    rollups = await rollups_actuales()
+    if rollups is None:
         return {"error": "Could not read data"}
     
-    # Group by month and sum the amounts
-    monthly_data = df.groupby('month')['monto'].sum().reset_index()
-    
-    # Sort by month
-    monthly_data = monthly_data.sort_values('month')
+    # Totales por mes ya materializados (ordenados por mes)
+    monthly_data = rollups.monthly(year, state_id)
+    if monthly_data is None:
+        monthly_data = pd.Series(dtype=float)
     
     # Create labels with month names
-    labels = [calendar.month_name[month] for month in monthly_data['month']]
+    labels = [calendar.month_name[month] for month in monthly_data.index]
     
     # Prepare the response in Chart.js format
     response = {
         "labels": labels,
         "datasets": [{
             "label": "Monthly Spending",
-            "data": monthly_data['monto'].tolist(),
+            "data": monthly_data.tolist(),
             "fill": False,
             "borderColor": 'rgb(75, 192, 192)',
             "tension": 0.1
@@ -168,17 +295,17 @@ def get_monthly_spending():
     
     return response
 
+#http://127.0.0.1:8000/spending-by-category?year=2022&state_id=19
 @router.get("/spending-by-category")
-def get_spending_by_category():
-    df = read_and_process_data()
-    if df is None:
+async def get_spending_by_category(year: Optional[int] = None, state_id: Optional[int] = None):
+    rollups = await rollups_actuales()
+    if rollups is None:
         return {"error": "Could not read data"}
     
-    # Group by category (giro_comercio) and sum the amounts
-    category_data = df.groupby('giro_comercio')['monto'].sum().reset_index()
-    
-    # Sort by amount spent in descending order and get top 10
-    category_data = category_data.sort_values('monto', ascending=False).head(10)
+    # Top 10 categorías por monto, ya ordenadas
+    category_data = rollups.by_category(year, state_id, 10)
+    if category_data is None:
+        category_data = pd.Series(dtype=float)
     
     # Generate random colors for each category
     colors = [
@@ -196,10 +323,10 @@ def get_spending_by_category():
     
     # Prepare the response in Chart.js format
     response = {
-        "labels": category_data['giro_comercio'].tolist(),
+        "labels": category_data.index.tolist(),
         "datasets": [{
             "label": "Spending by Category",
-            "data": category_data['monto'].tolist(),
+            "data": category_data.tolist(),
             "backgroundColor": colors[:len(category_data)],
             "hoverOffset": 4
         }]
@@ -208,10 +335,54 @@ def get_spending_by_category():
     return response
 
 
+#http://127.0.0.1:8000/aggregate?group_by=month,category&measures=sum,count&state_id=19&start=2022-01-01&end=2022-06-30
+@router.get("/aggregate")
+async def get_aggregate(
+    group_by: Optional[str] = None,
+    measures: str = "sum",
+    user_id: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    state_id: Optional[str] = None,
+    category: Optional[str] = None,
+    merchant: Optional[str] = None,
+    sale_type: Optional[str] = None,
+    order_by: Optional[str] = None,
+    limit: Optional[int] = None,
+    max_rows: Optional[int] = None,
+    max_ms: Optional[float] = None,
+):
+    """
+    Agregación genérica para gráficas (src/past/agregados.py). Los filtros y dimensiones
+    con varios valores van separados por comas.
+    """
+    try:
+        consulta = normalizar_consulta({
+            "group_by": group_by, "measures": measures, "user_id": user_id, "start": start, "end": end,
+            "state_id": state_id, "category": category, "merchant": merchant, "sale_type": sale_type,
+            "order_by": order_by, "limit": limit, "max_rows": max_rows, "max_ms": max_ms,
+        })
+    except ConsultaInvalida as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+
+    store = get_store()
+    if store is None:
+        return JSONResponse(content={"error": "Could not read data"}, status_code=503)
+
+    # Consultas idénticas sobre la misma versión del store comparten una sola ejecución
+    key = ("agregar", json.dumps(consulta, sort_keys=True), None, store.version)
+    try:
+        return await singleflight.hacer_async(key, lambda: analisis.ejecutar(tareas.agregar, consulta))
+    except ConsultaInvalida as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    except PresupuestoExcedido as e:
+        return JSONResponse(content={"error": str(e)}, status_code=413)
+
+
 
 # API de calendario
-#http://127.0.0.1:8000/analizar-gastos-usuario
+#http://127.0.0.1:8000/analizar-gastos-usuario?user_id=...&year=2022
 @router.get("/analizar-gastos-usuario")
-def analizar_gastos_usuario_router():
-    result = analizar_gastos_usuario(movements_year)
+async def analizar_gastos_usuario_router(user_id: str = DEFAULT_USER_ID, year: int = DEFAULT_YEAR):
+    result = await suscripciones_usuario(user_id, year)
     return result
\ No newline at end of file
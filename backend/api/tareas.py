@@ -0,0 +1,45 @@
+# Trabajo pesado de las rutas de api/analytics.py (pandas y modelos). Corre en los procesos
+# de src/ejecucion.py: cada función recibe y regresa datos simples, y cada worker tiene sus
+# propios caches de usuarios.
+from src.past.usuarios import datos_usuario
+from src.past.snapshots import SLIDES_PASADO, suscripciones, calcular_slides, get_snapshot
+from src.past.agregados import agregar
+from src.future.incremento import predecir_incremento_usuario, cambio_mensual_func, predictedFuture_usuario
+from src.future.precalculo import get_prediccion_precalculada
+
+
+def predecir_incremento(user_id, year):
+    return predecir_incremento_usuario(user_id, datos_usuario(user_id).movements, year)
+
+
+def _predicted_future(user_id, year):
+    result = get_prediccion_precalculada(user_id, year, "predicted_future")
+    if result is None:
+        result = predictedFuture_usuario(user_id, year, datos_usuario(user_id).anio(year))
+    return result
+
+
+# Slides del futuro: no van en los snapshots (python -m src.past.snapshots)
+SLIDES_FUTURO = {
+    "cambio_mensual": lambda u, y: datos_usuario(u).derivado("cambio_mensual", y, lambda m: cambio_mensual_func(m, y)),
+    "predicted_future": _predicted_future,
+}
+
+
+# El bundle del Wrapped se arma de dos partes que corren en pools distintos: las slides del
+# pasado (pandas, pool "analisis") y las del futuro (modelos, pool "modelos"). Así una slide
+# del pasado nunca espera detrás de la inferencia. Una slide que falla no tumba a las demás:
+# queda como {"error": ...} y su nombre en "errores".
+
+def bundle_pasado(user_id, year):
+    # Del snapshot si hay uno vigente, si no en vivo
+    snapshot = get_snapshot(user_id, year)
+    if snapshot is not None:
+        return snapshot
+    slides, errores = calcular_slides(user_id, year, SLIDES_PASADO)
+    return {"slides": slides, "errores": errores}
+
+
+def bundle_futuro(user_id, year):
+    slides, errores = calcular_slides(user_id, year, SLIDES_FUTURO)
+    return {"slides": slides, "errores": errores}
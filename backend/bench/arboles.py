@@ -0,0 +1,118 @@
+# Paridad y velocidad de los árboles aplanados (src/future/arboles.py) contra sklearn.
+# Uso (desde backend/):
+#   python -m bench.arboles                       # paridad + filas/s de 1 a 1M filas
+#   python -m bench.arboles --solo-paridad
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import warnings
+import numpy as np
+import joblib
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.future.arboles import aplanar, ArbolesPlanos, MODELOS, entradas_prueba
+from bench.benchmark import RESULTADOS_DIR, BACKEND_DIR, _git_commit
+
+TAMANOS = [1, 10, 100, 1000, 10_000, 100_000, 1_000_000]
+
+
+def _modelos():
+    for pkl, llaves in MODELOS.items():
+        obj = joblib.load(os.path.join(BACKEND_DIR, pkl))
+        for llave in llaves:
+            yield f"{os.path.basename(pkl)}[{llave}]", obj[llave]
+
+
+def verificar(filas=200_000, semilla=0):
+    """
+    Compara predict y predict_proba (y la exportación a .npz ida y vuelta) contra sklearn.
+    Regresa {modelo: {"predict": bool, "predict_proba": bool|None}}.
+    """
+    rng = np.random.default_rng(semilla)
+    resultado = {}
+    for nombre, modelo in _modelos():
+        planos = aplanar(modelo, verificar=False)
+        path = os.path.join(RESULTADOS_DIR, "_arboles_tmp.npz")
+        os.makedirs(RESULTADOS_DIR, exist_ok=True)
+        planos.guardar(path)
+        planos = ArbolesPlanos.cargar(path)
+        os.remove(path)
+
+        X = entradas_prueba(planos, filas, rng)
+        iguales = {"predict": bool(np.array_equal(planos.predict(X), modelo.predict(X)))}
+        if hasattr(modelo, "predict_proba"):
+            iguales["predict_proba"] = bool(np.array_equal(planos.predict_proba(X), modelo.predict_proba(X)))
+        resultado[nombre] = iguales
+        print(f"{nombre}: {iguales}")
+    return resultado
+
+
+def _filas_por_segundo(func, X, minimo_segundos=0.2):
+    func(X)
+    repeticiones, inicio = 0, time.perf_counter()
+    while True:
+        func(X)
+        repeticiones += 1
+        transcurrido = time.perf_counter() - inicio
+        if transcurrido >= minimo_segundos:
+            return len(X) * repeticiones / transcurrido
+
+
+def medir(tamanos=TAMANOS, semilla=0):
+    """
+    Filas por segundo de predict (predict_proba en clasificadores) por tamaño de lote.
+    """
+    rng = np.random.default_rng(semilla)
+    resultado = {}
+    for nombre, modelo in _modelos():
+        planos = aplanar(modelo)
+        metodo = "predict_proba" if hasattr(modelo, "predict_proba") else "predict"
+        X_total = entradas_prueba(planos, max(tamanos), rng)
+        por_tamano = []
+        print(f"\n{nombre} ({metodo})")
+        print(f"{'filas':>9s} {'sklearn filas/s':>16s} {'planos filas/s':>16s} {'x':>7s}")
+        for n in tamanos:
+            X = X_total[:n]
+            sk = _filas_por_segundo(getattr(modelo, metodo), X)
+            pl = _filas_por_segundo(getattr(planos, metodo), X)
+            por_tamano.append({"filas": n, "sklearn_filas_s": round(sk, 1), "planos_filas_s": round(pl, 1),
+                               "aceleracion": round(pl / sk, 3)})
+            print(f"{n:9d} {sk:16.0f} {pl:16.0f} {pl / sk:7.2f}")
+        resultado[nombre] = {"metodo": metodo, "tamanos": por_tamano}
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Paridad y filas/s de los árboles aplanados contra sklearn")
+    parser.add_argument("--tamanos", default=",".join(str(t) for t in TAMANOS))
+    parser.add_argument("--filas-paridad", type=int, default=200_000)
+    parser.add_argument("--solo-paridad", action="store_true")
+    parser.add_argument("--salida", default=None)
+    args = parser.parse_args()
+
+    # sklearn avisa que X no trae nombres de columnas; aquí se le pasan arreglos a propósito
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+    paridad = verificar(args.filas_paridad)
+    if not all(v for iguales in paridad.values() for v in iguales.values()):
+        print("Los árboles aplanados NO dan lo mismo que sklearn")
+        sys.exit(1)
+    if args.solo_paridad:
+        sys.exit(0)
+
+    resultado = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "paridad": paridad,
+        "modelos": medir([int(t) for t in args.tamanos.split(",")]),
+    }
+    salida = args.salida or os.path.join(RESULTADOS_DIR, f"arboles-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(salida), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=1)
+    print(f"Resultados guardados en: {salida}")
@@ -0,0 +1,301 @@
+# Benchmark de las funciones de análisis y de las rutas de la API sobre datos sintéticos.
+# Uso (desde backend/):
+#   python -m bench.benchmark --tamanos 100,1000,5000 --muestra 50
+#   python -m bench.benchmark --comparar bench/resultados/a.json bench/resultados/b.json
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+import numpy as np
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+RESULTADOS_DIR = os.path.join(BACKEND_DIR, "bench", "resultados")
+CODIGO = ["src", "api", "main.py"]
+
+RUTAS = [
+    "/top-commerce-year/{year}?user_id={user}",
+    "/favorite-commerce/{year}?user_id={user}",
+    "/day-more-spent?user_id={user}&year={year}",
+    "/favorite-categorie?user_id={user}&year={year}",
+    "/average-spending-daily?user_id={user}&year={year}",
+    "/annual-summary?user_id={user}&year={year}",
+    "/cambio-mensual?user_id={user}&year={year}",
+    "/predicted-future?user_id={user}&year={year}",
+    "/subscriptions?user_id={user}&year={year}",
+    "/analizar-gastos-usuario?user_id={user}&year={year}",
+    "/predecir-incremento/{user}?year={year}",
+    "/monthly-spending?year={year}",
+    "/spending-by-category?year={year}",
+]
+# Sale a la API de lugares: solo con --con-red
+RUTA_LUGARES = "/get_top_places?user_id={user}&year={year}"
+
+
+def _percentiles(tiempos):
+    if not tiempos:
+        return {"n": 0}
+    ms = np.asarray(tiempos) * 1000
+    return {
+        "n": len(ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "media_ms": round(float(ms.mean()), 4),
+        "max_ms": round(float(ms.max()), 4),
+    }
+
+
+def medir(func, entradas, repeticiones=1, muestras_memoria=5):
+    """
+    Corre func(*args) para cada entrada y regresa p50/p99 de latencia y el pico de memoria
+    (tracemalloc, en una pasada aparte para no inflar los tiempos).
+    Las entradas que lanzan excepción se cuentan en `errores` y no entran al tiempo.
+    """
+    tiempos = []
+    errores = 0
+    for args in entradas:
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            try:
+                func(*args)
+            except Exception:
+                errores += 1
+                continue
+            tiempos.append(time.perf_counter() - inicio)
+
+    pico = 0
+    for args in entradas[:muestras_memoria]:
+        tracemalloc.start()
+        try:
+            func(*args)
+        except Exception:
+            pass
+        pico = max(pico, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    resultado = _percentiles(tiempos)
+    resultado["errores"] = errores
+    resultado["pico_memoria_kb"] = round(pico / 1024, 1) if muestras_memoria else None
+    return resultado
+
+
+def _pico_proceso_kb():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        return None
+
+
+# --- Corrida para un tamaño (en un proceso aparte, dentro de la copia con sus datos) ---
+
+def _correr_tamano(raiz, year, muestra, repeticiones, con_red):
+    sys.path.insert(0, raiz)
+    os.chdir(raiz)
+    os.environ["WARMUP"] = "0"
+
+    import pandas as pd
+    from src.past.read import readDataFrames, saveTransaccionesPorUsuario, get_transaction, get_transaction_year
+    from src.past import wrapped, frequency
+    from src.future import incremento
+
+    inicio = time.perf_counter()
+    _, df = readDataFrames()
+    saveTransaccionesPorUsuario(df)
+    construccion = time.perf_counter() - inicio
+
+    usuarios = pd.unique(df["id"].astype(str).str.strip())[:muestra].tolist()
+    movimientos = {u: get_transaction(u) for u in usuarios}
+    del_anio = {u: get_transaction_year(movimientos[u], year) for u in usuarios}
+
+    por_usuario = [(u,) for u in usuarios]
+    anio = [(del_anio[u],) for u in usuarios]
+    funciones = {
+        "read.get_transaction": (get_transaction, por_usuario),
+        "read.get_transaction_year": (get_transaction_year, [(movimientos[u], year) for u in usuarios]),
+        "wrapped.yearly_total_spent": (wrapped.yearly_total_spent, anio),
+        "wrapped.topCommerce": (wrapped.topCommerce, anio),
+        "wrapped.favoriteCommerce": (wrapped.favoriteCommerce, anio),
+        "wrapped.favoriteCategory": (
+            wrapped.favoriteCategory, [(del_anio[u], wrapped.yearly_total_spent(del_anio[u])) for u in usuarios]
+        ),
+        "wrapped.topCategories": (wrapped.topCategories, anio),
+        "wrapped.dayMoreSpent": (wrapped.dayMoreSpent, anio),
+        "wrapped.annual_summary": (wrapped.annual_summary, anio),
+        "frequency.analizar_gastos_usuario": (frequency.analizar_gastos_usuario, anio),
+        "frequency.calcular_top5_comercios": (frequency.calcular_top5_comercios, anio),
+        "frequency.promedio_gasto_diario": (frequency.promedio_gasto_diario, anio),
+        "incremento.predecir_incremento_func": (incremento.predecir_incremento_func, [(movimientos[u],) for u in usuarios]),
+        "incremento.cambio_mensual_func": (incremento.cambio_mensual_func, anio),
+        "incremento.predictedFuture": (incremento.predictedFuture, anio),
+    }
+    # Primera llamada fuera de la medición (carga de modelos, imports perezosos)
+    for func, entradas in funciones.values():
+        try:
+            func(*entradas[0])
+        except Exception:
+            pass
+
+    resultados_funciones = {}
+    for nombre, (func, entradas) in funciones.items():
+        resultados_funciones[nombre] = medir(func, entradas, repeticiones)
+        print(f"  {nombre}: {resultados_funciones[nombre]}")
+
+    # --- Rutas: primero con los caches vacíos (primera petición de cada usuario) y luego repetidas ---
+    from fastapi.testclient import TestClient
+    from src.past.usuarios import usuarios_cache
+    import main
+
+    rutas = RUTAS + ([RUTA_LUGARES] if con_red else [])
+    resultados_rutas = {}
+    with TestClient(main.app) as cliente:
+        def pedir(url):
+            respuesta = cliente.get(url)
+            if respuesta.status_code >= 500:
+                raise RuntimeError(respuesta.status_code)
+
+        for ruta in rutas:
+            usuarios_cache.clear()
+            incremento.prediccion_cache.clear()
+            entradas = [(ruta.format(user=u, year=year),) for u in usuarios]
+            resultados_rutas[ruta] = medir(pedir, entradas, 1, muestras_memoria=0)
+            resultados_rutas[ruta + " (cache)"] = medir(pedir, entradas, repeticiones)
+            print(f"  {ruta}: {resultados_rutas[ruta]}")
+
+    return {
+        "transacciones": int(len(df)),
+        "usuarios_muestra": len(usuarios),
+        "construccion_store_s": round(construccion, 3),
+        "funciones": resultados_funciones,
+        "rutas": resultados_rutas,
+        "pico_proceso_kb": _pico_proceso_kb(),
+    }
+
+
+def _preparar_copia(usuarios, comercios, transacciones, semilla):
+    """
+    Copia del código del backend (src, api, main.py; modelo/ como enlace simbólico)
+    con su propia carpeta data/ de datos sintéticos. El código se copia en lugar de
+    enlazarse porque algunas rutas usan "../../data" y el sistema resolvería el ".."
+    desde el destino del enlace.
+    """
+    from bench.generar_datos import generar
+
+    raiz = tempfile.mkdtemp(prefix=f"bench-{usuarios}-")
+    for nombre in CODIGO:
+        origen, destino = os.path.join(BACKEND_DIR, nombre), os.path.join(raiz, nombre)
+        if os.path.isdir(origen):
+            shutil.copytree(origen, destino, ignore=shutil.ignore_patterns("__pycache__"))
+        else:
+            shutil.copy2(origen, destino)
+    os.symlink(os.path.join(BACKEND_DIR, "modelo"), os.path.join(raiz, "modelo"))
+    info = generar(os.path.join(raiz, "data"), usuarios, comercios, transacciones, semilla=semilla)
+    return raiz, info
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def benchmark(tamanos, comercios=500, transacciones=120, year=2022, muestra=50, repeticiones=3,
+              semilla=0, con_red=False, salida=None, conservar=False):
+    resultado = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {
+            "comercios": comercios, "transacciones_por_usuario": transacciones, "year": year,
+            "muestra": muestra, "repeticiones": repeticiones, "semilla": semilla,
+        },
+        "tamanos": [],
+    }
+
+    for usuarios in tamanos:
+        print(f"Tamaño: {usuarios} usuarios")
+        raiz, info = _preparar_copia(usuarios, comercios, transacciones, semilla)
+        archivo = os.path.join(raiz, "resultado.json")
+        try:
+            # Un proceso por tamaño: memoria pico y caches independientes entre tamaños
+            subprocess.run(
+                [sys.executable, "-m", "bench.benchmark", "--worker", raiz, "--year", str(year),
+                 "--muestra", str(muestra), "--repeticiones", str(repeticiones), "--archivo", archivo]
+                + (["--con-red"] if con_red else []),
+                cwd=BACKEND_DIR, check=True,
+            )
+            with open(archivo, "r", encoding="utf-8") as f:
+                medido = json.load(f)
+        finally:
+            if not conservar:
+                shutil.rmtree(raiz, ignore_errors=True)
+        resultado["tamanos"].append({"usuarios": usuarios, "comercios": comercios, **info, **medido})
+
+    if salida is None:
+        os.makedirs(RESULTADOS_DIR, exist_ok=True)
+        salida = os.path.join(RESULTADOS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=1)
+    print(f"Resultados guardados en: {salida}")
+    return resultado
+
+
+def comparar(base_path, nuevo_path):
+    """
+    Imprime p50/p99 de dos corridas lado a lado (nuevo / base) por tamaño, función y ruta.
+    """
+    with open(base_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(nuevo_path, "r", encoding="utf-8") as f:
+        nuevo = json.load(f)
+
+    base_por_tamano = {t["usuarios"]: t for t in base["tamanos"]}
+    for t in nuevo["tamanos"]:
+        b = base_por_tamano.get(t["usuarios"])
+        if b is None:
+            continue
+        print(f"\n== {t['usuarios']} usuarios ({b.get('commit')} -> {t.get('commit', nuevo.get('commit'))}) ==")
+        print(f"{'nombre':60s} {'p50 base':>10s} {'p50 nuevo':>10s} {'x':>6s} {'p99 base':>10s} {'p99 nuevo':>10s}")
+        for seccion in ("funciones", "rutas"):
+            for nombre, m in t[seccion].items():
+                mb = b[seccion].get(nombre)
+                if not mb or "p50_ms" not in mb or "p50_ms" not in m:
+                    continue
+                ratio = m["p50_ms"] / mb["p50_ms"] if mb["p50_ms"] else float("nan")
+                print(f"{nombre[:60]:60s} {mb['p50_ms']:10.3f} {m['p50_ms']:10.3f} {ratio:6.2f} "
+                      f"{mb['p99_ms']:10.3f} {m['p99_ms']:10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de funciones y rutas con datos sintéticos")
+    parser.add_argument("--tamanos", default="100,1000", help="número de usuarios por corrida, separados por coma")
+    parser.add_argument("--comercios", type=int, default=500)
+    parser.add_argument("--transacciones", type=int, default=120, help="transacciones promedio por usuario")
+    parser.add_argument("--year", type=int, default=2022)
+    parser.add_argument("--muestra", type=int, default=50, help="usuarios medidos por función/ruta")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--con-red", action="store_true", help="incluye /get_top_places (API de lugares)")
+    parser.add_argument("--salida", default=None)
+    parser.add_argument("--conservar", action="store_true", help="no borra las copias con los datos generados")
+    parser.add_argument("--comparar", nargs=2, metavar=("BASE", "NUEVO"))
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--archivo", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+    elif args.worker:
+        medido = _correr_tamano(args.worker, args.year, args.muestra, args.repeticiones, args.con_red)
+        with open(args.archivo, "w", encoding="utf-8") as f:
+            json.dump(medido, f)
+    else:
+        benchmark([int(t) for t in args.tamanos.split(",")], args.comercios, args.transacciones, args.year,
+                  args.muestra, args.repeticiones, args.semilla, args.con_red, args.salida, args.conservar)
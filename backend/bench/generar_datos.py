@@ -0,0 +1,156 @@
+# Generador de datos sintéticos con el mismo formato que los CSV reales.
+# Uso (desde backend/):
+#   python -m bench.generar_datos --salida bench/datos --usuarios 1000 --comercios 500 --transacciones 120
+import os
+import sys
+import json
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.future.location import mapeo_categorias, id_state_name
+
+# id_estado en el CSV de clientes = llave de id_state_name + 46 (ver src/past/clientes.py)
+AJUSTE_ESTADO = 46
+
+
+def _id_hex(prefijo, i):
+    # Mismo formato que los ids reales (sha1 en hexadecimal)
+    return hashlib.sha1(f"{prefijo}-{i}".encode("utf-8")).hexdigest()
+
+
+def _comercios(n, rng):
+    """
+    Comercios con un giro fijo tomado de mapeo_categorias, un tipo de venta preferido
+    y un monto típico (lognormal) por giro.
+    """
+    giros = list(mapeo_categorias)
+    giro = rng.choice(len(giros), size=n)
+    monto_giro = np.exp(rng.normal(5.0, 0.8, size=len(giros)))
+    return pd.DataFrame({
+        "comercio": [f"COMERCIO {i:05d}" for i in range(n)],
+        "giro_comercio": [giros[g] for g in giro],
+        "prob_digital": rng.beta(2, 3, size=n),
+        "monto_tipico": monto_giro[giro],
+    })
+
+
+def generar_transacciones(usuarios, comercios, transacciones_por_usuario, desde="2022-01-01", dias=600,
+                          prob_suscripcion=0.3, semilla=0):
+    """
+    Regresa un DataFrame con las columnas de base_transacciones_final.csv.
+    - Cada usuario concentra ~70% de sus compras en unos pocos comercios favoritos (popularidad Zipf).
+    - El número de transacciones por usuario es Poisson alrededor de `transacciones_por_usuario`.
+    - Con probabilidad `prob_suscripcion` el usuario tiene pagos mensuales el mismo día
+      (para que el detector de suscripciones encuentre patrones).
+    """
+    rng = np.random.default_rng(semilla)
+    tabla = _comercios(comercios, rng)
+    ids = [_id_hex("cliente", i) for i in range(usuarios)]
+    inicio = np.datetime64(desde, "D")
+
+    popularidad = 1.0 / np.arange(1, comercios + 1) ** 1.1
+    popularidad /= popularidad.sum()
+
+    conteos = np.maximum(rng.poisson(transacciones_por_usuario, size=usuarios), 1)
+    usuario = np.repeat(np.arange(usuarios), conteos)
+    n = len(usuario)
+
+    favoritos = rng.choice(comercios, size=(usuarios, 8), p=popularidad)
+    usa_favorito = rng.random(n) < 0.7
+    comercio = np.where(
+        usa_favorito,
+        favoritos[usuario, rng.integers(0, 8, size=n)],
+        rng.choice(comercios, size=n, p=popularidad),
+    )
+    fecha = inicio + rng.integers(0, dias, size=n)
+    monto = np.round(tabla["monto_tipico"].to_numpy()[comercio] * rng.lognormal(0, 0.5, size=n), 2)
+
+    # --- Suscripciones: un comercio, mismo día del mes y mismo monto ---
+    partes_sub = []
+    con_sub = np.flatnonzero(rng.random(usuarios) < prob_suscripcion)
+    meses = dias // 30
+    for u in con_sub.tolist():
+        c = int(favoritos[u, 0])
+        dia = int(rng.integers(0, 28))
+        inicio_mes = inicio.astype("datetime64[M]") + np.arange(meses)
+        partes_sub.append((
+            np.full(meses, u),
+            np.full(meses, c),
+            inicio_mes.astype("datetime64[D]") + dia,
+            np.full(meses, round(float(tabla["monto_tipico"].iloc[c]), 2)),
+        ))
+    if partes_sub:
+        usuario = np.concatenate([usuario] + [p[0] for p in partes_sub])
+        comercio = np.concatenate([comercio] + [p[1] for p in partes_sub])
+        fecha = np.concatenate([fecha] + [p[2] for p in partes_sub])
+        monto = np.concatenate([monto] + [p[3] for p in partes_sub])
+
+    digital = rng.random(len(usuario)) < tabla["prob_digital"].to_numpy()[comercio]
+    df = pd.DataFrame({
+        "id": np.asarray(ids, dtype=object)[usuario],
+        "fecha": np.datetime_as_string(fecha, unit="D"),
+        "comercio": tabla["comercio"].to_numpy()[comercio],
+        "giro_comercio": tabla["giro_comercio"].to_numpy()[comercio],
+        "tipo_venta": np.where(digital, "digital", "fisica"),
+        "monto": monto,
+    })
+    # Como en el CSV real, las filas no vienen agrupadas por usuario
+    return df.sample(frac=1, random_state=semilla).reset_index(drop=True), ids
+
+
+def generar_clientes(ids, semilla=0):
+    rng = np.random.default_rng(semilla + 1)
+    n = len(ids)
+    estados = np.array(list(id_state_name), dtype=np.int64) + AJUSTE_ESTADO
+    nacimiento = np.datetime64("1950-01-01") + rng.integers(0, 365 * 55, size=n)
+    alta = np.datetime64("2010-01-01") + rng.integers(0, 365 * 12, size=n)
+    return pd.DataFrame({
+        "id": ids,
+        "fecha_nacim": np.datetime_as_string(nacimiento, unit="D"),
+        "fecha_alta": np.datetime_as_string(alta, unit="D"),
+        "id_municipio": rng.integers(1000, 9999, size=n),
+        "id_estado": rng.choice(estados, size=n),
+        "tipo_persona": np.where(rng.random(n) < 0.9, "PF", "PM"),
+        "genero": rng.choice(["M", "F"], size=n),
+        "actividad_empresarial": rng.choice(["EMPLEADO", "COMERCIANTE", "PROFESIONISTA", "ESTUDIANTE"], size=n),
+    })
+
+
+def generar(salida, usuarios=1000, comercios=500, transacciones_por_usuario=120, desde="2022-01-01",
+            dias=600, semilla=0, json_por_usuario=False):
+    """
+    Escribe base_transacciones_final.csv y base_clientes_final.csv en `salida`
+    (y los JSON por usuario en salida/json/person si json_por_usuario=True).
+    """
+    os.makedirs(salida, exist_ok=True)
+    df, ids = generar_transacciones(usuarios, comercios, transacciones_por_usuario, desde, dias, semilla=semilla)
+    df.to_csv(os.path.join(salida, "base_transacciones_final.csv"), index=False)
+    generar_clientes(ids, semilla).to_csv(os.path.join(salida, "base_clientes_final.csv"), index=False)
+
+    if json_por_usuario:
+        carpeta = os.path.join(salida, "json", "person")
+        os.makedirs(carpeta, exist_ok=True)
+        for u, grupo in df.groupby("id", sort=False):
+            with open(os.path.join(carpeta, f"{u}.json"), "w", encoding="utf-8") as f:
+                json.dump(grupo.to_dict(orient="records"), f, ensure_ascii=False)
+
+    print(f"Generados {len(df)} movimientos de {usuarios} usuarios y {comercios} comercios en: {salida}")
+    return {"usuarios": usuarios, "comercios": comercios, "transacciones": int(len(df))}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera CSV sintéticos de clientes y transacciones")
+    parser.add_argument("--salida", default="bench/datos")
+    parser.add_argument("--usuarios", type=int, default=1000)
+    parser.add_argument("--comercios", type=int, default=500)
+    parser.add_argument("--transacciones", type=int, default=120, help="transacciones promedio por usuario")
+    parser.add_argument("--desde", default="2022-01-01")
+    parser.add_argument("--dias", type=int, default=600)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="también escribe data/json/person/<id>.json")
+    args = parser.parse_args()
+    generar(args.salida, args.usuarios, args.comercios, args.transacciones, args.desde, args.dias,
+            args.semilla, args.json)
@@ -0,0 +1 @@
+# Hace que `src` y `api` se importen igual que desde backend/ al correr pytest
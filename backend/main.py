@@ -1,15 +1,73 @@
 # main.py
 
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from api.analytics import router
-from src.past.frequency import *
-from src.past.read import *
-from src.past.wrapped import *
-import requests
-from src.future.incremento import router as incremento_router
+import os
+import time
+import threading
+from contextlib import asynccontextmanager
+from src.arranque import medir_import, registrar, calentar, listo, marcar_listo, reporte_arranque
+from src import metrics
 
-app = FastAPI()
+with medir_import("fastapi"):
+    from fastapi import FastAPI, Request
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse, PlainTextResponse
+
+with medir_import("pandas"):
+    import pandas
+
+with medir_import("api.analytics"):
+    from api.analytics import router, bundle_cache
+
+with medir_import("src.future.incremento"):
+    from src.future.incremento import router as incremento_router
+
+from src.past.store import get_store
+from src.past.clientes import get_directorio_clientes
+from src.past.tiendas import get_indice_tiendas
+from src.past.rollups import get_rollups
+from src.past.agregados import get_indice_agregados
+from src.future.places_index import get_indice_places
+from src.past.ingest import vigilar_carpeta
+from src.past.usuarios import usuarios_cache
+from src.future.incremento import prediccion_cache
+from src.cache import singleflight
+from src.ejecucion import PoolSaturado, iniciar_pools, cerrar_pools, estadisticas_pools
+
+# Datasets que se calientan junto con los modelos (ya registrados en src/future/incremento.py)
+registrar("store", get_store)
+registrar("directorio_clientes", get_directorio_clientes)
+registrar("indice_tiendas", get_indice_tiendas)
+registrar("rollups", get_rollups)
+registrar("indice_places", get_indice_places)
+registrar("indice_agregados", get_indice_agregados)
+
+# WARMUP=0 deja todo para la primera petición que lo use
+WARMUP = os.environ.get("WARMUP", "1") != "0"
+# INGEST_WATCH=<segundos> revisa data/ingest/ cada tantos segundos en busca de lotes nuevos
+INGEST_WATCH = float(os.environ.get("INGEST_WATCH", 0))
+
+
+def _calentar():
+    reporte = calentar()
+    print(f"Calentamiento terminado en {reporte['calentamiento']['segundos']}s: {reporte}")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if WARMUP:
+        # En un hilo aparte: el servidor acepta conexiones de inmediato y /ready avisa cuando termina
+        threading.Thread(target=_calentar, name="calentamiento", daemon=True).start()
+    else:
+        marcar_listo()
+    if INGEST_WATCH > 0:
+        vigilar_carpeta(INGEST_WATCH)
+    # Los workers arrancan y precargan modelos y datasets en paralelo con el servidor
+    iniciar_pools()
+    yield
+    cerrar_pools()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -19,7 +77,58 @@ app.add_middleware(
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
 )
+# Los endpoints síncronos corren en el threadpool: el profiler tiene que envolverlos ahí mismo.
+# Los async se perfilan dentro del pool al que mandan su trabajo (src/ejecucion.py).
+metrics.perfilar_rutas(router)
+metrics.perfilar_rutas(incremento_router)
 app.include_router(router)
 app.include_router(incremento_router)
 
 
+@app.middleware("http")
+async def medir_peticion(request: Request, call_next):
+    """
+    Histograma de latencia por ruta (la plantilla, p. ej. /wrapped/{user_id}, no la URL)
+    y, si está activo, perfil de las peticiones lentas (ver src/metrics.py).
+    """
+    solicitud, token = metrics.iniciar_solicitud()
+    inicio = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        ruta = request.scope.get("route")
+        metrics.terminar_solicitud(solicitud, token, ruta.path if ruta is not None else "sin_ruta",
+                                   request.method, status, time.perf_counter() - inicio)
+
+
+@app.exception_handler(PoolSaturado)
+async def pool_saturado(request: Request, exc: PoolSaturado):
+    # Rechazo rápido: mejor un 503 ahora que un timeout después de esperar en la cola
+    return JSONResponse(content={"error": str(exc)}, status_code=503, headers={"Retry-After": "1"})
+
+
+@app.get("/ready")
+def ready():
+    return JSONResponse(content=reporte_arranque(), status_code=200 if listo() else 503)
+
+
+@app.get("/metrics")
+def metricas():
+    for cache in (usuarios_cache, prediccion_cache, bundle_cache):
+        stats = cache.stats()
+        for campo in ("hits", "misses", "size"):
+            metrics.medidor(f"wrapped_cache_{campo}", stats[campo], cache=stats["nombre"])
+    for funcion, conteos in singleflight.stats()["funciones"].items():
+        for resultado, n in conteos.items():
+            metrics.medidor("wrapped_singleflight_total", n, funcion=funcion, resultado=resultado)
+    estadisticas_pools()
+    return PlainTextResponse(metrics.exportar_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/profiler")
+def profiler(umbral_ms: float = None, muestreo: float = None):
+    # umbral_ms=0 lo apaga; muestreo es la fracción de peticiones que se perfilan (0 a 1)
+    return metrics.configurar_profiler(umbral_ms, muestreo)
@@ -0,0 +1,94 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Tiempos de arranque por componente: imports (medidos en main.py) y cargas de recursos
+_imports = {}
+_recursos = {}
+_calentamiento = {"estado": "pendiente", "segundos": None}
+
+
+class Recurso:
+    """
+    Recurso pesado (modelo, dataset, índice) que se carga la primera vez que se usa.
+    La carga es thread-safe: si varias peticiones llegan a la vez solo una la ejecuta.
+    """
+
+    def __init__(self, nombre, cargar):
+        self.nombre = nombre
+        self._cargar = cargar
+        self._valor = None
+        self._cargado = False
+        self._lock = threading.Lock()
+        self.segundos = None
+
+    def get(self):
+        if self._cargado:
+            return self._valor
+        with self._lock:
+            if not self._cargado:
+                inicio = time.perf_counter()
+                self._valor = self._cargar()
+                self.segundos = time.perf_counter() - inicio
+                self._cargado = True
+                print(f"Recurso '{self.nombre}' cargado en {self.segundos:.3f}s")
+        return self._valor
+
+    @property
+    def cargado(self):
+        return self._cargado
+
+
+def registrar(nombre, cargar):
+    recurso = Recurso(nombre, cargar)
+    _recursos[nombre] = recurso
+    return recurso
+
+
+@contextmanager
+def medir_import(nombre):
+    inicio = time.perf_counter()
+    yield
+    _imports[nombre] = time.perf_counter() - inicio
+
+
+def calentar(nombres=None):
+    """
+    Carga de antemano los recursos registrados (todos o solo `nombres`).
+    Un recurso que falla se reporta y no detiene a los demás.
+    """
+    _calentamiento["estado"] = "calentando"
+    inicio = time.perf_counter()
+    errores = {}
+    for nombre, recurso in list(_recursos.items()):
+        if nombres is not None and nombre not in nombres:
+            continue
+        try:
+            recurso.get()
+        except Exception as e:
+            print(f"Error cargando '{nombre}': {e}")
+            errores[nombre] = str(e)
+    _calentamiento["segundos"] = round(time.perf_counter() - inicio, 4)
+    _calentamiento["errores"] = errores
+    _calentamiento["estado"] = "listo"
+    return reporte_arranque()
+
+
+def listo():
+    return _calentamiento["estado"] == "listo"
+
+
+def marcar_listo():
+    # Para cuando el calentamiento está desactivado: los recursos se cargan en la primera petición
+    _calentamiento["estado"] = "listo"
+
+
+def reporte_arranque():
+    return {
+        "imports": {nombre: round(s, 4) for nombre, s in _imports.items()},
+        "recursos": {
+            nombre: {"cargado": r.cargado, "segundos": round(r.segundos, 4) if r.segundos is not None else None}
+            for nombre, r in _recursos.items()
+        },
+        "calentamiento": dict(_calentamiento),
+    }
@@ -0,0 +1,184 @@
+import asyncio
+import threading
+from collections import OrderedDict
+
+_FALTANTE = object()
+
+
+class LRUCache:
+    """
+    Cache acotado con desalojo LRU, seguro entre threads, con contadores de hits/misses.
+    """
+
+    def __init__(self, maxsize=1024, nombre="cache"):
+        self.maxsize = maxsize
+        self.nombre = nombre
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._datos)
+
+    def __contains__(self, key):
+        return key in self._datos
+
+    def get(self, key, default=None):
+        with self._lock:
+            valor = self._datos.get(key, _FALTANTE)
+            if valor is _FALTANTE:
+                self.misses += 1
+                return default
+            self._datos.move_to_end(key)
+            self.hits += 1
+            return valor
+
+    def set(self, key, valor):
+        with self._lock:
+            self._datos[key] = valor
+            self._datos.move_to_end(key)
+            while len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, key, factory):
+        """
+        Regresa el valor cacheado o lo calcula con factory() y lo guarda.
+        El cálculo se hace fuera del lock para no bloquear otras llaves; si varios threads
+        piden a la vez la misma llave que falta, solo uno corre factory() (ver SingleFlight).
+        """
+        valor = self.get(key, _FALTANTE)
+        if valor is _FALTANTE:
+            def calcular():
+                valor = factory()
+                self.set(key, valor)
+                return valor
+            valor = singleflight.hacer((self.nombre, key), calcular)
+        return valor
+
+    def invalidate(self, key):
+        with self._lock:
+            return self._datos.pop(key, None) is not None
+
+    def invalidate_where(self, predicate):
+        """
+        Borra todas las llaves para las que predicate(key) es verdadero. Regresa cuántas borró.
+        """
+        with self._lock:
+            llaves = [key for key in self._datos if predicate(key)]
+            for key in llaves:
+                del self._datos[key]
+            return len(llaves)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "nombre": self.nombre,
+            "size": len(self._datos),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class _Vuelo:
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Junta llamadas concurrentes con la misma llave: solo la primera corre la función y las
+    demás esperan y reciben su mismo resultado (o su misma excepción). No guarda nada: en
+    cuanto termina, la siguiente llamada con esa llave vuelve a correr.
+    La llave empieza con el nombre de la función, p. ej. ("get_transaction", user_id, año,
+    versión de datos); los contadores van por función.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vuelos = {}
+        self._tareas = {}
+        self.ejecutadas = {}
+        self.compartidas = {}
+
+    def _contar(self, key, compartida):
+        conteos = self.compartidas if compartida else self.ejecutadas
+        conteos[key[0]] = conteos.get(key[0], 0) + 1
+
+    def hacer(self, key, func):
+        """
+        Versión para threads: regresa func() o, si otro thread ya la está corriendo con la
+        misma llave, espera su resultado.
+        """
+        with self._lock:
+            vuelo = self._vuelos.get(key)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._vuelos[key] = _Vuelo()
+            self._contar(key, compartida=not lider)
+
+        if not lider:
+            vuelo.listo.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.resultado
+
+        try:
+            vuelo.resultado = func()
+            return vuelo.resultado
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._vuelos[key]
+            vuelo.listo.set()
+
+    async def hacer_async(self, key, factory):
+        """
+        Versión para el event loop: factory() regresa un awaitable. Corre como tarea aparte,
+        así que si se cancela una de las peticiones que la esperan las demás siguen.
+        """
+        with self._lock:
+            tarea = self._tareas.get(key)
+            lider = tarea is None
+            if lider:
+                tarea = self._tareas[key] = asyncio.ensure_future(factory())
+                tarea.add_done_callback(lambda t: self._terminar(key, t))
+            self._contar(key, compartida=not lider)
+        return await asyncio.shield(tarea)
+
+    def _terminar(self, key, tarea):
+        with self._lock:
+            if self._tareas.get(key) is tarea:
+                del self._tareas[key]
+        # Si nadie la esperó hasta el final, que su excepción no quede como "never retrieved"
+        if not tarea.cancelled():
+            tarea.exception()
+
+    def stats(self):
+        with self._lock:
+            funciones = sorted(set(self.ejecutadas) | set(self.compartidas), key=str)
+            return {
+                "nombre": "singleflight",
+                "en_vuelo": len(self._vuelos) + len(self._tareas),
+                "funciones": {
+                    str(f): {"ejecutadas": self.ejecutadas.get(f, 0), "compartidas": self.compartidas.get(f, 0)}
+                    for f in funciones
+                },
+            }
+
+
+# Compartido por todo el proceso: las llaves ya incluyen el nombre de la función
+singleflight = SingleFlight()
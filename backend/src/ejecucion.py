@@ -0,0 +1,229 @@
+# Pools de procesos para el trabajo pesado de la API (pandas y modelos), fuera del GIL del
+# servidor. Cada pool tiene una cola acotada: si está llena la petición se rechaza de
+# inmediato con 503 en lugar de esperar detrás de las demás.
+import os
+import time
+import asyncio
+import cProfile
+import importlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from starlette.concurrency import run_in_threadpool
+from src import metrics
+
+# POOLS=0 corre todo en el threadpool del servidor (mismo control de admisión, sin procesos)
+POOLS = os.environ.get("POOLS", "1") != "0"
+
+# Procesos, lugares en cola (además de los que ya están corriendo) y recursos que cada
+# worker carga al arrancar ("modulo:atributo"; un Recurso o una función sin argumentos).
+# Se configuran con POOL_<NOMBRE>_PROCESOS y POOL_<NOMBRE>_COLA.
+CONFIG = {
+    "modelos": {
+        "procesos": max(1, (os.cpu_count() or 2) // 2),
+        "cola": 32,
+        "precargar": [
+            "src.past.store:get_store",
+            "src.future.incremento:arboles_dual",
+            "src.future.incremento:arboles_incremento",
+            "src.future.incremento:_indices_mapas",
+        ],
+    },
+    "analisis": {
+        "procesos": max(1, (os.cpu_count() or 2) // 2),
+        "cola": 64,
+        "precargar": [
+            "src.past.store:get_store",
+            "src.past.clientes:get_directorio_clientes",
+            "src.past.agregados:get_indice_agregados",
+        ],
+    },
+}
+
+metrics.describir("wrapped_pool_espera_segundos", "Tiempo en cola antes de empezar a correr, por pool")
+metrics.describir("wrapped_pool_ejecucion_segundos", "Tiempo corriendo en el pool")
+metrics.describir("wrapped_pool_rechazos_total", "Peticiones rechazadas con 503 por pool lleno")
+metrics.describir("wrapped_pool_cola", "Tareas esperando lugar en el pool")
+metrics.describir("wrapped_pool_en_curso", "Tareas corriendo en el pool")
+
+
+class PoolSaturado(Exception):
+    def __init__(self, nombre):
+        super().__init__(f"El pool '{nombre}' está saturado, intenta de nuevo en un momento")
+        self.nombre = nombre
+
+
+def _precargar(precargar):
+    """
+    Initializer de cada worker: importa y carga los recursos para que la primera tarea no
+    pague la carga de modelos y datasets.
+    """
+    for ruta in precargar:
+        modulo, atributo = ruta.split(":")
+        objeto = getattr(importlib.import_module(modulo), atributo)
+        try:
+            objeto.get() if hasattr(objeto, "get") else objeto()
+        except Exception as e:
+            print(f"Error precargando '{ruta}' en el worker {os.getpid()}: {e}")
+
+
+def _correr(func, args, encolado, perfilar=False):
+    """
+    Corre func(*args) en el worker. Regresa también cuándo empezó (para medir la espera en
+    cola), los spans de src/metrics.py y, si la petición se está perfilando, las stats de
+    cProfile; el servidor registra ambos en la petición.
+    """
+    solicitud = metrics.Solicitud()
+    token = metrics._solicitud.set(solicitud)
+    inicio = time.time()
+    try:
+        if not perfilar:
+            return func(*args), inicio - encolado, time.time() - inicio, solicitud.spans, None
+        perfil = cProfile.Profile()
+        resultado = perfil.runcall(func, *args)
+        perfil.create_stats()
+        return resultado, inicio - encolado, time.time() - inicio, solicitud.spans, perfil.stats
+    finally:
+        metrics._solicitud.reset(token)
+
+
+class Pool:
+    def __init__(self, nombre, procesos, cola, precargar=()):
+        self.nombre = nombre
+        self.procesos = procesos
+        self.cola = cola
+        self.precargar = list(precargar)
+        self.pendientes = 0
+        self.rechazos = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        with self._lock:
+            if self._executor is None and POOLS:
+                # spawn y no fork: el servidor ya tiene hilos (threadpool, calentamiento)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_precargar,
+                    initargs=(self.precargar,),
+                )
+                # Arranca los workers ya, no con la primera tarea
+                for _ in range(self.procesos):
+                    self._executor.submit(time.sleep, 0)
+        return self
+
+    def cerrar(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _admitir(self):
+        with self._lock:
+            if self.pendientes >= self.procesos + self.cola:
+                self.rechazos += 1
+                metrics.contar("wrapped_pool_rechazos_total", pool=self.nombre)
+                raise PoolSaturado(self.nombre)
+            self.pendientes += 1
+
+    def _liberar(self):
+        with self._lock:
+            self.pendientes -= 1
+
+    async def ejecutar(self, func, *args):
+        """
+        Corre func(*args) en un proceso del pool y regresa su resultado. func y args tienen
+        que poder mandarse a otro proceso (funciones de módulo, datos simples).
+        Lanza PoolSaturado si ya hay procesos + cola tareas pendientes.
+        """
+        self._admitir()
+        encolado = time.time()
+        solicitud = metrics._solicitud.get()
+        perfilar = solicitud is not None and solicitud.perfilar
+        try:
+            if not POOLS:
+                # En el threadpool los spans se anotan directo en la petición en curso
+                return await run_in_threadpool(self._en_hilo, func, args, encolado, solicitud if perfilar else None)
+            executor = self._executor or self.iniciar()._executor
+            futuro = executor.submit(_correr, func, args, encolado, perfilar)
+            try:
+                resultado, espera, duracion, spans, stats = await asyncio.wrap_future(futuro)
+            except BrokenProcessPool:
+                # Un worker murió (p. ej. por memoria): el pool se recrea en la siguiente tarea
+                with self._lock:
+                    if self._executor is executor:
+                        self._executor = None
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            metrics.registrar_spans(spans)
+            if stats is not None:
+                solicitud.perfil = metrics.PerfilRemoto(stats)
+        finally:
+            self._liberar()
+        metrics.observar("wrapped_pool_espera_segundos", max(espera, 0.0), pool=self.nombre)
+        metrics.observar("wrapped_pool_ejecucion_segundos", duracion, pool=self.nombre)
+        return resultado
+
+    def _en_hilo(self, func, args, encolado, solicitud=None):
+        inicio = time.time()
+        metrics.observar("wrapped_pool_espera_segundos", inicio - encolado, pool=self.nombre)
+        try:
+            if solicitud is None:
+                return func(*args)
+            perfil = cProfile.Profile()
+            try:
+                return perfil.runcall(func, *args)
+            finally:
+                solicitud.perfil = perfil
+        finally:
+            metrics.observar("wrapped_pool_ejecucion_segundos", time.time() - inicio, pool=self.nombre)
+
+    def stats(self):
+        en_curso = min(self.pendientes, self.procesos)
+        return {
+            "nombre": self.nombre,
+            "procesos": self.procesos if POOLS else 0,
+            "cola_max": self.cola,
+            "en_curso": en_curso,
+            "en_cola": self.pendientes - en_curso,
+            "rechazos": self.rechazos,
+        }
+
+
+def _crear_pools():
+    pools = {}
+    for nombre, config in CONFIG.items():
+        prefijo = f"POOL_{nombre.upper()}_"
+        pools[nombre] = Pool(
+            nombre,
+            procesos=int(os.environ.get(prefijo + "PROCESOS", config["procesos"])),
+            cola=int(os.environ.get(prefijo + "COLA", config["cola"])),
+            precargar=config["precargar"],
+        )
+    return pools
+
+
+pools = _crear_pools()
+modelos = pools["modelos"]
+analisis = pools["analisis"]
+
+
+def iniciar_pools():
+    for pool in pools.values():
+        pool.iniciar()
+
+
+def cerrar_pools():
+    for pool in pools.values():
+        pool.cerrar()
+
+
+def estadisticas_pools():
+    # Para /metrics: la cola y lo que está corriendo se publican como medidores
+    stats = [pool.stats() for pool in pools.values()]
+    for s in stats:
+        metrics.medidor("wrapped_pool_cola", s["en_cola"], pool=s["nombre"])
+        metrics.medidor("wrapped_pool_en_curso", s["en_curso"], pool=s["nombre"])
+    return stats
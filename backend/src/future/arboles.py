@@ -0,0 +1,315 @@
+# Exportación de los GradientBoosting* de sklearn a arreglos planos y evaluación con NumPy.
+# Uso (desde backend/): python -m src.future.arboles   -> escribe modelo/*.npz
+import os
+import warnings
+import numpy as np
+from scipy.special import expit
+
+# Filas que se evalúan juntas (la memoria temporal es árboles x filas enteros)
+BLOQUE_FILAS = 8192
+# Entradas máximas de la tabla de un árbol (producto de los intervalos de sus features)
+MAX_TABLA_ARBOL = 1 << 20
+
+
+class ArbolesPlanos:
+    """
+    Un GradientBoostingClassifier/Regressor aplanado: feature, threshold, hijos y valor de
+    todos los nodos de todos los árboles en arreglos contiguos (los árboles uno tras otro,
+    etapa por etapa). Es lo que se exporta a disco.
+
+    Para evaluar, cada árbol se compila a una tabla: sus umbrales parten cada feature que usa
+    en intervalos y la hoja solo depende de en qué intervalo cae cada feature. Por fila se
+    calcula una vez el intervalo de cada feature (searchsorted sobre todos los umbrales del
+    modelo) y con eso se lee la hoja de todos los árboles a la vez, sin recorrerlos.
+    predict/predict_proba dan exactamente lo mismo que sklearn: X en float32, mismas
+    comparaciones x <= umbral, las etapas se suman en el mismo orden y con la misma función
+    de enlace.
+    """
+
+    def __init__(self, feature, threshold, izquierda, derecha, valor, raices,
+                 inicial, n_etapas, n_features, tipo, classes=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.izquierda = izquierda
+        self.derecha = derecha
+        self.valor = valor
+        self.raices = raices
+        self.inicial = inicial
+        self.n_etapas = int(n_etapas)
+        self.n_features = int(n_features)
+        self.tipo = str(tipo)
+        self.classes_ = classes
+        self._compilar()
+
+    @classmethod
+    def desde_sklearn(cls, modelo):
+        """
+        Aplana un GradientBoosting* ya entrenado. Solo se soporta el init por defecto
+        (un Dummy* constante) o init="zero", que son los que usan los modelos del proyecto.
+        """
+        from sklearn.dummy import DummyClassifier, DummyRegressor
+        from sklearn.ensemble import GradientBoostingClassifier
+
+        if not (isinstance(modelo.init_, (DummyClassifier, DummyRegressor)) or modelo.init_ == "zero"):
+            raise ValueError("Solo se pueden aplanar modelos con init constante")
+        if isinstance(modelo, GradientBoostingClassifier):
+            if modelo.loss != "log_loss":
+                raise ValueError(f"Pérdida no soportada: {modelo.loss}")
+            tipo = "binaria" if modelo.n_trees_per_iteration_ == 1 else "multiclase"
+        else:
+            tipo = "regresion"
+
+        n_etapas, k = modelo.estimators_.shape
+        arboles = [modelo.estimators_[s, j].tree_ for s in range(n_etapas) for j in range(k)]
+        tamanos = np.array([t.node_count for t in arboles], dtype=np.int64)
+        raices = np.concatenate([[0], np.cumsum(tamanos)[:-1]]).astype(np.int64)
+
+        feature, threshold, izquierda, derecha, valor = [], [], [], [], []
+        for raiz, t in zip(raices.tolist(), arboles):
+            hoja = t.children_left < 0
+            nodos = np.arange(t.node_count) + raiz
+            # Las hojas apuntan a sí mismas y tienen feature -1
+            izquierda.append(np.where(hoja, nodos, t.children_left + raiz))
+            derecha.append(np.where(hoja, nodos, t.children_right + raiz))
+            feature.append(np.where(hoja, -1, t.feature))
+            threshold.append(t.threshold)
+            # Igual que predict_stages: scale * value[nodo]
+            valor.append(modelo.learning_rate * t.value[:, 0, 0])
+
+        inicial = modelo._raw_predict_init(np.zeros((1, modelo.n_features_in_), dtype=np.float32))[0]
+        return cls(
+            feature=np.concatenate(feature).astype(np.int64),
+            threshold=np.concatenate(threshold).astype(np.float64),
+            izquierda=np.concatenate(izquierda).astype(np.int64),
+            derecha=np.concatenate(derecha).astype(np.int64),
+            valor=np.concatenate(valor).astype(np.float64),
+            raices=raices,
+            inicial=np.asarray(inicial, dtype=np.float64),
+            n_etapas=n_etapas,
+            n_features=modelo.n_features_in_,
+            tipo=tipo,
+            classes=getattr(modelo, "classes_", None),
+        )
+
+    # --- Exportación ---
+
+    def guardar(self, path):
+        extra = {} if self.classes_ is None else {"classes": np.asarray(self.classes_)}
+        np.savez(
+            path,
+            feature=self.feature, threshold=self.threshold, izquierda=self.izquierda,
+            derecha=self.derecha, valor=self.valor, raices=self.raices, inicial=self.inicial,
+            meta=np.array([self.n_etapas, self.n_features]),
+            tipo=np.asarray(self.tipo),
+            **extra,
+        )
+
+    @classmethod
+    def cargar(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            n_etapas, n_features = data["meta"].tolist()
+            return cls(
+                feature=data["feature"], threshold=data["threshold"], izquierda=data["izquierda"],
+                derecha=data["derecha"], valor=data["valor"], raices=data["raices"],
+                inicial=data["inicial"], n_etapas=n_etapas, n_features=n_features,
+                tipo=str(data["tipo"]), classes=data["classes"] if "classes" in data else None,
+            )
+
+    # --- Compilación a tablas ---
+
+    def _nodos_arbol(self, t):
+        fin = self.raices[t + 1] if t + 1 < len(self.raices) else len(self.feature)
+        return int(self.raices[t]), int(fin)
+
+    def _compilar(self):
+        k = len(self.inicial)
+        n_arboles = len(self.raices)
+        internos = self.feature >= 0
+        # Todos los umbrales de cada feature: el intervalo global de x es cuántos son < x
+        self.umbrales = [np.unique(self.threshold[internos & (self.feature == f)]) for f in range(self.n_features)]
+        # desplazamientos[f][t, r]: lo que aporta al índice de la tabla del árbol t que x_f caiga en el intervalo global r
+        desplazamientos = [np.zeros((n_arboles, len(u) + 1), dtype=np.int32) for u in self.umbrales]
+        tablas, inicio, total = [], [], 0
+
+        for t in range(n_arboles):
+            a, b = self._nodos_arbol(t)
+            feature, threshold = self.feature[a:b], self.threshold[a:b]
+            usados = np.unique(feature[feature >= 0]).tolist()
+
+            # Intervalos locales: los umbrales de este árbol para cada feature que usa
+            tamano = 1
+            representantes = []
+            for f in usados:
+                locales = np.unique(threshold[feature == f])
+                posiciones = np.searchsorted(self.umbrales[f], locales)
+                r = np.arange(len(self.umbrales[f]) + 1)
+                desplazamientos[f][t] = np.searchsorted(posiciones, r, side="left") * tamano
+                # Un valor dentro de cada intervalo local: el umbral que lo cierra, o +inf el último
+                representantes.append((f, tamano, np.append(locales, np.inf)))
+                tamano *= len(locales) + 1
+            if tamano > MAX_TABLA_ARBOL:
+                raise ValueError(f"El árbol {t} necesita una tabla de {tamano} entradas")
+
+            # Valor de la tabla = hoja a la que llega el representante de cada combinación
+            X = np.zeros((tamano, self.n_features))
+            combinaciones = np.arange(tamano)
+            for f, paso, valores in representantes:
+                X[:, f] = valores[(combinaciones // paso) % len(valores)]
+            nodos = np.full(tamano, a, dtype=np.int64)
+            for _ in range(b - a):
+                f = self.feature[nodos]
+                if (f < 0).all():
+                    break
+                izquierda = X[combinaciones, np.maximum(f, 0)] <= self.threshold[nodos]
+                nodos = np.where(izquierda, self.izquierda[nodos], self.derecha[nodos])
+            tabla = self.valor[nodos]
+            if t < k:
+                # La primera etapa ya incluye la predicción inicial: init + scale * value, como sklearn
+                tabla = self.inicial[t] + tabla
+            tablas.append(tabla)
+            inicio.append(total)
+            total += tamano
+
+        self.tabla = np.concatenate(tablas)
+        self.inicio = np.asarray(inicio, dtype=np.int32)
+        self.usados = [f for f in range(self.n_features) if len(self.umbrales[f])]
+        self.desplazamientos = desplazamientos
+
+    # --- Evaluación ---
+
+    def decision_function(self, X):
+        """
+        Predicción cruda (n, k): la suma, etapa por etapa y en orden, de las hojas.
+        """
+        # sklearn convierte X a float32 antes de recorrer los árboles
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Se esperaban {self.n_features} columnas")
+        # Como sklearn, que no acepta NaN ni infinitos en GradientBoosting*
+        if not np.isfinite(X).all():
+            raise ValueError("X contiene NaN o infinitos")
+        X = X.astype(np.float64)
+
+        k = len(self.inicial)
+        n = X.shape[0]
+        crudo = np.empty((n, k), dtype=np.float64)
+        for desde in range(0, n, BLOQUE_FILAS):
+            bloque = X[desde:desde + BLOQUE_FILAS]
+            indices = np.repeat(self.inicio[:, None], len(bloque), axis=1)
+            for f in self.usados:
+                intervalo = np.searchsorted(self.umbrales[f], bloque[:, f], side="left")
+                indices += np.take(self.desplazamientos[f], intervalo, axis=1)
+            hojas = np.take(self.tabla, indices).reshape(self.n_etapas, k, len(bloque))
+            # accumulate suma en orden, como el `out += scale * value` de sklearn
+            crudo[desde:desde + BLOQUE_FILAS] = np.add.accumulate(hojas, axis=0)[-1].T
+        return crudo
+
+    def _clases(self, crudo):
+        if self.tipo == "regresion":
+            return crudo.ravel()
+        if self.tipo == "binaria":
+            return self.classes_[(crudo[:, 0] >= 0).astype(int)]
+        return self.classes_[np.argmax(crudo, axis=1)]
+
+    def _proba(self, crudo):
+        if self.tipo == "binaria":
+            proba = np.empty((crudo.shape[0], 2), dtype=np.float64)
+            proba[:, 1] = expit(crudo[:, 0])
+            proba[:, 0] = 1 - proba[:, 1]
+            return proba
+        if self.tipo == "multiclase":
+            # Mismo softmax que sklearn.utils.extmath.softmax
+            proba = crudo - np.max(crudo, axis=1).reshape((-1, 1))
+            np.exp(proba, out=proba)
+            proba /= np.sum(proba, axis=1).reshape((-1, 1))
+            return proba
+        raise AttributeError("predict_proba solo existe para clasificadores")
+
+    def predict(self, X):
+        return self._clases(self.decision_function(X))
+
+    def predict_proba(self, X):
+        return self._proba(self.decision_function(X))
+
+    def predict_y_proba(self, X):
+        """
+        predict y predict_proba con una sola pasada por los árboles.
+        """
+        crudo = self.decision_function(X)
+        return self._clases(crudo), self._proba(crudo)
+
+
+# Filas con las que se revisa la paridad cada vez que se aplana un modelo
+FILAS_PARIDAD = int(os.environ.get("ARBOLES_FILAS_PARIDAD", 3000))
+
+
+class ParidadArboles(AssertionError):
+    pass
+
+
+def entradas_prueba(planos, n, rng):
+    """
+    Filas de prueba: un tercio con valores exactamente en los umbrales del modelo (el caso
+    x == umbral decide izquierda/derecha), un tercio justo arriba de un umbral en float32
+    y el resto aleatorio alrededor de los umbrales.
+    """
+    umbrales = planos.threshold[planos.feature >= 0]
+    X = rng.choice(umbrales, size=(n, planos.n_features))
+    tercio = n // 3
+    X[tercio:2 * tercio] = np.nextafter(X[tercio:2 * tercio].astype(np.float32), np.float32(np.inf))
+    X[2 * tercio:] += rng.normal(0, np.abs(X[2 * tercio:]).mean() + 1, size=X[2 * tercio:].shape)
+    return X
+
+
+def verificar_paridad(planos, modelo, filas=FILAS_PARIDAD, semilla=0):
+    """
+    Compara predict (y predict_proba en clasificadores) contra sklearn con entradas_prueba.
+    Lanza ParidadArboles si algo no es exactamente igual: mejor no cargar los árboles que
+    servir predicciones distintas a las del modelo.
+    """
+    X = entradas_prueba(planos, filas, np.random.default_rng(semilla))
+    metodos = ["predict"] + (["predict_proba"] if hasattr(modelo, "predict_proba") else [])
+    for metodo in metodos:
+        with warnings.catch_warnings():
+            # X es un array sin nombres de columnas, igual que en la evaluación normal
+            warnings.filterwarnings("ignore", message="X does not have valid feature names")
+            esperado = getattr(modelo, metodo)(X)
+        obtenido = getattr(planos, metodo)(X)
+        if not np.array_equal(obtenido, esperado):
+            distintas = int(np.any(obtenido != esperado, axis=tuple(range(1, esperado.ndim))).sum())
+            raise ParidadArboles(
+                f"Los árboles aplanados de {type(modelo).__name__} no dan lo mismo que sklearn en "
+                f"{metodo}: {distintas} de {filas} filas distintas"
+            )
+
+
+def aplanar(modelo, verificar=True):
+    planos = ArbolesPlanos.desde_sklearn(modelo)
+    if verificar and FILAS_PARIDAD > 0:
+        verificar_paridad(planos, modelo)
+    return planos
+
+
+# Modelo .pkl -> llaves con GradientBoosting* adentro
+MODELOS = {
+    "modelo/modelo_dual.pkl": ["modelo_cls", "modelo_reg"],
+    "modelo/modeloIncremento.pkl": ["modelo_clf"],
+}
+
+
+def exportar_modelos(carpeta="modelo"):
+    """
+    Escribe modelo/<pkl>_<llave>.npz con los árboles aplanados de cada modelo.
+    """
+    import joblib
+
+    for pkl, llaves in MODELOS.items():
+        obj = joblib.load(pkl)
+        for llave in llaves:
+            nombre = f"{os.path.splitext(os.path.basename(pkl))[0]}_{llave}.npz"
+            aplanar(obj[llave]).guardar(os.path.join(carpeta, nombre))
+            print(f"Exportado {pkl}[{llave}] -> {os.path.join(carpeta, nombre)}")
+
+
+if __name__ == "__main__":
+    exportar_modelos()
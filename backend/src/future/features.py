@@ -0,0 +1,293 @@
+# Features de modelo_dual.pkl y modeloIncremento.pkl, las mismas para entrenar (Training/)
+# y para predecir (src/future/incremento.py).
+# Para entrenar, los CSV se leen por bloques y las matrices quedan en data/store/features/,
+# con el hash de los CSV de entrada como llave: mientras no cambien no se vuelven a calcular.
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FEATURES_DIR = os.path.abspath(os.path.join(BASE_DIR, "../../data/store/features"))
+
+# Filas del CSV por bloque (la memoria depende de esto y del tamaño de los agregados, no del CSV)
+CHUNK_FILAS = int(os.environ.get("FEATURES_CHUNK_FILAS", 500_000))
+# Cambiarla cuando cambie cómo se calculan las features: invalida lo que haya en cache
+VERSION_FEATURES = "1"
+
+FEATURES_DUAL = [
+    "cliente_id", "comercio_id", "giro_id", "tipo_venta_id",
+    "mes", "anio", "dia_semana", "trimestre", "es_fin_de_semana"
+]
+FEATURES_INCREMENTO = [f"mes_{m}" for m in range(1, 8)] + ["giro_id", "tipo_venta_id"]
+
+# Feature -> (columna del CSV, llave del mapa en modelo_dual.pkl)
+MAPAS_DUAL = {
+    "cliente_id": ("id", "map_cliente"),
+    "comercio_id": ("comercio", "map_comercio"),
+    "giro_id": ("giro_comercio", "map_giro"),
+    "tipo_venta_id": ("tipo_venta", "map_tipo"),
+}
+COLUMNAS_TEXTO = ["id", "comercio", "giro_comercio", "tipo_venta"]
+
+
+# --- Features por fila ---
+
+def agregar_mes(df, formato="%Y-%m-%d"):
+    df.columns = df.columns.str.strip()
+    df["fecha"] = pd.to_datetime(df["fecha"], format=formato)
+    df["mes"] = df["fecha"].dt.month
+    df["anio"] = df["fecha"].dt.year
+    return df
+
+
+def agregar_fecha(df, formato="%Y-%m-%d"):
+    agregar_mes(df, formato)
+    df["dia_semana"] = df["fecha"].dt.dayofweek
+    df["trimestre"] = df["fecha"].dt.quarter
+    df["es_fin_de_semana"] = df["dia_semana"].isin([5, 6]).astype(int)
+    return df
+
+
+def limpiar_texto(df, columnas=COLUMNAS_TEXTO):
+    for col in columnas:
+        df[col] = df[col].astype(str).str.strip()
+    return df
+
+
+def indice_mapa(mapa):
+    """
+    Índice hash de un mapa valor -> código, para codificar columnas completas con get_indexer.
+    """
+    return pd.Index(list(mapa.keys())), np.array(list(mapa.values()), dtype=np.int64)
+
+
+def codificar(valores, indice):
+    # Los valores que no están en el mapa quedan en -1, como el fillna(-1) del entrenamiento
+    indice, codigos = indice
+    pos = indice.get_indexer(valores)
+    return np.where(pos >= 0, codigos[pos], -1)
+
+
+def features_dual(df, indices):
+    """
+    Matriz de modelo_dual a partir de las transacciones. indices: {feature: indice_mapa(...)}.
+    """
+    agregar_fecha(df)
+    for destino, (columna, _) in MAPAS_DUAL.items():
+        df[columna] = df[columna].astype(str).str.strip()
+        df[destino] = codificar(df[columna], indices[destino])
+    return df[FEATURES_DUAL]
+
+
+def agregar_por_comercio(df):
+    # Sirve tanto sobre filas como sobre agregados parciales: suma de sumas y máximo de máximos
+    return df.groupby(FEATURES_DUAL).agg(monto=("monto", "sum"), comprara=("comprara", "max")).reset_index()
+
+
+# --- Features de modeloIncremento ---
+
+def codigos_por_cliente(df, columna):
+    """
+    Código = orden de primera aparición del valor dentro de las filas de cada id
+    (para un solo cliente es lo mismo que un mapa sobre todo el DataFrame).
+    """
+    pares = df[["id", columna]].drop_duplicates()
+    codigos = pd.Series(
+        pares.groupby("id").cumcount().to_numpy(),
+        index=pd.MultiIndex.from_frame(pares)
+    )
+    return codigos.reindex(pd.MultiIndex.from_frame(df[["id", columna]])).to_numpy()
+
+
+def parciales_incremento(df):
+    """
+    Agregados de un bloque de filas (con id, comercio, mes, monto, giro_id y tipo_venta_id)
+    que se pueden sumar con los de otros bloques: monto por (id, comercio, mes) y conteo de
+    cada giro_id y tipo_venta_id por (id, comercio).
+    """
+    return {
+        "monto": df.groupby(["id", "comercio", "mes"])["monto"].sum(),
+        "giro_id": df.groupby(["id", "comercio", "giro_id"]).size(),
+        "tipo_venta_id": df.groupby(["id", "comercio", "tipo_venta_id"]).size(),
+    }
+
+
+def _sumar(series):
+    if len(series) == 1:
+        return series[0]
+    return pd.concat(series).groupby(level=list(range(series[0].index.nlevels))).sum()
+
+
+def _moda(conteos, columna):
+    """
+    Igual que groupby(["id", "comercio"])[columna].agg(lambda x: x.mode()[0]):
+    el valor más frecuente y, en empate, el menor.
+    """
+    conteos = conteos.rename("_n").reset_index()
+    conteos = conteos.sort_values(["id", "comercio", "_n", columna], ascending=[True, True, False, True])
+    return conteos.drop_duplicates(["id", "comercio"])[["id", "comercio", columna]]
+
+
+def pivot_incremento(parciales):
+    """
+    Junta los agregados de parciales_incremento en la tabla de modeloIncremento: una fila
+    por (id, comercio) con el gasto de cada mes (mes_1, mes_2, ...) y la moda de giro_id
+    y de tipo_venta_id.
+    """
+    agg_monto = _sumar([p["monto"] for p in parciales]).reset_index()
+    pivot = agg_monto.pivot(index=["id", "comercio"], columns="mes", values="monto").fillna(0)
+    pivot.columns = [f"mes_{col}" for col in pivot.columns]
+
+    agg_features = _moda(_sumar([p["giro_id"] for p in parciales]), "giro_id").merge(
+        _moda(_sumar([p["tipo_venta_id"] for p in parciales]), "tipo_venta_id"), on=["id", "comercio"]
+    )
+    pivot = pivot.merge(agg_features, on=["id", "comercio"], how="left")
+
+    for m in range(1, 8):
+        col = f"mes_{m}"
+        if col not in pivot.columns:
+            pivot[col] = 0.0
+    return pivot
+
+
+# --- Lectura por bloques para entrenar ---
+
+def leer_csv(path, chunksize=CHUNK_FILAS):
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        chunk.columns = chunk.columns.str.strip()
+        yield chunk
+
+
+class MapaIncremental:
+    """
+    Mapa valor -> código en orden de primera aparición, que se arma bloque por bloque:
+    codificar los bloques en orden da los mismos códigos que un mapa sobre el archivo completo.
+    """
+
+    def __init__(self):
+        self.indice = pd.Index([], dtype=object)
+
+    def codificar(self, valores, agregar=True):
+        if agregar:
+            unicos = pd.unique(valores)
+            nuevos = unicos[self.indice.get_indexer(unicos) < 0]
+            if len(nuevos):
+                self.indice = self.indice.append(pd.Index(nuevos, dtype=object))
+        return self.indice.get_indexer(valores)
+
+    def mapa(self):
+        return {v: i for i, v in enumerate(self.indice.tolist())}
+
+
+def _construir_dual(train_csv, otros_csv, chunksize):
+    mapas = {destino: MapaIncremental() for destino in MAPAS_DUAL}
+    tablas = {}
+    # Los mapas salen solo del archivo de entrenamiento; en los demás lo desconocido queda en -1
+    for i, path in enumerate([train_csv] + list(otros_csv)):
+        parciales = []
+        for chunk in leer_csv(path, chunksize):
+            agregar_fecha(chunk)
+            limpiar_texto(chunk)
+            for destino, (columna, _) in MAPAS_DUAL.items():
+                chunk[destino] = mapas[destino].codificar(chunk[columna], agregar=i == 0)
+            chunk["comprara"] = (chunk["monto"] > 0).astype(int)
+            parciales.append(agregar_por_comercio(chunk))
+        tablas[str(i)] = agregar_por_comercio(pd.concat(parciales, ignore_index=True))
+    meta = {"mapas": {mapa: mapas[destino].mapa() for destino, (_, mapa) in MAPAS_DUAL.items()}}
+    return tablas, meta
+
+
+def _construir_incremento(csv_path, anio, chunksize):
+    mapas = {"giro_id": MapaIncremental(), "tipo_venta_id": MapaIncremental()}
+    parciales = []
+    for chunk in leer_csv(csv_path, chunksize):
+        agregar_mes(chunk)
+        chunk = chunk[chunk["anio"] == anio].copy()
+        if chunk.empty:
+            continue
+        limpiar_texto(chunk)
+        chunk["giro_id"] = mapas["giro_id"].codificar(chunk["giro_comercio"])
+        chunk["tipo_venta_id"] = mapas["tipo_venta_id"].codificar(chunk["tipo_venta"])
+        parciales.append(parciales_incremento(chunk))
+
+    pivot = pivot_incremento(parciales)
+    pivot["delta"] = pivot["mes_8"] - pivot["mes_1"]
+    meta = {"mapas": {destino: mapa.mapa() for destino, mapa in mapas.items()}}
+    return {"pivot": pivot[FEATURES_INCREMENTO + ["delta"]]}, meta
+
+
+# --- Cache en disco ---
+
+def hash_entradas(paths, *extra):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps([VERSION_FEATURES] + list(extra)).encode("utf-8"))
+    for path in paths:
+        with open(path, "rb") as f:
+            while True:
+                bloque = f.read(8 * 1024 * 1024)
+                if not bloque:
+                    break
+                h.update(bloque)
+        # Separador entre archivos: (a+b, c) no debe dar lo mismo que (a, b+c)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _guardar(path, tablas, meta):
+    columnas = {}
+    meta = dict(meta, tablas={nombre: list(df.columns) for nombre, df in tablas.items()})
+    for t, (nombre, df) in enumerate(tablas.items()):
+        for c, col in enumerate(df.columns):
+            columnas[f"t{t}_c{c}"] = df[col].to_numpy()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, meta=np.asarray(json.dumps(meta, ensure_ascii=False)), **columnas)
+    os.replace(tmp, path)
+
+
+def _cargar(path):
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data["meta"]))
+        tablas = {
+            nombre: pd.DataFrame({col: data[f"t{t}_c{c}"] for c, col in enumerate(columnas)})
+            for t, (nombre, columnas) in enumerate(meta.pop("tablas").items())
+        }
+    return tablas, meta
+
+
+def en_cache(nombre, paths, construir, *extra, features_dir=FEATURES_DIR):
+    """
+    Regresa (tablas, meta) de construir() o, si ya se calcularon para estos mismos archivos
+    (mismo contenido, misma versión y mismos parámetros extra), de data/store/features/.
+    """
+    path = os.path.join(features_dir, f"{nombre}-{hash_entradas(paths, nombre, *extra)}.npz")
+    if os.path.exists(path):
+        print(f"Features {nombre} desde cache: {path}")
+        return _cargar(path)
+    tablas, meta = construir()
+    _guardar(path, tablas, meta)
+    print(f"Features {nombre} guardadas en: {path}")
+    return tablas, meta
+
+
+def features_entrenamiento_dual(train_csv, otros_csv=(), chunksize=CHUNK_FILAS):
+    """
+    Tablas agregadas por cliente, comercio y fecha (FEATURES_DUAL + monto y comprara) de
+    cada CSV, en el mismo orden, y los mapas de codificación sacados de train_csv.
+    Regresa (mapas, [tabla de train_csv, tablas de otros_csv...]).
+    """
+    paths = [train_csv] + list(otros_csv)
+    tablas, meta = en_cache("dual", paths, lambda: _construir_dual(train_csv, otros_csv, chunksize))
+    return meta["mapas"], list(tablas.values())
+
+
+def features_entrenamiento_incremento(csv_path, anio=2022, chunksize=CHUNK_FILAS):
+    """
+    Tabla de modeloIncremento (FEATURES_INCREMENTO + delta = mes_8 - mes_1) con las
+    transacciones de anio, una fila por (id, comercio).
+    """
+    tablas, _ = en_cache("incremento", [csv_path], lambda: _construir_incremento(csv_path, anio, chunksize), anio)
+    return tablas["pivot"]
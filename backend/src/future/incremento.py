@@ -3,23 +3,60 @@ from fastapi.responses import JSONResponse
 import pandas as pd
 import joblib
 import numpy as np
+import os
+from src.cache import LRUCache, singleflight
+from src.past.read import get_data_version
+from src.past.transaction import TransactionBatch
+from src.arranque import registrar
+from src.future.arboles import aplanar, ParidadArboles
+from src.future.features import (
+    MAPAS_DUAL, agregar_mes, limpiar_texto, indice_mapa, features_dual,
+    codigos_por_cliente, parciales_incremento, pivot_incremento,
+)
+from src.metrics import span, medido, PARSE, MAPPING, AGGREGATE, MODEL
 
 router = APIRouter()
 
-# --- Cargar modelo entrenado ---
-modelo_data = joblib.load("modelo/modeloIncremento.pkl")
-modelo = modelo_data["modelo_clf"]
-label_encoder = modelo_data["label_encoder"]
-features = modelo_data["features"]
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 4096))
 
-obj = joblib.load("modelo/modelo_dual.pkl")
-modelo_cls = obj["modelo_cls"]
-modelo_reg = obj["modelo_reg"]
-cliente_map = obj["map_cliente"]
-comercio_map = obj["map_comercio"]
-giro_map = obj["map_giro"]
-tipo_map = obj["map_tipo"]
+# --- Modelos entrenados (se cargan la primera vez que se usan, ver src/arranque.py) ---
+modelo_incremento = registrar("modelo_incremento", lambda: joblib.load("modelo/modeloIncremento.pkl"))
+modelo_dual = registrar("modelo_dual", lambda: joblib.load("modelo/modelo_dual.pkl"))
 
+# Los mismos árboles aplanados (src/future/arboles.py): dan lo mismo que sklearn sin su costo
+# fijo por llamada. Con lotes grandes (precálculo) sklearn es más rápido, así que solo se usan
+# hasta ARBOLES_MAX_FILAS filas; 0 los desactiva.
+ARBOLES_MAX_FILAS = int(os.environ.get("ARBOLES_MAX_FILAS", 1000))
+
+
+def _sin_paridad_none(cargar):
+    # Si los árboles aplanados no dan lo mismo que sklearn el recurso queda cargado como None:
+    # no se vuelve a aplanar ni a revisar en cada petición y _planos() usa sklearn
+    def cargar_planos():
+        try:
+            return cargar()
+        except ParidadArboles as e:
+            print(f"Árboles aplanados desactivados, se usa sklearn: {e}")
+            return None
+    return cargar_planos
+
+
+arboles_incremento = registrar("arboles_incremento", _sin_paridad_none(
+    lambda: aplanar(modelo_incremento.get()["modelo_clf"])
+))
+arboles_dual = registrar("arboles_dual", _sin_paridad_none(lambda: {
+    llave: aplanar(modelo_dual.get()[llave]) for llave in ("modelo_cls", "modelo_reg")
+}))
+
+
+def _planos(X, arboles):
+    return len(X) <= ARBOLES_MAX_FILAS and arboles.get() is not None
+
+
+MESES_NOMBRES = {
+    1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril", 5: "Mayo", 6: "Junio",
+    7: "Julio", 8: "Agosto", 9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
+}
 
 # --- Mapeo de categorías (como se usó en entrenamiento) ---
 def generar_mapas(df):
@@ -38,90 +75,61 @@ def clasificar_incremento(x):
     else:
         return "bajo"
 
-def predecir_incremento_func(movements):
-    # movements es una lista de Transaction o dicts
-    if movements and isinstance(movements[0], dict):
-        df = pd.DataFrame(movements)
-    else:
-        df = pd.DataFrame([{
-            "id": t.id,
-            "fecha": t.date,
-            "comercio": t.merchant,
-            "giro_comercio": t.merchant_category,
-            "tipo_venta": t.sale_type,
-            "monto": t.amount
-        } for t in movements])
-
-    df.columns = df.columns.str.strip()
-    df["fecha"] = pd.to_datetime(df["fecha"])
-    df["mes"] = df["fecha"].dt.month
-    df["anio"] = df["fecha"].dt.year
-    df_2022 = df[df["anio"] == 2022]
-
-    for col in ["id", "comercio", "giro_comercio", "tipo_venta"]:
-        df_2022[col] = df_2022[col].astype(str).str.strip()
+def predecir_incremento_func(movements, year=2022):
+    with span(PARSE, "predecir_incremento"):
+        df = _movimientos_df(movements)
 
-    giro_map, tipo_map = generar_mapas(df_2022)
-    df_2022["giro_id"] = df_2022["giro_comercio"].map(giro_map).fillna(-1).astype(int)
-    df_2022["tipo_venta_id"] = df_2022["tipo_venta"].map(tipo_map).fillna(-1).astype(int)
+        agregar_mes(df, formato=None)
+        df_anio = limpiar_texto(df[df["anio"] == year].copy())
 
-    agg_monto = df_2022.groupby(["id", "comercio", "mes"])["monto"].sum().reset_index()
-    pivot = agg_monto.pivot(index=["id", "comercio"], columns="mes", values="monto").fillna(0)
-    pivot.columns = [f"mes_{col}" for col in pivot.columns]
+    # Mapas por cliente (para un solo cliente es lo mismo que generar_mapas), así un lote
+    # con muchos clientes da las mismas probabilidades que calificarlos uno por uno
+    with span(MAPPING, "predecir_incremento"):
+        df_anio["giro_id"] = codigos_por_cliente(df_anio, "giro_comercio")
+        df_anio["tipo_venta_id"] = codigos_por_cliente(df_anio, "tipo_venta")
 
-    agg_features = df_2022.groupby(["id", "comercio"]).agg({
-        "giro_id": lambda x: x.mode()[0] if not x.mode().empty else -1,
-        "tipo_venta_id": lambda x: x.mode()[0] if not x.mode().empty else -1
-    }).reset_index()
+    # Las mismas features con las que se entrena (src/future/features.py), en un solo bloque
+    with span(AGGREGATE, "predecir_incremento"):
+        pivot = pivot_incremento([parciales_incremento(df_anio)])
 
-    pivot = pivot.merge(agg_features, on=["id", "comercio"], how="left")
+    modelo_data = modelo_incremento.get()
+    X_pred = pivot[modelo_data["features"]]
 
-    for m in range(1, 8):
-        col = f"mes_{m}"
-        if col not in pivot.columns:
-            pivot[col] = 0.0
-
-    X_pred = pivot[features]
-
-    y_proba = modelo.predict_proba(X_pred)
-    clases = label_encoder.classes_
+    with span(MODEL, "modelo_incremento.predict_proba"):
+        modelo_clf = arboles_incremento.get() if _planos(X_pred, arboles_incremento) else modelo_data["modelo_clf"]
+        y_proba = modelo_clf.predict_proba(X_pred)
+    clases = modelo_data["label_encoder"].classes_
 
+    probas = {f"prob_{clase}": np.round(y_proba[:, j] * 100, 2) for j, clase in enumerate(clases)}
     resultados = []
-    pivot_reset = pivot.reset_index()
-    for i, row in pivot_reset.iterrows():
-        cliente = row["id"]
-        comercio = row["comercio"]
+    for i, (cliente, comercio) in enumerate(zip(pivot["id"], pivot["comercio"])):
         resultado = {
             "id": cliente,
             "comercio": comercio
         }
-        for j, clase in enumerate(clases):
-            resultado[f"prob_{clase}"] = round(y_proba[i][j] * 100, 2)
+        for nombre, valores in probas.items():
+            resultado[nombre] = float(valores[i])
         resultados.append(resultado)
 
     return resultados
 
-def cambio_mensual_func(movements):
-    if movements and isinstance(movements[0], dict):
-        df = pd.DataFrame(movements)
-    else:
-        df = pd.DataFrame([{
-            "id": t.id,
-            "fecha": t.date,
-            "comercio": t.merchant,
-            "giro_comercio": t.merchant_category,
-            "tipo_venta": t.sale_type,
-            "monto": t.amount
-        } for t in movements])
+def predecir_incremento_usuario(user_id, movements, year=2022):
+    # Peticiones concurrentes del mismo usuario (misma versión de datos) comparten el cálculo
+    key = ("predecir_incremento", user_id, year, get_data_version(user_id))
+    return singleflight.hacer(key, lambda: predecir_incremento_func(movements, year))
+
+@medido(AGGREGATE)
+def cambio_mensual_func(movements, year=2022):
+    df = _movimientos_df(movements)
 
     df.columns = df.columns.str.strip()
     df["fecha"] = pd.to_datetime(df["fecha"])
     df["mes"] = df["fecha"].dt.month
     df["anio"] = df["fecha"].dt.year
 
-    df_2022 = df[df["anio"] == 2022]
+    df_anio = df[df["anio"] == year]
 
-    gasto_mensual = df_2022.groupby("mes")["monto"].sum().sort_index()
+    gasto_mensual = df_anio.groupby("mes")["monto"].sum().sort_index()
     cambios_pct = gasto_mensual.pct_change() * 100
 
     meses_nombres = {
@@ -190,58 +198,38 @@ def cambio_mensual_func(movements):
         "gasto_por_mes": gasto_por_mes
     }
 
-def predictedFuture(movements, modo="suma"):
-    """
-    Predice los futuros gastos por cliente y comercio usando modelos de clasificación y regresión.
-    Recibe una lista movements (Transaction o dict), procesa igual que predict.py.
-    Retorna el top 5 comercios por cliente con el monto predicho y el monto total predecido del siguiente año.
-    Además, calcula los montos por mes y el total usando la lógica de cambio_mensual_func.
-    """
-    # Si movements es una lista de Transaction, conviértelo a DataFrame
-    if movements and isinstance(movements[0], dict):
-        df = pd.DataFrame(movements)
-    else:
-        df = pd.DataFrame([{
-            "id": t.id,
-            "fecha": t.date,
-            "comercio": t.merchant,
-            "giro_comercio": t.merchant_category,
-            "tipo_venta": t.sale_type,
-            "monto": t.amount
-        } for t in movements])
+def _movimientos_df(movements):
+    # movements es una lista de Transaction o dicts, un TransactionBatch o un DataFrame ya armado
+    if isinstance(movements, pd.DataFrame):
+        return movements.copy()
+    if isinstance(movements, TransactionBatch):
+        return movements.to_frame()
+    if len(movements) and isinstance(movements[0], dict):
+        return pd.DataFrame(movements)
+    return pd.DataFrame([{
+        "id": t.id,
+        "fecha": t.date,
+        "comercio": t.merchant,
+        "giro_comercio": t.merchant_category,
+        "tipo_venta": t.sale_type,
+        "monto": t.amount
+    } for t in movements])
 
-    df.columns = df.columns.str.strip()
-    df["fecha"] = pd.to_datetime(df["fecha"], format="%Y-%m-%d")
-    df["mes"] = df["fecha"].dt.month
-    df["anio"] = df["fecha"].dt.year
-    df["dia_semana"] = df["fecha"].dt.dayofweek
-    df["trimestre"] = df["fecha"].dt.quarter
-    df["es_fin_de_semana"] = df["dia_semana"].isin([5, 6]).astype(int)
-
-    df["id"] = df["id"].astype(str).str.strip()
-    df["comercio"] = df["comercio"].astype(str).str.strip()
-    df["giro_comercio"] = df["giro_comercio"].astype(str).str.strip()
-    df["tipo_venta"] = df["tipo_venta"].astype(str).str.strip()
-
-    df["cliente_id"] = df["id"].map(cliente_map).fillna(-1).astype(int)
-    df["comercio_id"] = df["comercio"].map(comercio_map).fillna(-1).astype(int)
-    df["giro_id"] = df["giro_comercio"].map(giro_map).fillna(-1).astype(int)
-    df["tipo_venta_id"] = df["tipo_venta"].map(tipo_map).fillna(-1).astype(int)
-
-    features = [
-        "cliente_id", "comercio_id", "giro_id", "tipo_venta_id",
-        "mes", "anio", "dia_semana", "trimestre", "es_fin_de_semana"
-    ]
 
-    X = df[features]
-    pred_cls = modelo_cls.predict(X)
-    prob_cls = modelo_cls.predict_proba(X)[:, 1]
-    pred_reg = np.expm1(modelo_reg.predict(X))
+def _cargar_indices_mapas():
+    obj = modelo_dual.get()
+    return {destino: indice_mapa(obj[mapa]) for destino, (_, mapa) in MAPAS_DUAL.items()}
 
-    df["prob_compra"] = prob_cls
-    df["comprara"] = pred_cls
-    df["pred_monto"] = np.where(pred_cls == 1, pred_reg, 0.0)
 
+# Índices hash de los mapas de entrenamiento, para codificar columnas completas con get_indexer
+_indices_mapas = registrar("indices_mapas", _cargar_indices_mapas)
+
+
+def _features_prediccion(df):
+    return features_dual(df, _indices_mapas.get())
+
+
+def _resultado_prediccion(df, por_mes=False):
     result = (
         df.groupby(["id", "comercio"])["pred_monto"].mean().reset_index()
           .sort_values(["id", "pred_monto"], ascending=[True, False])
@@ -250,24 +238,116 @@ def predictedFuture(movements, modo="suma"):
     )
 
     # Calcular montos por mes y total usando la lógica de cambio_mensual_func
-    df["mes"] = df["fecha"].dt.month
     monto_por_mes = df.groupby("mes")["pred_monto"].sum().sort_index()
-    meses_nombres = {
-        1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril", 5: "Mayo", 6: "Junio",
-        7: "Julio", 8: "Agosto", 9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
-    }
-    gasto_por_mes = [
-        {"mes": meses_nombres.get(mes, str(mes)), "gasto": round(monto, 2)}
-        for mes, monto in monto_por_mes.items()
-    ]
     total_predicho = round(monto_por_mes.sum(), 2)
 
-    # Solo publica comercio y pred_monto, y agrega el total y los montos por mes
+    # Solo publica comercio y pred_monto, y agrega el total
     output = [
-        {"comercio": row["comercio"], "pred_monto": row["pred_monto"]*12}
-        for _, row in result.iterrows()
+        {"comercio": comercio, "pred_monto": pred_monto*12}
+        for comercio, pred_monto in zip(result["comercio"], result["pred_monto"])
     ]
-    return {
+    resultado = {
         "top5": output,
         "total_anual": total_predicho
     }
+    if por_mes:
+        resultado["gasto_por_mes"] = [
+            {"mes": MESES_NOMBRES.get(mes, str(mes)), "gasto": round(monto, 2)}
+            for mes, monto in monto_por_mes.items()
+        ]
+    return resultado
+
+
+def predictedFuture_batch(movements_por_usuario, modo="suma", por_mes=False):
+    """
+    Versión por lote de predictedFuture: recibe {llave: movements} y regresa {llave: resultado}.
+    Todas las filas se califican con una sola llamada a predict por modelo.
+    Con por_mes=True cada resultado incluye también el gasto predicho por mes.
+    """
+    frames = []
+    with span(PARSE, "predictedFuture"):
+        for i, (llave, movements) in enumerate(movements_por_usuario.items()):
+            if len(movements):
+                df = _movimientos_df(movements)
+                df["_lote"] = i
+                frames.append(df)
+
+    vacio = {"top5": [], "total_anual": 0.0, "gasto_por_mes": []} if por_mes else {"top5": [], "total_anual": 0.0}
+    resultados = {llave: dict(vacio) for llave in movements_por_usuario}
+    if not frames:
+        return resultados
+
+    with span(MAPPING, "predictedFuture"):
+        df = pd.concat(frames, ignore_index=True)
+        X = _features_prediccion(df)
+    with span(MODEL, "modelo_dual.predict"):
+        if _planos(X, arboles_dual):
+            arboles = arboles_dual.get()
+            pred_cls, prob_cls = arboles["modelo_cls"].predict_y_proba(X)
+            prob_cls = prob_cls[:, 1]
+            pred_reg = np.expm1(arboles["modelo_reg"].predict(X))
+        else:
+            obj = modelo_dual.get()
+            modelo_cls, modelo_reg = obj["modelo_cls"], obj["modelo_reg"]
+            pred_cls = modelo_cls.predict(X)
+            prob_cls = modelo_cls.predict_proba(X)[:, 1]
+            pred_reg = np.expm1(modelo_reg.predict(X))
+
+    df["prob_compra"] = prob_cls
+    df["comprara"] = pred_cls
+    df["pred_monto"] = np.where(pred_cls == 1, pred_reg, 0.0)
+
+    llaves = list(movements_por_usuario)
+    with span(AGGREGATE, "predictedFuture"):
+        for i, grupo in df.groupby("_lote", sort=False):
+            resultados[llaves[i]] = _resultado_prediccion(grupo, por_mes)
+    return resultados
+
+
+def predictedFuture(movements, modo="suma"):
+    """
+    Predice los futuros gastos por cliente y comercio usando modelos de clasificación y regresión.
+    Recibe una lista movements (Transaction o dict), procesa igual que predict.py.
+    Retorna el top 5 comercios por cliente con el monto predicho y el monto total predecido del siguiente año.
+    Además, calcula los montos por mes y el total usando la lógica de cambio_mensual_func.
+    """
+    return predictedFuture_batch({0: movements}, modo)[0]
+
+
+# --- Cache de predicciones por (usuario, año, versión de datos) ---
+prediccion_cache = LRUCache(maxsize=PREDICTION_CACHE_SIZE, nombre="predicciones")
+
+
+def llave_prediccion(user_id, year, modo="suma"):
+    return (user_id, year, get_data_version(user_id), modo)
+
+
+def predictedFuture_usuario(user_id, year, movements_year, modo="suma"):
+    """
+    predictedFuture con cache: mientras la versión de los datos del usuario no cambie,
+    las peticiones repetidas no vuelven a correr los modelos, y las concurrentes esperan
+    al mismo cálculo (get_or_set usa singleflight).
+    """
+    key = llave_prediccion(user_id, year, modo)
+    return prediccion_cache.get_or_set(key, lambda: predictedFuture(movements_year, modo))
+
+
+def predictedFuture_usuarios(movements_por_usuario, year, modo="suma"):
+    """
+    Califica varios usuarios ({user_id: movements del año}) en un solo predict,
+    reutilizando los que ya estén en cache.
+    """
+    keys = {u: llave_prediccion(u, year, modo) for u in movements_por_usuario}
+    resultados = {}
+    pendientes = {}
+    for u, key in keys.items():
+        cacheado = prediccion_cache.get(key)
+        if cacheado is None:
+            pendientes[u] = movements_por_usuario[u]
+        else:
+            resultados[u] = cacheado
+
+    for u, resultado in predictedFuture_batch(pendientes, modo).items():
+        prediccion_cache.set(keys[u], resultado)
+        resultados[u] = resultado
+    return resultados
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from src.metrics import span, contar, EXTERNAL
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Se puede apuntar a un servidor local (stub) para pruebas con FOURSQUARE_URL
+FOURSQUARE_URL = os.environ.get("FOURSQUARE_URL", "https://api.foursquare.com/v3/places/search")
+FOURSQUARE_API_KEY = os.environ.get("FOURSQUARE_API_KEY", "fsq3jRQ+AaizYAQIJjSe31snrDAUyobhW0O3D+lqZnKzk/Q=")
+PLACES_CACHE_PATH = os.path.abspath(os.path.join(BASE_DIR, "../../data/store/places_cache.sqlite"))
+PLACES_TTL = int(os.environ.get("PLACES_TTL", 24 * 3600))
+
+
+class CacheTTL:
+    """
+    Cache con expiración guardado en SQLite, así sobrevive a reinicios del servidor.
+    """
+
+    def __init__(self, path=PLACES_CACHE_PATH, ttl=PLACES_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._con = sqlite3.connect(path, check_same_thread=False)
+        self._con.execute("CREATE TABLE IF NOT EXISTS cache (clave TEXT PRIMARY KEY, valor TEXT, expira REAL)")
+        self._con.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, clave):
+        with self._lock:
+            fila = self._con.execute("SELECT valor, expira FROM cache WHERE clave = ?", (clave,)).fetchone()
+        if fila is None or fila[1] < time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(fila[0])
+
+    def set(self, clave, valor):
+        with self._lock:
+            self._con.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?)",
+                (clave, json.dumps(valor, ensure_ascii=False), time.time() + self.ttl)
+            )
+            self._con.commit()
+
+    def items(self):
+        """
+        Todas las respuestas guardadas (vigentes o no) como (clave, valor).
+        """
+        with self._lock:
+            filas = self._con.execute("SELECT clave, valor FROM cache").fetchall()
+        return [(clave, json.loads(valor)) for clave, valor in filas]
+
+
+def clave_places(latitude, longitude, radius, category_id, limit):
+    # Coordenadas redondeadas a ~100m para que peticiones cercanas compartan cache
+    return f"{round(latitude, 3)},{round(longitude, 3)}|{radius}|{category_id}|{limit}"
+
+
+class PlacesClient:
+    """
+    Cliente de búsqueda de lugares: una sesión HTTP con pool de conexiones, timeout,
+    peticiones concurrentes por categoría (sin repetir categorías) y cache TTL.
+    """
+
+    def __init__(self, base_url=FOURSQUARE_URL, api_key=FOURSQUARE_API_KEY, timeout=5.0,
+                 max_workers=8, cache=None):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.cache = cache
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Accept": "application/json",
+            "Authorization": api_key
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def buscar(self, latitude, longitude, category_id, radius=10000, limit=3):
+        """
+        Regresa (status_code, results) para una categoría. status_code es None si la petición falló.
+        Solo se cachean las respuestas 200.
+        """
+        clave = clave_places(latitude, longitude, radius, category_id, limit)
+        if self.cache is not None:
+            cacheado = self.cache.get(clave)
+            if cacheado is not None:
+                contar("wrapped_places_total", resultado="cache")
+                return 200, cacheado
+
+        params = {
+            "ll": f"{latitude},{longitude}",
+            "radius": radius,
+            "limit": limit,
+            "categories": category_id
+        }
+        try:
+            with span(EXTERNAL, "foursquare"):
+                response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"Error con categoría {category_id}: {e}")
+            contar("wrapped_places_total", resultado="error")
+            return None, []
+
+        if response.status_code != 200:
+            contar("wrapped_places_total", resultado="error")
+            return response.status_code, []
+
+        contar("wrapped_places_total", resultado="ok")
+
+        results = response.json().get("results", [])
+        if self.cache is not None:
+            self.cache.set(clave, results)
+        return 200, results
+
+    def buscar_categorias(self, latitude, longitude, category_ids, radius=10000, limit=3):
+        """
+        Busca todas las categorías en paralelo; las repetidas se piden una sola vez.
+        Regresa {category_id: (status_code, results)}.
+        """
+        unicas = list(dict.fromkeys(category_ids))
+        if not unicas:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(unicas))) as pool:
+            respuestas = pool.map(lambda c: self.buscar(latitude, longitude, c, radius, limit), unicas)
+            return dict(zip(unicas, respuestas))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_places_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = PlacesClient(cache=CacheTTL())
+        return _client
+
+
+def set_places_client(client):
+    """
+    Reemplaza el cliente global (por ejemplo, uno apuntando a un servidor stub).
+    """
+    global _client
+    with _client_lock:
+        _client = client
@@ -0,0 +1,199 @@
+import os
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from src.future.places import get_places_client
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PLACES_CSV_PATH = os.environ.get(
+    "PLACES_CSV", os.path.abspath(os.path.join(BASE_DIR, "../../data/places.csv"))
+)
+RADIO_TIERRA = 6_371_000.0
+
+
+def _a_xyz(latitude, longitude):
+    """
+    Coordenadas en la esfera unitaria: la distancia euclidiana (cuerda) crece igual
+    que la distancia sobre la superficie, así el KD-tree ordena bien por cercanía.
+    """
+    lat = np.radians(np.asarray(latitude, dtype=np.float64))
+    lon = np.radians(np.asarray(longitude, dtype=np.float64))
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def _cuerda(radius):
+    # Radio en metros -> distancia máxima en la esfera unitaria
+    return 2 * np.sin(min(radius / (2 * RADIO_TIERRA), np.pi / 2))
+
+
+def _coordenadas(lugar):
+    main = lugar.get("geocodes", {}).get("main", {})
+    return main.get("latitude"), main.get("longitude")
+
+
+def _llave_lugar(lugar):
+    if lugar.get("fsq_id"):
+        return lugar["fsq_id"]
+    latitude, longitude = _coordenadas(lugar)
+    return (lugar.get("name"), latitude, longitude)
+
+
+class IndicePlaces:
+    """
+    Índice local de lugares: un KD-tree por categoría de Foursquare.
+    Los lugares se guardan con el mismo formato que los `results` de la API,
+    así get_top_places_by_categories los arma igual vengan de donde vengan.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lugares = {}   # category_id -> {llave: lugar}
+        self._arboles = {}   # category_id -> (cKDTree, [lugares])
+        self._sucias = set()
+
+    def agregar(self, category_id, lugares):
+        category_id = str(category_id)
+        with self._lock:
+            por_llave = self._lugares.setdefault(category_id, {})
+            for lugar in lugares:
+                latitude, longitude = _coordenadas(lugar)
+                if latitude is None or longitude is None:
+                    continue
+                por_llave[_llave_lugar(lugar)] = lugar
+            self._sucias.add(category_id)
+
+    def _arbol(self, category_id):
+        # scipy se importa hasta que se arma el primer árbol, para no cargarlo al arrancar la API
+        from scipy.spatial import cKDTree
+        with self._lock:
+            if category_id in self._sucias:
+                lugares = list(self._lugares[category_id].values())
+                coords = [_coordenadas(l) for l in lugares]
+                arbol = cKDTree(_a_xyz([c[0] for c in coords], [c[1] for c in coords])) if lugares else None
+                self._arboles[category_id] = (arbol, lugares)
+                self._sucias.discard(category_id)
+            return self._arboles.get(category_id, (None, []))
+
+    def cercanos(self, latitude, longitude, category_id, radius=10000, limit=3):
+        """
+        Los `limit` lugares de la categoría más cercanos a (latitude, longitude) dentro de `radius` metros.
+        """
+        arbol, lugares = self._arbol(str(category_id))
+        if arbol is None:
+            return []
+        k = min(limit, len(lugares))
+        if k < 1:
+            return []
+        lat, lon = math.radians(latitude), math.radians(longitude)
+        punto = (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+        distancias, indices = arbol.query(punto, k=list(range(1, k + 1)),
+                                          distance_upper_bound=_cuerda(radius))
+        return [lugares[i] for d, i in zip(distancias, indices) if np.isfinite(d)]
+
+    def __len__(self):
+        return sum(len(l) for l in self._lugares.values())
+
+    def categorias(self):
+        return list(self._lugares)
+
+    # --- Carga ---
+
+    def cargar_cache(self, cache):
+        """
+        Carga todas las respuestas guardadas en el cache de PlacesClient (aunque ya hayan expirado).
+        """
+        for clave, results in cache.items():
+            self.agregar(clave.split("|")[2], results)
+
+    def cargar_csv(self, path):
+        """
+        CSV de lugares con columnas category_id, category, commerce, address, latitude, longitude.
+        """
+        df = pd.read_csv(path, dtype={"category_id": str}, keep_default_na=False)
+        for category_id, grupo in df.groupby("category_id", sort=False):
+            self.agregar(category_id, [
+                {
+                    "name": fila.commerce,
+                    "categories": [{"name": fila.category}],
+                    "location": {"formatted_address": fila.address},
+                    "geocodes": {"main": {"latitude": float(fila.latitude), "longitude": float(fila.longitude)}},
+                }
+                for fila in grupo.itertuples(index=False)
+            ])
+
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+def get_indice_places():
+    """
+    Índice global, construido la primera vez desde el cache de respuestas y el CSV de lugares (si existe).
+    """
+    global _indice
+    with _indice_lock:
+        if _indice is None:
+            indice = IndicePlaces()
+            cache = getattr(get_places_client(), "cache", None)
+            if cache is not None:
+                indice.cargar_cache(cache)
+            if os.path.exists(PLACES_CSV_PATH):
+                indice.cargar_csv(PLACES_CSV_PATH)
+            print(f"Índice de lugares: {len(indice)} lugares en {len(indice.categorias())} categorías")
+            _indice = indice
+        return _indice
+
+
+# --- Refresco en segundo plano con la API ---
+
+_refrescos = ThreadPoolExecutor(max_workers=2)
+_pendientes = set()
+_pendientes_lock = threading.Lock()
+
+
+def _refrescar(llave, latitude, longitude, category_id, radius, limit):
+    try:
+        status_code, results = get_places_client().buscar(latitude, longitude, category_id, radius, limit)
+        if status_code == 200:
+            get_indice_places().agregar(category_id, results)
+    finally:
+        with _pendientes_lock:
+            _pendientes.discard(llave)
+
+
+def refrescar_en_segundo_plano(latitude, longitude, category_id, radius=10000, limit=3):
+    # El cliente responde desde su cache mientras siga vigente, así que esto casi nunca sale a la red
+    llave = (round(latitude, 3), round(longitude, 3), radius, str(category_id), limit)
+    with _pendientes_lock:
+        if llave in _pendientes:
+            return
+        _pendientes.add(llave)
+    _refrescos.submit(_refrescar, llave, latitude, longitude, category_id, radius, limit)
+
+
+def buscar_lugares(latitude, longitude, category_ids, radius=10000, limit=3):
+    """
+    Igual que PlacesClient.buscar_categorias, pero contesta desde el índice local.
+    Solo las categorías sin lugares cerca se piden a la API en el momento; las demás
+    se refrescan en segundo plano.
+    """
+    indice = get_indice_places()
+    respuestas = {}
+    faltantes = []
+    for category_id in dict.fromkeys(category_ids):
+        lugares = indice.cercanos(latitude, longitude, category_id, radius, limit)
+        if lugares:
+            respuestas[category_id] = (200, lugares)
+            refrescar_en_segundo_plano(latitude, longitude, category_id, radius, limit)
+        else:
+            faltantes.append(category_id)
+
+    if faltantes:
+        en_vivo = get_places_client().buscar_categorias(latitude, longitude, faltantes, radius, limit)
+        for category_id, (status_code, results) in en_vivo.items():
+            if status_code == 200:
+                indice.agregar(category_id, results)
+        respuestas.update(en_vivo)
+    return respuestas
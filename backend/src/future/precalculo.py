@@ -0,0 +1,183 @@
+# Calificación offline de toda la base de clientes con los dos modelos.
+# Uso (desde backend/): python -m src.future.precalculo --anio 2022 --procesos 8
+import os
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import threading
+import zlib
+from multiprocessing import Pool
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TRANSACCIONES_PATH = os.path.abspath(os.path.join(BASE_DIR, "../../data/base_transacciones_final.csv"))
+PRECALCULO_PATH = os.path.abspath(os.path.join(BASE_DIR, "../../data/store/predicciones.sqlite"))
+CAMPOS = ("predicted_future", "gasto_por_mes", "incremento")
+
+
+def firma_archivo(path):
+    st = os.stat(path)
+    return f"{st.st_mtime_ns}-{st.st_size}"
+
+
+def _particion(ids, n_particiones):
+    # crc32 es estable entre procesos (hash() de Python no lo es)
+    return ids.map(lambda u: zlib.crc32(u.encode("utf-8")) % n_particiones)
+
+
+def _particionar(csv_path, tmp_dir, n_particiones, chunksize):
+    """
+    Reparte el CSV por cliente en archivos pickle por (partición, chunk).
+    Todas las filas de un cliente quedan en la misma partición y en su orden original.
+    """
+    archivos = {p: [] for p in range(n_particiones)}
+    filas = 0
+    for n_chunk, chunk in enumerate(pd.read_csv(csv_path, chunksize=chunksize)):
+        chunk.columns = chunk.columns.str.strip()
+        chunk["id"] = chunk["id"].astype(str).str.strip()
+        filas += len(chunk)
+        for p, parte in chunk.groupby(_particion(chunk["id"], n_particiones), sort=False):
+            path = os.path.join(tmp_dir, f"part-{p:04d}-{n_chunk:06d}.pkl")
+            parte.to_pickle(path)
+            archivos[p].append(path)
+    return archivos, filas
+
+
+def _calificar_particion(args):
+    from src.future.incremento import predictedFuture_batch, predecir_incremento_func
+
+    archivos, anio = args
+    if not archivos:
+        return []
+    df = pd.concat([pd.read_pickle(a) for a in archivos], ignore_index=True)
+    df_anio = df[df["fecha"].astype(str).str[:4] == str(anio)]
+
+    por_usuario = {u: g for u, g in df_anio.groupby("id", sort=False)}
+    futuros = predictedFuture_batch(por_usuario, por_mes=True)
+
+    incrementos = {}
+    for fila in predecir_incremento_func(df, anio):
+        incrementos.setdefault(fila["id"], []).append(fila)
+
+    filas = []
+    for u in df["id"].unique().tolist():
+        futuro = futuros.get(u, {"top5": [], "total_anual": 0.0, "gasto_por_mes": []})
+        gasto_por_mes = futuro.pop("gasto_por_mes")
+        filas.append((
+            u, anio,
+            json.dumps(futuro, ensure_ascii=False),
+            json.dumps(gasto_por_mes, ensure_ascii=False),
+            json.dumps(incrementos.get(u, []), ensure_ascii=False),
+        ))
+    return filas
+
+
+def _crear_tablas(con):
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS predicciones (
+            id TEXT NOT NULL,
+            anio INTEGER NOT NULL,
+            predicted_future TEXT NOT NULL,
+            gasto_por_mes TEXT NOT NULL,
+            incremento TEXT NOT NULL,
+            PRIMARY KEY (id, anio)
+        )
+    """)
+    con.execute("CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT)")
+
+
+def precalcular(csv_path=TRANSACCIONES_PATH, db_path=PRECALCULO_PATH, anio=2022,
+                procesos=None, particiones=None, chunksize=200_000):
+    """
+    Lee el CSV por chunks, reparte las filas por hash del cliente en particiones temporales
+    y califica cada partición en un proceso distinto con modelo_dual.pkl (top 5 comercios,
+    total anual y gasto por mes) y modeloIncremento.pkl (probabilidades prob_*).
+    Guarda una fila por (id, anio) en SQLite y regresa filas, clientes y filas por segundo.
+    """
+    inicio = time.time()
+    procesos = procesos or os.cpu_count() or 1
+    particiones = particiones or procesos * 4
+
+    tmp_dir = db_path + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    try:
+        archivos, filas = _particionar(csv_path, tmp_dir, particiones, chunksize)
+        t_particion = time.time() - inicio
+        print(f"Particionado: {filas} filas en {particiones} particiones ({t_particion:.1f}s)")
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        con = sqlite3.connect(db_path)
+        _crear_tablas(con)
+        con.execute("DELETE FROM predicciones WHERE anio = ?", (anio,))
+
+        clientes = 0
+        tareas = [(archivos[p], anio) for p in range(particiones)]
+        with Pool(procesos) as pool:
+            for resultado in pool.imap_unordered(_calificar_particion, tareas):
+                con.executemany("INSERT OR REPLACE INTO predicciones VALUES (?, ?, ?, ?, ?)", resultado)
+                clientes += len(resultado)
+
+        con.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (f"fuente_{anio}", firma_archivo(csv_path)))
+        con.commit()
+        con.close()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    duracion = time.time() - inicio
+    reporte = {
+        "filas": filas,
+        "clientes": clientes,
+        "procesos": procesos,
+        "segundos": round(duracion, 2),
+        "filas_por_segundo": round(filas / duracion, 1) if duracion else None,
+    }
+    print(f"Precálculo {anio}: {clientes} clientes, {filas} filas en {duracion:.1f}s "
+          f"({reporte['filas_por_segundo']} filas/s, {procesos} procesos)")
+    return reporte
+
+
+# --- Lectura desde la API ---
+
+_con = None
+_con_lock = threading.Lock()
+
+
+def get_prediccion_precalculada(user_id, anio, campo="predicted_future",
+                                db_path=PRECALCULO_PATH, csv_path=TRANSACCIONES_PATH):
+    """
+    Regresa el campo precalculado (predicted_future, gasto_por_mes o incremento) del cliente,
+    o None si no hay precálculo vigente (el CSV cambió desde que se corrió).
+    """
+    global _con
+    if campo not in CAMPOS or not os.path.exists(db_path):
+        return None
+
+    with _con_lock:
+        if _con is None:
+            _con = sqlite3.connect(db_path, check_same_thread=False)
+        try:
+            fuente = _con.execute("SELECT valor FROM meta WHERE clave = ?", (f"fuente_{anio}",)).fetchone()
+            if fuente is None or not os.path.exists(csv_path) or fuente[0] != firma_archivo(csv_path):
+                return None
+            fila = _con.execute(
+                f"SELECT {campo} FROM predicciones WHERE id = ? AND anio = ?", (user_id, anio)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+    return json.loads(fila[0]) if fila else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precalcula predicciones para todos los clientes")
+    parser.add_argument("--csv", default=TRANSACCIONES_PATH)
+    parser.add_argument("--db", default=PRECALCULO_PATH)
+    parser.add_argument("--anio", type=int, default=2022)
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--particiones", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    args = parser.parse_args()
+    precalcular(args.csv, args.db, args.anio, args.procesos, args.particiones, args.chunksize)
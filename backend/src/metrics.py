@@ -0,0 +1,259 @@
+import os
+import re
+import json
+import time
+import random
+import marshal
+import inspect
+import cProfile
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILES_DIR = os.path.abspath(os.path.join(BASE_DIR, "../data/store/profiles"))
+
+# Límites de los buckets de los histogramas, en segundos
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Etapas en las que se reparte el tiempo de una petición
+LOAD, PARSE, MAPPING, AGGREGATE, MODEL, EXTERNAL = "load", "parse", "mapping", "aggregate", "model", "external"
+
+_lock = threading.Lock()
+_histogramas = {}   # (metrica, labels) -> [conteos por bucket..., suma, total]
+_contadores = {}    # (metrica, labels) -> valor
+_medidores = {}     # (metrica, labels) -> valor
+_ayuda = {}
+
+# Petición en curso (la pone el middleware de main.py; los spans se anotan en ella)
+_solicitud = contextvars.ContextVar("solicitud", default=None)
+
+
+def _llave(metrica, labels):
+    return metrica, tuple(sorted(labels.items()))
+
+
+def observar(metrica, segundos, **labels):
+    llave = _llave(metrica, labels)
+    with _lock:
+        h = _histogramas.get(llave)
+        if h is None:
+            h = _histogramas[llave] = [0] * (len(BUCKETS) + 2)
+        for i, limite in enumerate(BUCKETS):
+            if segundos <= limite:
+                h[i] += 1
+                break
+        h[-2] += segundos
+        h[-1] += 1
+
+
+def contar(metrica, n=1, **labels):
+    llave = _llave(metrica, labels)
+    with _lock:
+        _contadores[llave] = _contadores.get(llave, 0) + n
+
+
+def medidor(metrica, valor, **labels):
+    with _lock:
+        _medidores[_llave(metrica, labels)] = valor
+
+
+def describir(metrica, texto):
+    _ayuda[metrica] = texto
+
+
+describir("wrapped_etapa_duracion_segundos", "Tiempo por etapa (load, parse, mapping, aggregate, model, external)")
+describir("wrapped_etapa_llamadas_total", "Llamadas por etapa")
+describir("wrapped_etapa_errores_total", "Excepciones por etapa")
+describir("wrapped_http_duracion_segundos", "Latencia por ruta")
+describir("wrapped_http_peticiones_total", "Peticiones por ruta y status")
+
+
+@contextmanager
+def span(etapa, nombre):
+    """
+    Mide un bloque: histograma wrapped_etapa_duracion_segundos{etapa, nombre} y contador de llamadas.
+    Si hay una petición en curso también queda en su desglose.
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        contar("wrapped_etapa_errores_total", etapa=etapa, nombre=nombre)
+        raise
+    finally:
+        duracion = time.perf_counter() - inicio
+        observar("wrapped_etapa_duracion_segundos", duracion, etapa=etapa, nombre=nombre)
+        contar("wrapped_etapa_llamadas_total", etapa=etapa, nombre=nombre)
+        solicitud = _solicitud.get()
+        if solicitud is not None:
+            solicitud.spans.append((etapa, nombre, round(duracion * 1000, 3)))
+
+
+def registrar_spans(spans):
+    """
+    Registra spans medidos en otro proceso (ver src/ejecucion.py) como si hubieran corrido aquí.
+    """
+    solicitud = _solicitud.get()
+    for etapa, nombre, ms in spans:
+        observar("wrapped_etapa_duracion_segundos", ms / 1000, etapa=etapa, nombre=nombre)
+        contar("wrapped_etapa_llamadas_total", etapa=etapa, nombre=nombre)
+        if solicitud is not None:
+            solicitud.spans.append((etapa, nombre, ms))
+
+
+def medido(etapa, nombre=None):
+    """
+    Decorador equivalente a envolver toda la función en span(etapa, nombre).
+    """
+    def decorador(func):
+        etiqueta = nombre or func.__name__
+
+        @functools.wraps(func)
+        def envuelta(*args, **kwargs):
+            with span(etapa, etiqueta):
+                return func(*args, **kwargs)
+        return envuelta
+    return decorador
+
+
+# --- Exportación en formato de texto de Prometheus ---
+
+def _formatear_labels(labels, extra=()):
+    pares = list(labels) + list(extra)
+    if not pares:
+        return ""
+    valores = ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in pares)
+    return "{" + valores + "}"
+
+
+def exportar_prometheus():
+    lineas = []
+    with _lock:
+        histogramas = {k: list(v) for k, v in _histogramas.items()}
+        contadores = dict(_contadores)
+        medidores = dict(_medidores)
+
+    def encabezado(nombre, tipo, vistos):
+        if nombre not in vistos:
+            vistos.add(nombre)
+            if nombre in _ayuda:
+                lineas.append(f"# HELP {nombre} {_ayuda[nombre]}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+
+    vistos = set()
+    for (nombre, labels), h in sorted(histogramas.items()):
+        encabezado(nombre, "histogram", vistos)
+        acumulado = 0
+        for limite, conteo in zip(BUCKETS, h):
+            acumulado += conteo
+            lineas.append(f"{nombre}_bucket{_formatear_labels(labels, [('le', limite)])} {acumulado}")
+        lineas.append(f"{nombre}_bucket{_formatear_labels(labels, [('le', '+Inf')])} {h[-1]}")
+        lineas.append(f"{nombre}_sum{_formatear_labels(labels)} {h[-2]}")
+        lineas.append(f"{nombre}_count{_formatear_labels(labels)} {h[-1]}")
+    for (nombre, labels), valor in sorted(contadores.items()):
+        encabezado(nombre, "counter", vistos)
+        lineas.append(f"{nombre}{_formatear_labels(labels)} {valor}")
+    for (nombre, labels), valor in sorted(medidores.items()):
+        encabezado(nombre, "gauge", vistos)
+        lineas.append(f"{nombre}{_formatear_labels(labels)} {valor}")
+    return "\n".join(lineas) + "\n"
+
+
+# --- Peticiones y profiler opcional para peticiones lentas ---
+
+class Solicitud:
+    def __init__(self, perfilar=False):
+        self.spans = []
+        self.perfilar = perfilar
+        self.perfil = None
+
+
+# PROFILER_UMBRAL_MS > 0 activa el profiler: se perfila una fracción PROFILER_MUESTREO de las
+# peticiones y se guardan las que tarden más que el umbral
+profiler = {
+    "umbral_ms": float(os.environ.get("PROFILER_UMBRAL_MS", 0)),
+    "muestreo": float(os.environ.get("PROFILER_MUESTREO", 1.0)),
+    "guardados": 0,
+}
+
+
+def configurar_profiler(umbral_ms=None, muestreo=None):
+    if umbral_ms is not None:
+        profiler["umbral_ms"] = float(umbral_ms)
+    if muestreo is not None:
+        profiler["muestreo"] = min(max(float(muestreo), 0.0), 1.0)
+    return dict(profiler)
+
+
+def iniciar_solicitud():
+    activo = profiler["umbral_ms"] > 0 and random.random() < profiler["muestreo"]
+    solicitud = Solicitud(perfilar=activo)
+    return solicitud, _solicitud.set(solicitud)
+
+
+def terminar_solicitud(solicitud, token, ruta, metodo, status, segundos):
+    _solicitud.reset(token)
+    observar("wrapped_http_duracion_segundos", segundos, ruta=ruta, metodo=metodo)
+    contar("wrapped_http_peticiones_total", ruta=ruta, metodo=metodo, status=status)
+
+    if solicitud.perfil is not None and segundos * 1000 >= profiler["umbral_ms"]:
+        _guardar_perfil(solicitud, ruta, segundos)
+
+
+def _guardar_perfil(solicitud, ruta, segundos):
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    base = f"{time.strftime('%Y%m%d-%H%M%S')}-{re.sub(r'[^A-Za-z0-9]+', '_', ruta).strip('_')}-{int(segundos * 1000)}ms"
+    path = os.path.join(PROFILES_DIR, base)
+    solicitud.perfil.dump_stats(path + ".prof")
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump({"ruta": ruta, "ms": round(segundos * 1000, 3), "spans": solicitud.spans}, f, ensure_ascii=False)
+    profiler["guardados"] += 1
+    print(f"Petición lenta ({segundos * 1000:.0f}ms) en {ruta}: perfil guardado en {path}.prof")
+
+
+class PerfilRemoto:
+    """
+    Perfil de cProfile medido en un worker de src/ejecucion.py: llegan las stats ya
+    calculadas y se guardan en el mismo formato que Profile.dump_stats (se abren con pstats).
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def dump_stats(self, path):
+        with open(path, "wb") as f:
+            marshal.dump(self.stats, f)
+
+
+def perfilar_endpoint(func):
+    """
+    Envuelve un endpoint síncrono: si la petición fue elegida para perfilarse, corre con
+    cProfile en el mismo hilo del threadpool donde FastAPI ejecuta la función.
+    """
+    @functools.wraps(func)
+    def envuelta(*args, **kwargs):
+        solicitud = _solicitud.get()
+        if solicitud is None or not solicitud.perfilar:
+            return func(*args, **kwargs)
+        perfil = cProfile.Profile()
+        try:
+            return perfil.runcall(func, *args, **kwargs)
+        finally:
+            solicitud.perfil = perfil
+    return envuelta
+
+
+def perfilar_rutas(router):
+    """
+    Aplica perfilar_endpoint a los endpoints síncronos de un router. Se llama antes de
+    include_router para que la app use ya la función envuelta. Los endpoints async mandan
+    su trabajo pesado a los pools de src/ejecucion.py, que lo perfilan dentro del worker.
+    """
+    for ruta in router.routes:
+        endpoint = getattr(ruta, "endpoint", None)
+        if endpoint is None or inspect.iscoroutinefunction(endpoint) or not hasattr(ruta, "dependant"):
+            continue
+        ruta.endpoint = perfilar_endpoint(endpoint)
+        ruta.dependant.call = ruta.endpoint
@@ -0,0 +1,388 @@
+# Agregaciones ad hoc sobre el store columnar (filtros, group by y medidas) para las
+# gráficas. Los filtros podan antes de leer: por usuario y estado con los offsets de cada
+# segmento, y por fecha, categoría, comercio, tipo de venta y estado con zone maps por
+# bloque de filas. Cada consulta tiene un presupuesto de filas y de tiempo.
+import os
+import time
+import threading
+import numpy as np
+import pandas as pd
+from src.past.store import get_store
+from src.past.clientes import get_directorio_clientes, CLIENTES_PATH
+from src.past.fechas import mes, dia_semana
+
+# Filas por bloque de los zone maps
+BLOQUE_FILAS = int(os.environ.get("AGREGADOS_BLOQUE_FILAS", 16384))
+# Presupuesto máximo por consulta; una consulta puede pedir menos, no más
+MAX_FILAS = int(os.environ.get("AGREGADOS_MAX_FILAS", 5_000_000))
+MAX_MS = float(os.environ.get("AGREGADOS_MAX_MS", 2000))
+
+# Dimensiones de group by -> columna del store de la que salen
+DIMENSIONES = ("month", "weekday", "category", "merchant", "state")
+MEDIDAS = ("sum", "count", "mean", "distinct_users")
+
+# Filtro de la consulta -> vocabulario del store con el que se codifica
+FILTROS_TEXTO = {"category": "giro", "merchant": "comercio", "sale_type": "tipo"}
+
+# Estado ajustado va de -1 (sin estado) a 32; se guarda con +1 para usarlo como índice
+N_ESTADOS = 34
+
+
+class ConsultaInvalida(ValueError):
+    pass
+
+
+class PresupuestoExcedido(Exception):
+    pass
+
+
+def _presencia(bloque_fila, codigos, n_bloques, n_valores):
+    """
+    Matriz bloques x valores: True si el valor aparece en el bloque.
+    """
+    presencia = np.zeros((n_bloques, max(n_valores, 1)), dtype=bool)
+    presencia[bloque_fila, codigos] = True
+    return presencia
+
+
+class IndiceSegmento:
+    """
+    Zone maps de un segmento: fecha mínima y máxima por bloque y presencia por bloque de
+    cada categoría, comercio, tipo de venta y estado. Además el estado y el código global
+    de cada usuario del segmento (las filas están ordenadas por usuario).
+    """
+
+    def __init__(self, seg, vocab, estados_usuario, codigo_usuario):
+        self.seg = seg
+        self.filas = len(seg.columnas["fecha"])
+        self.inicios = np.arange(0, self.filas, BLOQUE_FILAS, dtype=np.int64)
+        n_bloques = len(self.inicios)
+        self.estado_usuario = (estados_usuario + 1).astype(np.int64)
+        self.usuario_global = codigo_usuario
+
+        dias = np.asarray(seg.columnas["fecha"]).astype(np.int64)
+        self.fecha_min = np.minimum.reduceat(dias, self.inicios) if self.filas else dias
+        self.fecha_max = np.maximum.reduceat(dias, self.inicios) if self.filas else dias
+
+        bloque_fila = np.arange(self.filas) // BLOQUE_FILAS
+        self.presencia = {
+            nombre: _presencia(bloque_fila, np.asarray(seg.columnas[nombre]), n_bloques, len(vocab[nombre]))
+            for nombre in FILTROS_TEXTO.values()
+        }
+        estado_fila = np.repeat(self.estado_usuario, np.diff(seg.offsets))
+        self.presencia["estado"] = _presencia(bloque_fila, estado_fila, n_bloques, N_ESTADOS)
+
+    def rangos(self, usuarios, estados):
+        """
+        Rangos de filas (inicio, fin) candidatos según los filtros de usuario y estado.
+        """
+        if usuarios is not None:
+            rangos = [self.seg.rango(u) for u in usuarios]
+            return sorted(r for r in rangos if r is not None and r[1] > r[0])
+        if estados is not None:
+            elegidos = np.flatnonzero(np.isin(self.estado_usuario, estados))
+            # Usuarios consecutivos se juntan en un solo rango
+            cortes = np.flatnonzero(np.diff(elegidos) != 1) + 1
+            return [
+                (int(self.seg.offsets[grupo[0]]), int(self.seg.offsets[grupo[-1] + 1]))
+                for grupo in np.split(elegidos, cortes) if len(grupo)
+            ]
+        return [(0, self.filas)] if self.filas else []
+
+    def bloques(self, filtros):
+        """
+        Máscara de bloques que pueden tener filas que cumplan los filtros.
+        """
+        vivos = np.ones(len(self.inicios), dtype=bool)
+        if filtros["desde"] is not None:
+            vivos &= self.fecha_max >= filtros["desde"]
+        if filtros["hasta"] is not None:
+            vivos &= self.fecha_min <= filtros["hasta"]
+        for nombre, codigos in filtros["codigos"].items():
+            vivos &= self.presencia[nombre][:, codigos].any(axis=1)
+        return vivos
+
+    def piezas(self, filtros):
+        """
+        Pedazos (inicio, fin) a leer: los rangos candidatos partidos por bloque, sin los
+        bloques que los zone maps descartan.
+        """
+        vivos = self.bloques(filtros)
+        piezas = []
+        for inicio, fin in self.rangos(filtros["usuarios"], filtros["estados"]):
+            for b in range(inicio // BLOQUE_FILAS, (fin - 1) // BLOQUE_FILAS + 1):
+                if vivos[b]:
+                    piezas.append((max(inicio, b * BLOQUE_FILAS), min(fin, (b + 1) * BLOQUE_FILAS)))
+        return piezas
+
+
+class IndiceAgregados:
+    def __init__(self, store, directorio):
+        self.store = store
+        self.vocab = store.vocab
+        self.indice_vocab = {nombre: {v: i for i, v in enumerate(vocab.tolist())} for nombre, vocab in self.vocab.items()}
+        self.usuarios = np.asarray(store.usuarios(), dtype=object)
+        codigo = {u: i for i, u in enumerate(self.usuarios.tolist())}
+        self.segmentos = []
+        for seg in store.segmentos:
+            usuarios_seg = seg.usuarios.tolist()
+            estados = directorio.estado_ids(usuarios_seg) if directorio is not None else np.full(len(usuarios_seg), -1)
+            codigos = np.array([codigo[u] for u in usuarios_seg], dtype=np.int64)
+            self.segmentos.append(IndiceSegmento(seg, store.vocab, np.asarray(estados), codigos))
+
+    def tamanos(self):
+        # Número de valores posibles por dimensión (para combinar las llaves en un entero)
+        return {
+            "month": 13,
+            "weekday": 7,
+            "category": len(self.vocab["giro"]),
+            "merchant": len(self.vocab["comercio"]),
+            "state": N_ESTADOS,
+        }
+
+
+_indice = None
+_firma_indice = None
+_lock = threading.Lock()
+
+
+def get_indice_agregados(clientes_path=CLIENTES_PATH):
+    """
+    Zone maps del store actual. Se recalculan si cambia el store (versión) o el CSV de
+    clientes. Regresa None si no hay store construido.
+    """
+    global _indice, _firma_indice
+    store = get_store()
+    if store is None:
+        return None
+    firma = (id(store), store.version, os.path.getmtime(clientes_path) if os.path.exists(clientes_path) else None)
+    with _lock:
+        if _indice is None or _firma_indice != firma:
+            inicio = time.perf_counter()
+            _indice = IndiceAgregados(store, get_directorio_clientes(clientes_path))
+            _firma_indice = firma
+            print(f"Zone maps de {len(store.segmentos)} segmentos construidos en {time.perf_counter() - inicio:.3f}s")
+        return _indice
+
+
+# --- Consultas ---
+
+def _lista(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, str):
+        valor = valor.split(",")
+    valores = [str(v).strip() for v in valor if str(v).strip()]
+    return valores or None
+
+
+def _dia(valor, nombre):
+    if valor is None:
+        return None
+    try:
+        return int(np.datetime64(str(valor), "D").astype(np.int64))
+    except ValueError:
+        raise ConsultaInvalida(f"Fecha inválida en {nombre}: {valor}")
+
+
+def normalizar_consulta(consulta):
+    """
+    Valida la consulta y la deja en forma canónica (sirve también como llave de cache).
+    """
+    group_by = _lista(consulta.get("group_by")) or []
+    measures = _lista(consulta.get("measures")) or ["sum"]
+    for d in group_by:
+        if d not in DIMENSIONES:
+            raise ConsultaInvalida(f"Dimensión desconocida: {d} (válidas: {', '.join(DIMENSIONES)})")
+    for m in measures:
+        if m not in MEDIDAS:
+            raise ConsultaInvalida(f"Medida desconocida: {m} (válidas: {', '.join(MEDIDAS)})")
+    if len(set(group_by)) != len(group_by):
+        raise ConsultaInvalida("Dimensión repetida en group_by")
+
+    order_by = consulta.get("order_by")
+    if order_by is not None and order_by not in measures:
+        raise ConsultaInvalida(f"order_by tiene que ser una de las medidas pedidas: {order_by}")
+
+    estados = _lista(consulta.get("state_id"))
+    try:
+        estados = None if estados is None else sorted(int(e) for e in estados)
+    except ValueError:
+        raise ConsultaInvalida(f"state_id inválido: {consulta.get('state_id')}")
+
+    max_filas = consulta.get("max_rows")
+    max_ms = consulta.get("max_ms")
+    return {
+        "user_id": _lista(consulta.get("user_id")),
+        "start": consulta.get("start"),
+        "end": consulta.get("end"),
+        "state_id": estados,
+        "category": _lista(consulta.get("category")),
+        "merchant": _lista(consulta.get("merchant")),
+        "sale_type": _lista(consulta.get("sale_type")),
+        "group_by": group_by,
+        "measures": measures,
+        "order_by": order_by,
+        "limit": consulta.get("limit"),
+        "max_rows": MAX_FILAS if max_filas is None else min(int(max_filas), MAX_FILAS),
+        "max_ms": MAX_MS if max_ms is None else min(float(max_ms), MAX_MS),
+    }
+
+
+def _filtros(consulta, indice):
+    codigos = {}
+    for campo, vocab in FILTROS_TEXTO.items():
+        valores = consulta[campo]
+        if valores is not None:
+            # Los valores que no existen en el vocabulario no pueden coincidir con nada
+            codigos[vocab] = np.array(
+                [indice.indice_vocab[vocab][v] for v in valores if v in indice.indice_vocab[vocab]], dtype=np.int64
+            )
+    estados = None
+    if consulta["state_id"] is not None:
+        estados = np.array([e + 1 for e in consulta["state_id"] if -1 <= e < N_ESTADOS - 1], dtype=np.int64)
+        codigos["estado"] = estados
+    return {
+        "usuarios": consulta["user_id"],
+        "estados": estados,
+        "desde": _dia(consulta["start"], "start"),
+        "hasta": _dia(consulta["end"], "end"),
+        "codigos": codigos,
+    }
+
+
+def _leer_pieza(seg_indice, inicio, fin, filtros, group_by, tamanos):
+    """
+    Filas de una pieza que cumplen los filtros: llave de grupo combinada, monto y usuario.
+    """
+    cols = seg_indice.seg.columnas
+    dias = np.asarray(cols["fecha"][inicio:fin])
+    usuario_local = np.searchsorted(seg_indice.seg.offsets, np.arange(inicio, fin), side="right") - 1
+    estado = seg_indice.estado_usuario[usuario_local]
+
+    mascara = np.ones(fin - inicio, dtype=bool)
+    dias_int = dias.astype(np.int64)
+    if filtros["desde"] is not None:
+        mascara &= dias_int >= filtros["desde"]
+    if filtros["hasta"] is not None:
+        mascara &= dias_int <= filtros["hasta"]
+    for nombre, codigos in filtros["codigos"].items():
+        valores = estado if nombre == "estado" else np.asarray(cols[nombre][inicio:fin])
+        mascara &= np.isin(valores, codigos)
+
+    llave = np.zeros(int(mascara.sum()), dtype=np.int64)
+    for d in group_by:
+        if d == "month":
+            valores = mes(dias[mascara])
+        elif d == "weekday":
+            valores = dia_semana(dias[mascara])
+        elif d == "state":
+            valores = estado[mascara]
+        else:
+            valores = np.asarray(cols["giro" if d == "category" else "comercio"][inicio:fin])[mascara]
+        llave = llave * tamanos[d] + valores.astype(np.int64)
+
+    monto = np.asarray(cols["monto"][inicio:fin])[mascara]
+    return llave, monto, seg_indice.usuario_global[usuario_local[mascara]]
+
+
+def _parcial(llave, monto, usuario, n_usuarios, distintos):
+    unicas, inversa = np.unique(llave, return_inverse=True)
+    parcial = {
+        "llave": unicas,
+        "suma": np.bincount(inversa, weights=monto, minlength=len(unicas)),
+        "conteo": np.bincount(inversa, minlength=len(unicas)),
+    }
+    if distintos:
+        parcial["pares"] = np.unique(llave * n_usuarios + usuario)
+    return parcial
+
+
+def _decodificar(llaves, group_by, tamanos, indice):
+    columnas = {}
+    for d in reversed(group_by):
+        valores = llaves % tamanos[d]
+        llaves = llaves // tamanos[d]
+        if d == "category":
+            columnas[d] = indice.vocab["giro"][valores]
+        elif d == "merchant":
+            columnas[d] = indice.vocab["comercio"][valores]
+        elif d == "state":
+            columnas[d] = valores - 1
+        else:
+            columnas[d] = valores
+    return {d: columnas[d] for d in group_by}
+
+
+def agregar(consulta, indice=None):
+    """
+    Corre una consulta de agregación (ver normalizar_consulta) sobre el store. Primero
+    poda con los offsets y los zone maps y revisa el presupuesto de filas contra lo que
+    queda; después lee solo esas piezas, revisando el presupuesto de tiempo entre piezas.
+    Regresa las filas agregadas y cuánto se leyó.
+    """
+    inicio = time.perf_counter()
+    consulta = normalizar_consulta(consulta)
+    indice = indice or get_indice_agregados()
+    if indice is None:
+        raise ConsultaInvalida("No hay store construido")
+
+    filtros = _filtros(consulta, indice)
+    group_by = consulta["group_by"]
+    tamanos = indice.tamanos()
+    distintos = "distinct_users" in consulta["measures"]
+
+    piezas = [(s, a, b) for s in indice.segmentos for a, b in s.piezas(filtros)]
+    filas_a_leer = sum(b - a for _, a, b in piezas)
+    if filas_a_leer > consulta["max_rows"]:
+        raise PresupuestoExcedido(
+            f"La consulta tendría que leer {filas_a_leer} filas (máximo {consulta['max_rows']}); agrega filtros"
+        )
+
+    limite = inicio + consulta["max_ms"] / 1000
+    parciales = []
+    for s, a, b in piezas:
+        llave, monto, usuario = _leer_pieza(s, a, b, filtros, group_by, tamanos)
+        if len(llave):
+            parciales.append(_parcial(llave, monto, usuario, len(indice.usuarios), distintos))
+        if time.perf_counter() > limite:
+            raise PresupuestoExcedido(f"La consulta pasó de {consulta['max_ms']:.0f} ms; agrega filtros")
+
+    if parciales:
+        llaves = np.concatenate([p["llave"] for p in parciales])
+        unicas, inversa = np.unique(llaves, return_inverse=True)
+        suma = np.bincount(inversa, weights=np.concatenate([p["suma"] for p in parciales]), minlength=len(unicas))
+        conteo = np.bincount(inversa, weights=np.concatenate([p["conteo"] for p in parciales]), minlength=len(unicas))
+    else:
+        unicas, suma, conteo = np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+
+    tabla = pd.DataFrame(_decodificar(unicas, group_by, tamanos, indice))
+    medidas = {
+        "sum": suma,
+        "count": conteo.astype(np.int64),
+        "mean": np.divide(suma, conteo, out=np.zeros(len(suma)), where=conteo > 0),
+    }
+    if distintos:
+        pares = np.unique(np.concatenate([p["pares"] for p in parciales])) if parciales else np.zeros(0, dtype=np.int64)
+        medidas["distinct_users"] = np.bincount(
+            np.searchsorted(unicas, pares // len(indice.usuarios)), minlength=len(unicas)
+        )
+    for m in consulta["measures"]:
+        tabla[m] = medidas[m]
+
+    if consulta["order_by"] is not None:
+        tabla = tabla.sort_values(consulta["order_by"], ascending=False, kind="stable")
+    elif group_by:
+        tabla = tabla.sort_values(group_by, kind="stable")
+    if consulta["limit"] is not None:
+        tabla = tabla.head(int(consulta["limit"]))
+
+    return {
+        "group_by": group_by,
+        "measures": consulta["measures"],
+        "rows": tabla.to_dict(orient="records"),
+        "filas_leidas": int(filas_a_leer),
+        "filas_total": int(sum(s.filas for s in indice.segmentos)),
+        "piezas": len(piezas),
+        "ms": round((time.perf_counter() - inicio) * 1000, 3),
+    }
@@ -0,0 +1,99 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from src.future.location import id_state_name, id_state_coordinates
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CLIENTES_PATH = os.path.abspath(os.path.join(BASE_DIR, "../../data/base_clientes_final.csv"))
+
+# id_estado del CSV - AJUSTE_ESTADO = llave de id_state_name / id_state_coordinates
+AJUSTE_ESTADO = 46
+
+
+class DirectorioClientes:
+    """
+    Índice en memoria de base_clientes_final.csv: id -> fila, con estado y municipio
+    en arrays compactos. Las búsquedas individuales y por lote son O(1) por id.
+    """
+
+    def __init__(self, df):
+        ids = df["id"].astype(str).str.strip()
+        self.ids = pd.Index(ids)
+        self.indice = {u: i for i, u in enumerate(ids.tolist())}
+        self.id_estado = df["id_estado"].fillna(-1).to_numpy().astype(np.int16)
+        self.id_municipio = df["id_municipio"].fillna(-1).to_numpy().astype(np.int32)
+
+        # Tablas de estado indexadas por id ajustado (0..32)
+        n = max(id_state_name) + 1
+        self.nombres_estado = np.array([id_state_name.get(i) for i in range(n)], dtype=object)
+        self.coords_estado = np.full((n, 2), np.nan)
+        for i, coords in id_state_coordinates.items():
+            self.coords_estado[i] = coords
+
+    def __len__(self):
+        return len(self.indice)
+
+    def __contains__(self, person_id):
+        return person_id in self.indice
+
+    def estado(self, person_id):
+        """
+        Regresa (nombre_estado, coordenadas) del cliente o None si no existe.
+        """
+        i = self.indice.get(person_id)
+        if i is None:
+            return None
+        adjusted_id = int(self.id_estado[i]) - AJUSTE_ESTADO
+        return id_state_name.get(adjusted_id), id_state_coordinates.get(adjusted_id)
+
+    def estado_ids(self, person_ids):
+        """
+        Id de estado ajustado para cada id del lote (-1 si el cliente no existe).
+        """
+        filas = self.ids.get_indexer(pd.Index(person_ids).astype(str))
+        resultado = np.full(len(filas), -1, dtype=np.int16)
+        encontrados = filas >= 0
+        resultado[encontrados] = self.id_estado[filas[encontrados]] - AJUSTE_ESTADO
+        return resultado
+
+    def estados(self, person_ids):
+        """
+        Versión por lote de estado(): lista de (nombre_estado, coordenadas) o None por id.
+        """
+        resultado = []
+        n = len(self.nombres_estado)
+        for estado_id in self.estado_ids(person_ids).tolist():
+            if 0 <= estado_id < n and self.nombres_estado[estado_id] is not None:
+                lat, lon = self.coords_estado[estado_id]
+                coords = None if np.isnan(lat) else (float(lat), float(lon))
+                resultado.append((self.nombres_estado[estado_id], coords))
+            else:
+                resultado.append(None)
+        return resultado
+
+    def municipio(self, person_id):
+        i = self.indice.get(person_id)
+        return None if i is None else int(self.id_municipio[i])
+
+
+_directorio = None
+_mtime = None
+_lock = threading.Lock()
+
+
+def get_directorio_clientes(path=CLIENTES_PATH):
+    """
+    Carga el directorio una vez por proceso; se vuelve a cargar si el CSV cambia.
+    Regresa None si el CSV no existe.
+    """
+    global _directorio, _mtime
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    if _directorio is None or mtime != _mtime:
+        with _lock:
+            if _directorio is None or mtime != _mtime:
+                _directorio = DirectorioClientes(pd.read_csv(path))
+                _mtime = mtime
+    return _directorio
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+
+class ColumnaCodificada:
+    """
+    Columna de strings codificada como diccionario: un código int32 por fila
+    y el vocabulario de valores distintos (object).
+    """
+
+    __slots__ = ("codigos", "vocab")
+
+    def __init__(self, codigos, vocab):
+        self.codigos = codigos
+        self.vocab = vocab
+
+    @classmethod
+    def desde_valores(cls, valores):
+        codigos, vocab = pd.factorize(pd.Series(valores, dtype=object), use_na_sentinel=False)
+        return cls(codigos.astype(np.int32), np.asarray(vocab, dtype=object))
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def __getitem__(self, i):
+        return self.vocab[self.codigos[i]]
+
+    def tomar(self, indices):
+        return ColumnaCodificada(self.codigos[indices], self.vocab)
+
+    def valores(self):
+        return self.vocab[self.codigos]
+
+    def factorizar(self):
+        """
+        Igual que pd.factorize sobre los valores (códigos en orden de primera aparición),
+        pero trabajando sobre los códigos enteros en lugar de los strings.
+        """
+        codigos, unicos = pd.factorize(self.codigos)
+        return codigos, self.vocab[unicos]
+
+
+def _tomar(columna, indices):
+    if isinstance(columna, ColumnaCodificada):
+        return columna.tomar(indices)
+    return columna[indices]
+
+
+def _valores(columna):
+    if isinstance(columna, ColumnaCodificada):
+        return columna.valores()
+    return columna
+
+
+def campo(nombre):
+    """
+    Propiedad de una vista de fila que lee la columna `nombre` de su tabla.
+    """
+    return property(lambda self: self._tabla.valor(nombre, self._i))
+
+
+class Tabla:
+    """
+    Base de las tablas columnares (TransactionBatch, PersonTable): un arreglo de NumPy
+    (o una ColumnaCodificada) por campo. Iterar o indexar con un entero regresa vistas
+    de fila (`Fila`) que leen de las columnas sin copiar nada.
+    """
+
+    Fila = None
+
+    def __init__(self, columnas):
+        self.columnas = columnas
+
+    def __len__(self):
+        return len(next(iter(self.columnas.values())))
+
+    def __getitem__(self, i):
+        if isinstance(i, (int, np.integer)):
+            n = len(self)
+            if i < -n or i >= n:
+                raise IndexError("índice fuera de rango")
+            return self.Fila(self, i % n)
+        return self.subconjunto(np.arange(len(self))[i] if isinstance(i, slice) else np.asarray(i))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.Fila(self, i)
+
+    def subconjunto(self, indices):
+        """
+        Nueva tabla con las filas `indices` (en ese orden); el vocabulario se comparte.
+        """
+        return type(self)({nombre: _tomar(col, indices) for nombre, col in self.columnas.items()})
+
+    def valor(self, nombre, i):
+        v = self.columnas[nombre][i]
+        return v.item() if isinstance(v, np.generic) else v
+
+    def columna(self, nombre):
+        """
+        Todos los valores del campo como arreglo de NumPy (los strings ya decodificados).
+        """
+        return _valores(self.columnas[nombre])
+
+    def codificada(self, nombre):
+        return self.columnas[nombre]
+
+
+class Fila:
+    """
+    Vista ligera de una fila de una Tabla: solo guarda la tabla y el índice.
+    """
+
+    __slots__ = ("_tabla", "_i")
+
+    def __init__(self, tabla, i):
+        self._tabla = tabla
+        self._i = i
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+# Llaves de fecha derivadas con aritmética sobre datetime64[D] (días desde 1970-01-01, jueves)
+
+
+def parse_dias(fechas):
+    """
+    Convierte una secuencia de fechas "YYYY-MM-DD" a un array datetime64[D].
+    Si alguna no tiene ese formato se usa pandas y las inválidas quedan como NaT.
+    """
+    try:
+        return np.array(fechas, dtype="datetime64[D]")
+    except ValueError:
+        return pd.to_datetime(pd.Series(fechas, dtype=object), errors="coerce").to_numpy().astype("datetime64[D]")
+
+
+def anio(dias):
+    return dias.astype("datetime64[Y]").astype(np.int64) + 1970
+
+
+def mes(dias):
+    return dias.astype("datetime64[M]").astype(np.int64) % 12 + 1
+
+
+def clave_mes(dias):
+    """
+    Llave única por año-mes (equivale a strftime("%Y-%m")).
+    """
+    return dias.astype("datetime64[M]").astype(np.int64)
+
+
+def dia_mes(dias):
+    return (dias - dias.astype("datetime64[M]")).astype(np.int64) + 1
+
+
+def dia_semana(dias):
+    """
+    0 = Lunes, 6 = Domingo (igual que datetime.weekday()).
+    """
+    return (dias.astype(np.int64) + 3) % 7
+
+
+def clave_semana(dias):
+    """
+    Llave única por año-semana equivalente a strftime("%Y-%U") (semanas que empiezan en domingo).
+    """
+    dias_int = dias.astype(np.int64)
+    dia_anio = dias_int - dias.astype("datetime64[Y]").astype("datetime64[D]").astype(np.int64)
+    dia_semana_domingo = (dias_int + 4) % 7
+    semana = (dia_anio + 7 - dia_semana_domingo) // 7
+    return anio(dias) * 100 + semana
+
+
+def rango_anio(year):
+    return np.datetime64(f"{year:04d}-01-01"), np.datetime64(f"{year + 1:04d}-01-01")
+
+
+def rango_mes(year, month):
+    inicio = np.datetime64(f"{year:04d}-{month:02d}", "M")
+    return inicio.astype("datetime64[D]"), (inicio + 1).astype("datetime64[D]")
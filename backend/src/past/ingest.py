@@ -0,0 +1,185 @@
+# Ingesta incremental de transacciones nuevas (archivo en data/ingest/ o POST /ingest).
+# Uso (desde backend/): python -m src.past.ingest [archivo.csv ...]
+import os
+import sys
+import time
+import shutil
+import threading
+import pandas as pd
+from src.past.store import get_store, agregar_segmento, STORE_DIR
+from src.past.tiendas import get_indice_tiendas
+from src.past.rollups import agregar_a_rollups, _firma, TRANSACCIONES_PATH, CLIENTES_PATH
+from src.past.usuarios import usuarios_cache
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INGEST_DIR = os.path.abspath(os.path.join(BASE_DIR, "../../data/ingest"))
+COLUMNAS_CSV = ["id", "fecha", "comercio", "giro_comercio", "tipo_venta", "monto"]
+
+_lock = threading.Lock()
+_metricas = {
+    "lotes": 0,
+    "filas": 0,
+    "segundos": 0.0,
+    "ultimo_lote": None,
+}
+
+
+def _normalizar(df):
+    df = df.copy()
+    df.columns = df.columns.str.strip()
+    faltantes = [c for c in COLUMNAS_CSV if c not in df.columns]
+    if faltantes:
+        raise ValueError(f"Faltan columnas: {faltantes}")
+    df = df[COLUMNAS_CSV]
+    df["id"] = df["id"].astype(str).str.strip()
+    fechas = pd.to_datetime(df["fecha"], format="%Y-%m-%d", errors="coerce")
+    if fechas.isna().any():
+        raise ValueError(f"Fechas inválidas (se espera YYYY-MM-DD): {df.loc[fechas.isna(), 'fecha'].head(5).tolist()}")
+    df["fecha"] = fechas.dt.strftime("%Y-%m-%d")
+    df["monto"] = pd.to_numeric(df["monto"], errors="coerce")
+    if df["monto"].isna().any():
+        raise ValueError("Hay montos que no son numéricos")
+    return df
+
+
+def _anexar_csv(df, csv_path):
+    """
+    Agrega el lote al final del CSV de transacciones, con su mismo orden de columnas.
+    El CSV sigue siendo el registro completo: de él leen los rollups y el índice de tiendas.
+    """
+    with open(csv_path, "r", encoding="utf-8") as f:
+        encabezado = [c.strip() for c in f.readline().split(",")]
+    with open(csv_path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    df[encabezado].to_csv(csv_path, mode="a", header=False, index=False)
+
+
+def _invalidar_caches(usuarios):
+    # Solo los usuarios del lote: sus datos y sus predicciones cacheadas
+    from src.future.incremento import prediccion_cache
+
+    usuarios = set(usuarios)
+    n = sum(usuarios_cache.invalidate(u) for u in usuarios)
+    n += prediccion_cache.invalidate_where(lambda key: key[0] in usuarios)
+    return n
+
+
+def ingestar(df, recibido=None, csv_path=TRANSACCIONES_PATH, store_dir=STORE_DIR, clientes_path=CLIENTES_PATH,
+             indice_path=None):
+    """
+    Ingiere un lote de transacciones nuevas (mismas columnas que base_transacciones_final.csv):
+    1. Lo anexa al CSV de transacciones.
+    2. Lo agrega al store como segmento delta (por usuario) y sube la versión de esos usuarios.
+    3. Actualiza los agregados sin recalcularlos: índice de tiendas (lee solo los bytes nuevos
+       del CSV) y rollups mensuales/por categoría.
+    4. Invalida solo los caches de los usuarios del lote.
+    `recibido` es el time.time() en que llegó el lote; con él se mide el lag de frescura
+    (desde que llega hasta que ya se puede consultar). El índice de tiendas vive junto al
+    store (store_dir/tiendas.npz) salvo que se indique indice_path.
+    """
+    inicio = time.time()
+    recibido = recibido or inicio
+    indice_path = indice_path or os.path.join(store_dir, "tiendas.npz")
+    df = _normalizar(df)
+    if df.empty:
+        return {"filas": 0, "usuarios": 0}
+
+    with _lock:
+        firma_anterior = _firma(csv_path, clientes_path)
+        _anexar_csv(df, csv_path)
+
+        if get_store(store_dir) is not None:
+            agregar_segmento(df.copy(), store_dir)
+        else:
+            # Sin store todavía: se construye completo a partir del CSV (que ya incluye el lote)
+            from src.past.shards import construir_shards
+            construir_shards(csv_path, store_dir, indice_path)
+
+        get_indice_tiendas(csv_path, indice_path, guardar=True)
+        agregar_a_rollups(df, firma_anterior, csv_path, clientes_path)
+
+        usuarios = df["id"].unique().tolist()
+        invalidadas = _invalidar_caches(usuarios)
+
+        fin = time.time()
+        reporte = {
+            "filas": int(len(df)),
+            "usuarios": len(usuarios),
+            "caches_invalidados": invalidadas,
+            "segundos": round(fin - inicio, 4),
+            "filas_por_segundo": round(len(df) / (fin - inicio), 1) if fin > inicio else None,
+            "lag_frescura_segundos": round(fin - recibido, 4),
+        }
+        _metricas["lotes"] += 1
+        _metricas["filas"] += reporte["filas"]
+        _metricas["segundos"] += fin - inicio
+        _metricas["ultimo_lote"] = reporte
+
+    print(f"Ingesta: {reporte['filas']} filas de {reporte['usuarios']} usuarios en {reporte['segundos']}s "
+          f"({reporte['filas_por_segundo']} filas/s, lag {reporte['lag_frescura_segundos']}s)")
+    return reporte
+
+
+def estadisticas_ingesta():
+    return {
+        "lotes": _metricas["lotes"],
+        "filas": _metricas["filas"],
+        "filas_por_segundo": round(_metricas["filas"] / _metricas["segundos"], 1) if _metricas["segundos"] else None,
+        "ultimo_lote": _metricas["ultimo_lote"],
+    }
+
+
+# --- Archivos depositados en data/ingest/ ---
+
+def ingestar_archivo(path):
+    # El lag de frescura se mide desde que el archivo se depositó
+    return ingestar(pd.read_csv(path), recibido=os.path.getmtime(path))
+
+
+def procesar_carpeta(carpeta=INGEST_DIR):
+    """
+    Ingiere los .csv de la carpeta en orden de nombre y los mueve a procesados/.
+    Un archivo con errores se mueve a errores/ y no detiene a los demás.
+    """
+    if not os.path.isdir(carpeta):
+        return []
+    reportes = []
+    for nombre in sorted(os.listdir(carpeta)):
+        path = os.path.join(carpeta, nombre)
+        if not nombre.endswith(".csv") or not os.path.isfile(path):
+            continue
+        try:
+            reportes.append(ingestar_archivo(path))
+            destino = "procesados"
+        except Exception as e:
+            print(f"Error ingiriendo {nombre}: {e}")
+            destino = "errores"
+        os.makedirs(os.path.join(carpeta, destino), exist_ok=True)
+        shutil.move(path, os.path.join(carpeta, destino, nombre))
+    return reportes
+
+
+def vigilar_carpeta(intervalo=5.0, carpeta=INGEST_DIR):
+    """
+    Revisa la carpeta cada `intervalo` segundos en un hilo aparte.
+    """
+    def _loop():
+        while True:
+            procesar_carpeta(carpeta)
+            time.sleep(intervalo)
+
+    hilo = threading.Thread(target=_loop, name="ingesta", daemon=True)
+    hilo.start()
+    return hilo
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        for archivo in sys.argv[1:]:
+            ingestar_archivo(archivo)
+    else:
+        procesar_carpeta()
@@ -1,3 +1,6 @@
+from src.past.columnas import ColumnaCodificada, Tabla, Fila, campo
+
+
 class Person:
     def __init__(self, id, fecha_nacim, fecha_alta, id_municipio, id_estado, tipo_persona, genero, actividad_empresarial):
         self.id = id
@@ -10,4 +13,49 @@ class Person:
         self.actividad_empresarial = actividad_empresarial
 
     def __repr__(self):
-        return f"<Persona {self.id}: {self.actividad_empresarial}>"
\ No newline at end of file
+        return f"<Persona {self.id}: {self.actividad_empresarial}>"
+
+class PersonRow(Fila):
+    """
+    Vista de una fila de PersonTable con los mismos atributos que Person.
+    """
+
+    __slots__ = ()
+
+    id = campo("id")
+    fecha_nacim = campo("fecha_nacim")
+    fecha_alta = campo("fecha_alta")
+    id_municipio = campo("id_municipio")
+    id_estado = campo("id_estado")
+    tipo_persona = campo("tipo_persona")
+    genero = campo("genero")
+    actividad_empresarial = campo("actividad_empresarial")
+
+    def __repr__(self):
+        return f"<Persona {self.id}: {self.actividad_empresarial}>"
+
+
+class PersonTable(Tabla):
+    """
+    Clientes guardados como columnas: ids y claves numéricas como arreglos de NumPy,
+    fechas y campos categóricos codificados como diccionario.
+    """
+
+    Fila = PersonRow
+    NUMERICOS = ("id_municipio", "id_estado")
+    CODIFICADOS = ("fecha_nacim", "fecha_alta", "tipo_persona", "genero", "actividad_empresarial")
+
+    @classmethod
+    def desde_dataframe(cls, df):
+        columnas = {"id": df["id"].to_numpy(dtype=object)}
+        for nombre in cls.NUMERICOS:
+            columnas[nombre] = df[nombre].to_numpy()
+        for nombre in cls.CODIFICADOS:
+            valores = df[nombre] if nombre in df.columns else [""] * len(df)
+            columnas[nombre] = ColumnaCodificada.desde_valores(valores)
+        return cls({nombre: columnas[nombre] for nombre in ("id", "fecha_nacim", "fecha_alta", "id_municipio",
+                                                           "id_estado", "tipo_persona", "genero",
+                                                           "actividad_empresarial")})
+
+    def __repr__(self):
+        return f"<PersonTable {len(self)} personas>"
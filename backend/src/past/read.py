@@ -1,15 +1,27 @@
 import os
 import json
 from collections import defaultdict
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from src.past.transaction import Transaction
-from src.past.person import Person
+from src.past.transaction import Transaction, TransactionList, TransactionBatch, como_transaction_list
+from src.past.columnas import ColumnaCodificada
+from src.past.person import Person, PersonTable
+from src.past.store import build_transaction_store, get_store, STORE_DIR
+from src.past.tiendas import get_indice_tiendas
+from src.past.clientes import get_directorio_clientes
 from src.future.location import *
+from src.metrics import span, medido, LOAD, PARSE
+from src.cache import singleflight
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     
 def readDataFrames():
+    # Si varias peticiones leen los CSV a la vez, se leen una sola vez para todas
+    return singleflight.hacer(("readDataFrames",), _readDataFrames)
+
+@medido(LOAD, "readDataFrames")
+def _readDataFrames():
     personas_path = os.path.join(BASE_DIR, "../../data/base_clientes_final.csv")
     transacciones_path = os.path.join(BASE_DIR, "../../data/base_transacciones_final.csv")
 
@@ -19,6 +31,14 @@ def readDataFrames():
     return df_personas, df_transacciones
 
 def total_visitas_en_tienda(tienda):
+    indice = get_indice_tiendas()
+    if indice is not None:
+        stats = indice.stats(tienda)
+        if stats is None:
+            print(f"No se encontró la tienda en el índice: {tienda}")
+            return 0
+        return stats["visitas"]
+
     json_path = os.path.join(".", "data", "json", "stores", f"{tienda}.json")
     if not os.path.exists(json_path):
         print(f"No se encontró el archivo JSON para la tienda: {tienda}")
@@ -29,18 +49,15 @@ def total_visitas_en_tienda(tienda):
 
     return len(transacciones)
 
-def saveTransaccionesPorUsuario(df_transacciones):
-    output_dir = os.path.join(BASE_DIR, "../json")
-    os.makedirs(output_dir, exist_ok=True)
-
-    grouped = df_transacciones.groupby("id")
+def saveTransaccionesPorUsuario(df_transacciones, store_dir=STORE_DIR):
+    """
+    Construye el store columnar (data/store) que usa get_transaction,
+    en lugar de escribir un JSON por usuario.
+    """
+    manifest = build_transaction_store(df_transacciones, store_dir)
+    usuarios = sum(seg["usuarios"] for seg in manifest["segmentos"])
 
-    for user_id, group in grouped:
-        trans_list = group.to_dict(orient="records")
-        with open(os.path.join(output_dir, f"{user_id}.json"), "w", encoding="utf-8") as f:
-            json.dump(trans_list, f, ensure_ascii=False, indent=2)
-
-    print(f"Se guardaron {len(grouped)} archivos JSON en: {output_dir}")
+    print(f"Se guardaron {usuarios} usuarios en el store columnar: {store_dir}")
 
 def saveTransaccionesPorTienda(df_transacciones):
     output_dir = os.path.join(BASE_DIR, "data", "json", "stores")
@@ -63,75 +80,99 @@ def saveTransaccionesPorTienda(df_transacciones):
 
 
 def readPersonas():
-    path = os.path.join(BASE_DIR, "../data/base_clientes_final.csv")
-    df = pd.read_csv(path)
+    return singleflight.hacer(("readPersonas",), _readPersonas)
 
-    personas = [
-        Person(
-            row['id'],
-            row['fecha_nacim'],
-            row['fecha_alta'],
-            row['id_municipio'],
-            row['id_estado'],
-            row['tipo_persona'],
-            row.get('genero', ''),
-            row.get('actividad_empresarial', '')
-        )
-        for _, row in df.iterrows()
-    ]
-    return personas
+@medido(LOAD, "readPersonas")
+def _readPersonas():
+    path = os.path.join(BASE_DIR, "../../data/base_clientes_final.csv")
+    df = pd.read_csv(path)
+    return PersonTable.desde_dataframe(df)
+
+def _transactions_from_store(store, user_id):
+    cols = store.columnas_usuario(user_id)
+    if cols is None:
+        print(f"No se encontró el usuario en el store: {user_id}")
+        return TransactionBatch.vacio()
+
+    # Los códigos del store ya son un diccionario: se usan tal cual, sin decodificar strings
+    dias = np.asarray(cols["fecha"])
+    dias_unicos, dia_cod = np.unique(dias, return_inverse=True)
+    return TransactionBatch(
+        {
+            "id": ColumnaCodificada(np.zeros(len(dias), dtype=np.int32), np.array([user_id], dtype=object)),
+            "date": ColumnaCodificada(dia_cod.astype(np.int32), np.datetime_as_string(dias_unicos, unit="D").astype(object)),
+            "merchant": ColumnaCodificada(cols["comercio"], store.vocab["comercio"]),
+            "merchant_category": ColumnaCodificada(cols["giro"], store.vocab["giro"]),
+            "sale_type": ColumnaCodificada(cols["tipo"], store.vocab["tipo"]),
+            "amount": np.asarray(cols["monto"], dtype=np.float64),
+        },
+        dias=dias,
+    )
 
 def get_transaction(user_id):
-    # Cambia "./json" por ruta absoluta relativa al proyecto
+    """
+    Transacciones del usuario. Las cargas concurrentes del mismo usuario (y misma versión
+    de datos) se juntan en una sola.
+    """
+    key = ("get_transaction", user_id, None, get_data_version(user_id))
+    return singleflight.hacer(key, lambda: _get_transaction(user_id))
+
+def _get_transaction(user_id):
+    store = get_store()
+    if store is not None:
+        with span(LOAD, "get_transaction.store"):
+            return _transactions_from_store(store, user_id)
+
+    # Sin store construido: se usan los JSON por usuario
     project_root = os.path.abspath(os.path.join(BASE_DIR, "..", ".."))
     json_path = os.path.join(project_root, "data/json/person", f"{user_id}.json")
 
     if not os.path.exists(json_path):
         print(f"No JSON found for user ID: {user_id} (looked in {json_path})")
-        return []
+        return TransactionBatch.vacio()
 
-    with open(json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    transactions = [
-        Transaction(
-            item["id"],
-            item["fecha"],
-            item["comercio"],
-            item["giro_comercio"],
-            item["tipo_venta"],
-            item["monto"]
-        )
-        for item in data
-    ]
-    return transactions
+    with span(LOAD, "get_transaction.json"):
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
 
-def get_transaction_month(transactions, month):
-    return [
-        t for t in transactions
-        if datetime.strptime(t.date, "%Y-%m-%d").month == month
-    ]
+    with span(PARSE, "get_transaction.json"):
+        return TransactionBatch.desde_registros(data)
 
-def get_transaction_year(transactions, year):
-    return [
-        t for t in transactions
-        if datetime.strptime(t.date, "%Y-%m-%d").year == year
-    ]
+def get_data_version(user_id):
+    """
+    Versión de los datos de un usuario: cambia cuando se reconstruye el store o cuando
+    se ingieren transacciones suyas (o cuando cambia su JSON si no hay store).
+    Sirve como parte de llaves de cache.
+    """
+    store = get_store()
+    if store is not None:
+        return store.version_usuario(user_id)
 
-def get_estado_from_person_id(person_id):
-    path = os.path.join(BASE_DIR, "../../data/base_clientes_final.csv")
+    project_root = os.path.abspath(os.path.join(BASE_DIR, "..", ".."))
+    json_path = os.path.join(project_root, "data/json/person", f"{user_id}.json")
+    if os.path.exists(json_path):
+        return str(os.stat(json_path).st_mtime_ns)
+    return None
 
-    df = pd.read_csv(path)
+def get_transaction_month(transactions, month):
+    return como_transaction_list(transactions).del_mes(month)
 
-    row = df[df["id"] == person_id]
-    if not row.empty:
-        raw_state_id = int(row.iloc[0]["id_estado"])
-        adjusted_id = raw_state_id - 46  
+def get_transaction_year(transactions, year):
+    return como_transaction_list(transactions).del_anio(year)
 
-        name = id_state_name.get(adjusted_id)
-        coords = id_state_coordinates.get(adjusted_id)
+def get_estado_from_person_id(person_id):
+    directorio = get_directorio_clientes()
+    resultado = directorio.estado(person_id) if directorio is not None else None
 
-        return name, coords
-    else:
+    if resultado is None:
         print(f"No se encontró a la persona con ID: {person_id}")
-        return None
+    return resultado
+
+def get_estados_from_person_ids(person_ids):
+    """
+    Versión por lote de get_estado_from_person_id: una entrada (nombre, coords) o None por id.
+    """
+    directorio = get_directorio_clientes()
+    if directorio is None:
+        return [None] * len(person_ids)
+    return directorio.estados(person_ids)
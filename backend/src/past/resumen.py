@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+from src.past.fechas import parse_dias, dia_semana
+from src.past.transaction import TransactionBatch
+
+
+def _columnas(transactions):
+    """
+    Extrae en una sola pasada las columnas que usan los slides del Wrapped.
+    """
+    n = len(transactions)
+    fechas = [None] * n
+    comercios = [None] * n
+    giros = [None] * n
+    montos = np.empty(n, dtype=np.float64)
+    for i, t in enumerate(transactions):
+        fechas[i] = t.date
+        comercios[i] = t.merchant
+        giros[i] = t.merchant_category
+        montos[i] = t.amount
+    return fechas, comercios, giros, montos
+
+
+def _factorizar(valores):
+    return pd.factorize(pd.Series(valores, dtype=object), use_na_sentinel=False)
+
+
+def _columnas_factorizadas(transactions):
+    """
+    Regresa los montos y (códigos, valores) de fecha, comercio y categoría,
+    con los grupos en orden de primera aparición.
+    Un TransactionBatch ya viene codificado, así que se factorizan sus códigos enteros.
+    """
+    if isinstance(transactions, TransactionBatch):
+        return (
+            transactions.columna("amount"),
+            transactions.codificada("date").factorizar(),
+            transactions.codificada("merchant").factorizar(),
+            transactions.codificada("merchant_category").factorizar(),
+        )
+    fechas, comercios, giros, montos = _columnas(transactions)
+    return montos, _factorizar(fechas), _factorizar(comercios), _factorizar(giros)
+
+
+def _sumas(codigos, montos, n):
+    # np.bincount acumula en el orden de las filas, igual que un `+=` en un loop
+    return np.bincount(codigos, weights=montos, minlength=n), np.bincount(codigos, minlength=n)
+
+
+class ResumenWrapped:
+    """
+    Acumuladores por comercio, categoría, día y día de la semana calculados en una
+    sola pasada sobre las transacciones de un usuario.
+    Todos los grupos quedan en orden de primera aparición, que es el mismo orden
+    en el que los recorrían los defaultdict, así los desempates no cambian.
+    """
+
+    def __init__(self, transactions):
+        montos, (self.dia_cod, self.dias), (self.comercio_cod, self.comercios), (self.giro_cod, self.giros) = \
+            _columnas_factorizadas(transactions)
+        self.n = len(montos)
+        self.montos = montos
+        self.total = sum(montos.tolist())
+
+        # --- Por comercio ---
+        self.comercio_total, self.comercio_count = _sumas(self.comercio_cod, montos, len(self.comercios))
+
+        # --- Por categoría ---
+        self.giro_total, self.giro_count = _sumas(self.giro_cod, montos, len(self.giros))
+
+        # Categoría de la última transacción de cada comercio
+        _, ultimos = np.unique(self.comercio_cod[::-1], return_index=True)
+        self.comercio_giro = self.giros[self.giro_cod[self.n - 1 - ultimos]] if self.n else self.giros
+
+        # --- Por día (tal como viene la fecha en la transacción) ---
+        self.dia_total, self.dia_count = _sumas(self.dia_cod, montos, len(self.dias))
+
+        # --- Por día calendario y día de la semana (solo fechas válidas) ---
+        fila_dia = getattr(transactions, "dias", None)
+        if fila_dia is None:
+            parseadas = parse_dias(self.dias)
+            fila_dia = parseadas[self.dia_cod] if self.n else parseadas
+        self.validas = ~np.isnat(fila_dia)
+        dias_validos = fila_dia[self.validas].astype(np.int64)
+        montos_validos = montos[self.validas]
+
+        cal_cod, _ = pd.factorize(dias_validos)
+        self.dia_calendario_total = np.bincount(cal_cod, weights=montos_validos) if len(cal_cod) else np.zeros(0)
+
+        self.dia_semana = dia_semana(fila_dia[self.validas])
+        self.montos_validos = montos_validos
+
+    # --- Consultas usadas por los slides ---
+
+    def top_comercios(self, top_n):
+        orden = np.argsort(-self.comercio_count, kind="stable")[:top_n]
+        return [
+            (self.comercios[i], int(self.comercio_count[i]), float(self.comercio_total[i]), self.comercio_giro[i])
+            for i in orden
+        ]
+
+    def top_categorias(self, top_n):
+        orden = np.argsort(-self.giro_count, kind="stable")[:top_n]
+        return [(self.giros[i], int(self.giro_count[i]), float(self.giro_total[i])) for i in orden]
+
+    def dia_mayor_gasto(self):
+        """
+        Regresa (fecha, total, [(comercio, monto), ...]) del día con mayor gasto.
+        Los comercios de ese día quedan en orden de primera aparición.
+        """
+        k = int(np.argmax(self.dia_total))
+        filas = self.dia_cod == k
+        cod, unicos = pd.factorize(self.comercio_cod[filas])
+        totales = np.bincount(cod, weights=self.montos[filas])
+        comercios = [(self.comercios[c], float(a)) for c, a in zip(unicos, totales)]
+        return self.dias[k], float(self.dia_total[k]), comercios
+
+    def promedios_dia_semana(self):
+        """
+        Lista de (dia_semana, promedio) en orden de primera aparición.
+        """
+        dias, primeros = np.unique(self.dia_semana, return_index=True)
+        resultado = []
+        for dia in dias[np.argsort(primeros)]:
+            montos = self.montos_validos[self.dia_semana == dia].tolist()
+            resultado.append((int(dia), sum(montos) / len(montos)))
+        return resultado
+
+    def promedio_diario(self):
+        if not len(self.dia_calendario_total):
+            return 0.0
+        return sum(self.dia_calendario_total.tolist()) / len(self.dia_calendario_total)
+
+
+def resumen_wrapped(transactions):
+    """
+    Regresa el ResumenWrapped de las transacciones (o el mismo resumen si ya lo es).
+    """
+    if isinstance(transactions, ResumenWrapped):
+        return transactions
+    return ResumenWrapped(transactions)
@@ -0,0 +1,165 @@
+import os
+import threading
+import pandas as pd
+from src.past.clientes import get_directorio_clientes
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TRANSACCIONES_PATH = os.path.abspath(os.path.join(BASE_DIR, "../../data/base_transacciones_final.csv"))
+CLIENTES_PATH = os.path.abspath(os.path.join(BASE_DIR, "../../data/base_clientes_final.csv"))
+
+
+def _agrupar(df, llaves, columna):
+    """
+    Regresa {(year, state_id): Series columna -> monto} para la combinación de llaves dada.
+    """
+    if not llaves:
+        return {(None, None): df.groupby(columna)["monto"].sum()}
+
+    resultado = {}
+    nivel = llaves[0] if len(llaves) == 1 else llaves
+    for valores, grupo in df.groupby(llaves + [columna])["monto"].sum().groupby(level=nivel):
+        valores = tuple(int(v) for v in valores) if isinstance(valores, tuple) else (int(valores),)
+        filtro = dict(zip(llaves, valores))
+        key = (filtro.get("year"), filtro.get("state_id"))
+        resultado[key] = grupo.droplevel(llaves)
+    return resultado
+
+
+class Rollups:
+    """
+    Totales mensuales y por categoría materializados en memoria, en sus variantes
+    global, por año, por estado y por año + estado.
+    """
+
+    def __init__(self, df):
+        self.mensual = {}
+        self.categorias = {}
+        for llaves in ([], ["year"], ["state_id"], ["year", "state_id"]):
+            self.mensual.update(_agrupar(df, llaves, "month"))
+            categorias = _agrupar(df, llaves, "giro_comercio")
+            for key, serie in categorias.items():
+                self.categorias[key] = serie.sort_values(ascending=False)
+
+    def agregar(self, df):
+        """
+        Suma un lote de transacciones nuevas (mismas columnas que _leer) sin recalcular todo:
+        solo se tocan las combinaciones (año, estado) que aparecen en el lote.
+        """
+        for llaves in ([], ["year"], ["state_id"], ["year", "state_id"]):
+            for key, serie in _agrupar(df, llaves, "month").items():
+                actual = self.mensual.get(key)
+                self.mensual[key] = serie if actual is None else actual.add(serie, fill_value=0)
+            for key, serie in _agrupar(df, llaves, "giro_comercio").items():
+                actual = self.categorias.get(key)
+                total = serie if actual is None else actual.add(serie, fill_value=0)
+                self.categorias[key] = total.sort_values(ascending=False)
+
+    def monthly(self, year=None, state_id=None):
+        return self.mensual.get((year, state_id))
+
+    def by_category(self, year=None, state_id=None, top_n=10):
+        serie = self.categorias.get((year, state_id))
+        return None if serie is None else serie.head(top_n)
+
+
+def _leer(transacciones_path, clientes_path):
+    df = pd.read_csv(transacciones_path, usecols=["id", "fecha", "giro_comercio", "monto"])
+    return _preparar(df, clientes_path)
+
+
+def _preparar(df, clientes_path):
+    df = df[["id", "fecha", "giro_comercio", "monto"]].copy()
+    fechas = pd.to_datetime(df["fecha"], format="%Y-%m-%d")
+    df["month"] = fechas.dt.month
+    df["year"] = fechas.dt.year
+
+    directorio = get_directorio_clientes(clientes_path)
+    df["state_id"] = directorio.estado_ids(df["id"]) if directorio is not None else -1
+    return df
+
+
+def _firma(*paths):
+    firma = []
+    for path in paths:
+        if os.path.exists(path):
+            st = os.stat(path)
+            firma.append((st.st_mtime_ns, st.st_size))
+        else:
+            firma.append(None)
+    return tuple(firma)
+
+
+_rollups = None
+_firma_rollups = None
+_lock = threading.Lock()
+
+
+def get_rollups(transacciones_path=TRANSACCIONES_PATH, clientes_path=CLIENTES_PATH):
+    """
+    Regresa los rollups, recalculándolos solo si alguno de los CSV cambió (mtime/tamaño).
+    Regresa None si no existe el CSV de transacciones.
+    """
+    global _rollups, _firma_rollups
+    firma = _firma(transacciones_path, clientes_path)
+    if firma[0] is None:
+        return None
+    if _rollups is not None and firma == _firma_rollups:
+        return _rollups
+
+    with _lock:
+        if _rollups is None or firma != _firma_rollups:
+            try:
+                _rollups = Rollups(_leer(transacciones_path, clientes_path))
+                _firma_rollups = firma
+            except Exception as e:
+                print(f"Error reading CSV file: {e}")
+                return None
+    return _rollups
+
+
+def rollups_vigentes(transacciones_path=TRANSACCIONES_PATH, clientes_path=CLIENTES_PATH):
+    """
+    Los rollups en memoria si están al día con los CSV; None si hay que (re)calcularlos.
+    No lee nada más que la firma de los archivos.
+    """
+    if _rollups is not None and _firma(transacciones_path, clientes_path) == _firma_rollups:
+        return _rollups
+    return None
+
+
+def construir_rollups(transacciones_path=TRANSACCIONES_PATH, clientes_path=CLIENTES_PATH):
+    """
+    Calcula los rollups sin instalarlos (para correr en otro proceso, ver src/ejecucion.py).
+    Regresa (rollups, firma) o (None, firma) si no existe el CSV de transacciones.
+    """
+    firma = _firma(transacciones_path, clientes_path)
+    if firma[0] is None:
+        return None, firma
+    return Rollups(_leer(transacciones_path, clientes_path)), firma
+
+
+def instalar_rollups(rollups, firma, transacciones_path=TRANSACCIONES_PATH, clientes_path=CLIENTES_PATH):
+    """
+    Instala rollups calculados con construir_rollups, salvo que los CSV hayan cambiado mientras
+    tanto. Regresa los rollups vigentes.
+    """
+    global _rollups, _firma_rollups
+    with _lock:
+        if rollups is not None and firma == _firma(transacciones_path, clientes_path):
+            _rollups, _firma_rollups = rollups, firma
+    return rollups
+
+
+def agregar_a_rollups(df, firma_anterior, transacciones_path=TRANSACCIONES_PATH, clientes_path=CLIENTES_PATH):
+    """
+    Actualiza los rollups en memoria con un lote recién anexado al CSV.
+    firma_anterior es la firma de los CSV antes de anexar el lote: si los rollups cargados
+    no corresponden a ella no se tocan (se recalcularán completos la próxima vez).
+    """
+    global _firma_rollups
+    with _lock:
+        if _rollups is None or _firma_rollups != firma_anterior:
+            return False
+        _rollups.agregar(_preparar(df, clientes_path))
+        _firma_rollups = _firma(transacciones_path, clientes_path)
+        return True
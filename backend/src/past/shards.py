@@ -0,0 +1,252 @@
+# Construcción en paralelo y por bloques del store columnar y del índice de tiendas,
+# para CSV de transacciones más grandes que la memoria.
+# Uso (desde backend/): python -m src.past.shards --procesos 8
+import io
+import os
+import time
+import shutil
+import argparse
+import resource
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src.past.store import STORE_DIR, VOCABULARIOS, _escribir_segmento, nombre_segmento, bloqueo_manifest, leer_manifest, publicar_manifest
+from src.past.tiendas import IndiceTiendas, TRANSACCIONES_PATH, INDICE_PATH
+
+# Bytes del CSV que lee cada worker de una vez (el pico de memoria depende de esto, no del archivo)
+BLOQUE_BYTES = 64 * 1024 * 1024
+# Bytes de CSV por partición: cada partición se arma completa en memoria al escribir su segmento
+PARTICION_BYTES = 256 * 1024 * 1024
+
+TIPOS_CSV = {"id": str, "fecha": str, "comercio": str, "giro_comercio": str, "tipo_venta": str}
+
+
+def _pico_memoria_mb():
+    # ru_maxrss está en KB en Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _rangos(csv_path, n):
+    """
+    Parte el archivo (sin el encabezado) en n rangos de bytes. Cada rango se queda con
+    las líneas que empiezan dentro de él.
+    """
+    with open(csv_path, "rb") as f:
+        inicio = len(f.readline())
+    size = os.path.getsize(csv_path)
+    cortes = np.linspace(inicio, size, n + 1).astype(np.int64).tolist()
+    return [(a, b) for a, b in zip(cortes[:-1], cortes[1:]) if b > a]
+
+
+def _leer_rango(csv_path, a, b, encabezado, bloque_bytes):
+    """
+    Genera DataFrames con las líneas que empiezan en [a, b), leyendo de a bloque_bytes.
+    """
+    with open(csv_path, "rb") as f:
+        if a > 0:
+            # La línea que cruza `a` es del rango anterior
+            f.seek(a - 1)
+            f.readline()
+        while f.tell() < b:
+            datos = f.read(min(bloque_bytes, b - f.tell()))
+            if not datos.endswith(b"\n"):
+                datos += f.readline()
+            yield pd.read_csv(io.BytesIO(datos), header=None, names=encabezado, dtype=TIPOS_CSV)
+
+
+def _particion(ids, particiones):
+    # Hash estable entre procesos (hash() de Python cambia en cada proceso)
+    return (pd.util.hash_pandas_object(ids, index=False).to_numpy() % particiones).astype(np.int64)
+
+
+def _repartir(csv_path, rango, w, encabezado, particiones, tmp_dir, bloque_bytes):
+    """
+    Fase 1 (un worker por rango): lee el rango por bloques y escribe cada bloque repartido
+    por hash del usuario en tmp_dir/p<particion>/. Regresa los valores distintos de cada
+    columna con vocabulario, en orden de aparición, para armar el vocabulario global.
+    """
+    vistos = {col: {} for col in VOCABULARIOS}
+    filas = 0
+    for c, df in enumerate(_leer_rango(csv_path, rango[0], rango[1], encabezado, bloque_bytes)):
+        filas += len(df)
+        for col in VOCABULARIOS:
+            vistos[col].update(dict.fromkeys(pd.unique(df[col].fillna(""))))
+
+        df["id"] = df["id"].str.strip()
+        destino = _particion(df["id"], particiones)
+        for p, grupo in df.groupby(destino, sort=False):
+            # Los nombres ordenan por rango y bloque: al leerlos se conserva el orden del CSV
+            grupo.to_pickle(os.path.join(tmp_dir, f"p{p:05d}", f"w{w:05d}-c{c:06d}.pkl"))
+
+    return {
+        "filas": filas,
+        "valores": {col: list(v) for col, v in vistos.items()},
+        "pico_memoria_mb": _pico_memoria_mb(),
+    }
+
+
+def _escribir_particion(p, tmp_dir, store_dir, vocab, version):
+    """
+    Fase 2 (un worker por partición): junta los bloques de la partición en orden,
+    escribe su segmento del store y calcula su parte del índice de tiendas.
+    Como cada usuario vive en una sola partición, visitas, montos y usuarios únicos
+    por tienda se suman entre particiones sin contar a nadie dos veces.
+    """
+    carpeta = os.path.join(tmp_dir, f"p{p:05d}")
+    partes = [pd.read_pickle(os.path.join(carpeta, nombre)) for nombre in sorted(os.listdir(carpeta))]
+    if not partes:
+        return None
+    df = pd.concat(partes, ignore_index=True)
+    del partes
+
+    # Carpeta nueva por construcción: el store publicado sigue intacto hasta cambiar el manifest
+    segmento = nombre_segmento(version, p)
+    info = _escribir_segmento(df, vocab, os.path.join(store_dir, segmento))
+    info["nombre"] = segmento
+    info["particion"] = p
+
+    n = len(vocab["comercio"])
+    comercio = pd.Index(vocab["comercio"]).get_indexer(df["comercio"].fillna(""))
+    usuario, usuarios = pd.factorize(df["id"])
+    monto = pd.to_numeric(df["monto"], errors="coerce").fillna(0.0).to_numpy()
+    return {
+        "info": info,
+        "visitas": np.bincount(comercio, minlength=n),
+        "monto_total": np.bincount(comercio, weights=monto, minlength=n),
+        "pares": np.unique((comercio.astype(np.int64) << 32) | usuario),
+        "usuarios": usuarios.tolist(),
+        "pico_memoria_mb": _pico_memoria_mb(),
+    }
+
+
+def _indice_tiendas(partes, vocab, offset, encabezado):
+    """
+    Une las partes por partición en un solo IndiceTiendas (el mismo formato que usa
+    get_indice_tiendas, que después lo sigue actualizando con las filas nuevas del CSV).
+    """
+    indice = IndiceTiendas()
+    indice.comercios = {c: i for i, c in enumerate(vocab["comercio"])}
+    n = len(indice.comercios)
+    indice.visitas = np.zeros(n, dtype=np.int64)
+    indice.monto_total = np.zeros(n, dtype=np.float64)
+    pares = []
+    usuarios = []
+    for parte in partes:
+        indice.visitas += parte["visitas"]
+        indice.monto_total += parte["monto_total"]
+        desplazamiento = len(usuarios)
+        pares.append(((parte["pares"] >> 32) << 32) | ((parte["pares"] & 0xFFFFFFFF) + desplazamiento))
+        usuarios.extend(parte["usuarios"])
+    indice.usuarios = {u: i for i, u in enumerate(usuarios)}
+    indice.pares = np.sort(np.concatenate(pares)) if pares else np.zeros(0, dtype=np.int64)
+    indice.usuarios_unicos = np.bincount(indice.pares >> 32, minlength=n)
+    indice.offset = offset
+    indice.encabezado = encabezado
+    return indice
+
+
+def construir_shards(csv_path=TRANSACCIONES_PATH, store_dir=STORE_DIR, indice_path=INDICE_PATH,
+                     procesos=None, particiones=None, bloque_bytes=BLOQUE_BYTES):
+    """
+    Construye el store columnar (un segmento por partición de usuarios) y el índice de
+    tiendas leyendo el CSV por bloques en un pool de procesos:
+    1. Cada worker lee un rango de bytes del CSV y reparte sus filas por hash del usuario
+       en archivos temporales.
+    2. Cada worker toma una partición, la escribe como segmento del store y calcula su
+       parte del índice de tiendas.
+    La memoria de cada worker depende de bloque_bytes y del tamaño de una partición,
+    no del tamaño del CSV. Reemplaza el store anterior en store_dir sin tocar sus segmentos
+    hasta que el manifest nuevo está publicado.
+    """
+    inicio = time.time()
+    version = str(time.time_ns())
+    procesos = procesos or os.cpu_count() or 1
+    size = os.path.getsize(csv_path)
+    particiones = particiones or max(procesos, -(-size // PARTICION_BYTES))
+
+    with open(csv_path, "r", encoding="utf-8") as f:
+        encabezado = [c.strip() for c in f.readline().split(",")]
+
+    os.makedirs(store_dir, exist_ok=True)
+    tmp_dir = os.path.join(store_dir, "tmp-shards")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    for p in range(particiones):
+        os.makedirs(os.path.join(tmp_dir, f"p{p:05d}"))
+
+    try:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            # Más rangos que procesos para repartir mejor la carga
+            rangos = _rangos(csv_path, procesos * 4)
+            repartos = list(pool.map(
+                _repartir,
+                [csv_path] * len(rangos), rangos, range(len(rangos)), [encabezado] * len(rangos),
+                [particiones] * len(rangos), [tmp_dir] * len(rangos), [bloque_bytes] * len(rangos),
+            ))
+            fin_reparto = time.time()
+
+            # Vocabulario global en orden de aparición en el CSV, igual que build_transaction_store
+            vocab = {}
+            for col, nombre in VOCABULARIOS.items():
+                valores = {}
+                for r in repartos:
+                    valores.update(dict.fromkeys(r["valores"][col]))
+                vocab[nombre] = list(valores)
+
+            partes = [parte for parte in pool.map(
+                _escribir_particion,
+                range(particiones), [tmp_dir] * particiones, [store_dir] * particiones, [vocab] * particiones,
+                [version] * particiones,
+            ) if parte is not None]
+    except BaseException:
+        # Construcción fallida: se quitan sus segmentos a medias; el store publicado no cambia
+        for p in range(particiones):
+            shutil.rmtree(os.path.join(store_dir, nombre_segmento(version, p)), ignore_errors=True)
+        raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    manifest = {
+        "version": version,
+        "particiones": particiones,
+        "segmentos": [parte["info"] for parte in partes],
+        "vocab": vocab,
+    }
+    # Los segmentos del store anterior (incluidos los delta de la ingesta) quedan retirados
+    with bloqueo_manifest(store_dir):
+        publicar_manifest(store_dir, manifest, leer_manifest(store_dir))
+
+    indice = _indice_tiendas(partes, vocab, size, encabezado)
+    indice.guardar(indice_path, reemplazar=True)
+
+    fin = time.time()
+    filas = sum(r["filas"] for r in repartos)
+    reporte = {
+        "filas": filas,
+        "usuarios": sum(parte["info"]["usuarios"] for parte in partes),
+        "tiendas": len(indice.comercios),
+        "procesos": procesos,
+        "particiones": particiones,
+        "segundos": round(fin - inicio, 3),
+        "segundos_reparto": round(fin_reparto - inicio, 3),
+        "filas_por_segundo": round(filas / (fin - inicio), 1) if fin > inicio else None,
+        "pico_memoria_mb": {
+            "principal": _pico_memoria_mb(),
+            "worker": max([r["pico_memoria_mb"] for r in repartos] + [p["pico_memoria_mb"] for p in partes]),
+        },
+    }
+    print(f"Store de {reporte['usuarios']} usuarios en {particiones} particiones y índice de "
+          f"{reporte['tiendas']} tiendas: {filas} filas en {reporte['segundos']}s "
+          f"({reporte['filas_por_segundo']} filas/s, pico {reporte['pico_memoria_mb']['worker']} MB por worker)")
+    return reporte
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construye el store y el índice de tiendas por bloques y en paralelo")
+    parser.add_argument("--csv", default=TRANSACCIONES_PATH)
+    parser.add_argument("--store", default=STORE_DIR)
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--particiones", type=int, default=None)
+    parser.add_argument("--bloque-mb", type=int, default=BLOQUE_BYTES // (1024 * 1024))
+    args = parser.parse_args()
+    construir_shards(args.csv, args.store, os.path.join(args.store, os.path.basename(INDICE_PATH)),
+                     args.procesos, args.particiones, args.bloque_mb * 1024 * 1024)
@@ -0,0 +1,204 @@
+# Snapshots del Wrapped: las slides del pasado (wrapped.py y frequency.py) de toda la base
+# de clientes, precalculadas en SQLite por (usuario, año).
+# Uso (desde backend/): python -m src.past.snapshots --anio 2022 --procesos 8
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from multiprocessing import Pool
+from src.past.read import get_data_version
+from src.past.usuarios import datos_usuario, usuarios_cache
+from src.past.clientes import get_directorio_clientes, CLIENTES_PATH
+from src.past.wrapped import topCommerce, favoriteCommerce, dayMoreSpent, favoriteCategory, annual_summary, yearly_total_spent
+from src.past.frequency import analizar_gastos_usuario, promedio_gasto_diario
+from src.past.suscripciones import get_suscripciones_precalculadas
+from src.future.precalculo import firma_archivo
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOTS_PATH = os.path.abspath(os.path.join(BASE_DIR, "../../data/store/snapshots.sqlite"))
+# Cambiarla cuando cambie el cálculo de alguna slide: invalida todos los snapshots
+VERSION_SLIDES = "1"
+
+
+def suscripciones(user_id, year):
+    # Primero la tabla precalculada (python -m src.past.suscripciones <year>), si no, en vivo
+    precalculadas = get_suscripciones_precalculadas(user_id, year)
+    if precalculadas is not None:
+        return precalculadas
+    return datos_usuario(user_id).derivado("suscripciones", year, analizar_gastos_usuario)
+
+
+def _top5_suscripciones(user_id, year):
+    ordenado = sorted(suscripciones(user_id, year).items(), key=lambda item: item[1]["promedio_monto"], reverse=True)
+    return dict(ordenado[:5])
+
+
+# Slides del pasado: nombre -> función(user_id, year). Todas salen de los mismos
+# DatosUsuario (una sola carga de transacciones y un solo resumen por año).
+SLIDES_PASADO = {
+    "top_commerce": lambda u, y: topCommerce(datos_usuario(u).resumen(y)),
+    "favorite_commerce": lambda u, y: favoriteCommerce(datos_usuario(u).resumen(y)),
+    "day_more_spent": lambda u, y: dayMoreSpent(datos_usuario(u).resumen(y)),
+    "favorite_category": lambda u, y: favoriteCategory(datos_usuario(u).resumen(y), yearly_total_spent(datos_usuario(u).resumen(y))),
+    "average_spending_daily": lambda u, y: promedio_gasto_diario(datos_usuario(u).resumen(y)),
+    "annual_summary": lambda u, y: annual_summary(datos_usuario(u).resumen(y)),
+    "subscriptions": _top5_suscripciones,
+}
+
+
+def calcular_slides(user_id, year, slides=SLIDES_PASADO):
+    """
+    Corre las slides indicadas. Una slide que falla no tumba a las demás: queda como
+    {"error": ...} y su nombre en la lista de errores.
+    """
+    resultado = {}
+    errores = []
+    for nombre, slide in slides.items():
+        try:
+            resultado[nombre] = slide(user_id, year)
+        except Exception as e:
+            resultado[nombre] = {"error": str(e)}
+            errores.append(nombre)
+    return resultado, errores
+
+
+# --- Batch para toda la base de clientes ---
+
+def _calcular_lote(args):
+    ids, anio = args
+    filas = []
+    for u in ids:
+        slides, errores = calcular_slides(u, anio)
+        filas.append((
+            u, anio, str(get_data_version(u)),
+            json.dumps(slides, ensure_ascii=False),
+            json.dumps(errores),
+        ))
+    # Cada usuario se visita una sola vez: no tiene caso guardarlo en el cache del worker
+    usuarios_cache.clear()
+    return filas
+
+
+def _crear_tablas(con):
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS snapshots (
+            id TEXT NOT NULL,
+            anio INTEGER NOT NULL,
+            version TEXT NOT NULL,
+            slides TEXT NOT NULL,
+            errores TEXT NOT NULL,
+            PRIMARY KEY (id, anio)
+        )
+    """)
+    con.execute("CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT)")
+
+
+def _firma(clientes_path):
+    # Lo que invalida todos los snapshots de un año: el cálculo de las slides y el CSV de clientes
+    return f"{VERSION_SLIDES}-{firma_archivo(clientes_path)}"
+
+
+def construir_snapshots(anio=2022, db_path=SNAPSHOTS_PATH, clientes_path=CLIENTES_PATH,
+                        procesos=None, lote=200, reiniciar=False):
+    """
+    Calcula las slides del pasado de todos los clientes de base_clientes_final.csv en un
+    pool de procesos y las guarda por (id, anio) en SQLite, un commit por lote.
+    Es reanudable: si se interrumpe, la siguiente corrida salta a los clientes que ya
+    tienen snapshot con su versión de datos actual. Regresa clientes, usuarios por segundo
+    y tiempo total.
+    """
+    inicio = time.time()
+    procesos = procesos or os.cpu_count() or 1
+    directorio = get_directorio_clientes(clientes_path)
+    if directorio is None:
+        print(f"No existe el CSV de clientes: {clientes_path}")
+        return None
+    ids = directorio.ids.tolist()
+
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    con = sqlite3.connect(db_path)
+    _crear_tablas(con)
+    firma = _firma(clientes_path)
+    anterior = con.execute("SELECT valor FROM meta WHERE clave = ?", (f"firma_{anio}",)).fetchone()
+    if reiniciar or anterior is None or anterior[0] != firma:
+        con.execute("DELETE FROM snapshots WHERE anio = ?", (anio,))
+        con.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (f"firma_{anio}", firma))
+        con.commit()
+
+    hechos = dict(con.execute("SELECT id, version FROM snapshots WHERE anio = ?", (anio,)).fetchall())
+    pendientes = [u for u in ids if hechos.get(u) != str(get_data_version(u))]
+    saltados = len(ids) - len(pendientes)
+    if saltados:
+        print(f"Reanudando: {saltados} clientes ya tienen snapshot vigente, faltan {len(pendientes)}")
+
+    calculados = 0
+    inicio_calculo = time.time()
+    tareas = [(pendientes[i:i + lote], anio) for i in range(0, len(pendientes), lote)]
+    with Pool(procesos) as pool:
+        for filas in pool.imap_unordered(_calcular_lote, tareas):
+            con.executemany("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)", filas)
+            con.commit()
+            calculados += len(filas)
+            transcurrido = time.time() - inicio_calculo
+            print(f"  {calculados}/{len(pendientes)} clientes ({calculados / transcurrido:.1f} usuarios/s)")
+    con.close()
+
+    duracion = time.time() - inicio
+    calculo = time.time() - inicio_calculo
+    reporte = {
+        "clientes": len(ids),
+        "calculados": calculados,
+        "saltados": saltados,
+        "procesos": procesos,
+        "segundos": round(duracion, 2),
+        "usuarios_por_segundo": round(calculados / calculo, 1) if calculo and calculados else None,
+    }
+    print(f"Snapshots {anio}: {calculados} clientes calculados ({saltados} ya vigentes) en {duracion:.1f}s "
+          f"({reporte['usuarios_por_segundo']} usuarios/s, {procesos} procesos)")
+    return reporte
+
+
+# --- Lectura desde la API ---
+
+_con = None
+_con_lock = threading.Lock()
+
+
+def get_snapshot(user_id, anio, db_path=SNAPSHOTS_PATH, clientes_path=CLIENTES_PATH):
+    """
+    Regresa {"slides": ..., "errores": [...]} precalculado para (usuario, año), o None si no
+    hay snapshot del usuario o es anterior a la versión actual de sus datos.
+    """
+    global _con
+    if not os.path.exists(db_path) or not os.path.exists(clientes_path):
+        return None
+
+    with _con_lock:
+        if _con is None:
+            _con = sqlite3.connect(db_path, check_same_thread=False)
+        try:
+            firma = _con.execute("SELECT valor FROM meta WHERE clave = ?", (f"firma_{anio}",)).fetchone()
+            if firma is None or firma[0] != _firma(clientes_path):
+                return None
+            fila = _con.execute(
+                "SELECT version, slides, errores FROM snapshots WHERE id = ? AND anio = ?", (user_id, anio)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+    if fila is None or fila[0] != str(get_data_version(user_id)):
+        return None
+    return {"slides": json.loads(fila[1]), "errores": json.loads(fila[2])}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precalcula las slides del pasado para todos los clientes")
+    parser.add_argument("--anio", type=int, default=2022)
+    parser.add_argument("--db", default=SNAPSHOTS_PATH)
+    parser.add_argument("--clientes", default=CLIENTES_PATH)
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--lote", type=int, default=200)
+    parser.add_argument("--reiniciar", action="store_true", help="Descarta los snapshots del año y empieza de cero")
+    args = parser.parse_args()
+    construir_snapshots(args.anio, args.db, args.clientes, args.procesos, args.lote, args.reiniciar)
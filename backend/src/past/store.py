@@ -0,0 +1,321 @@
+import os
+import json
+import time
+import shutil
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.abspath(os.path.join(BASE_DIR, "../../data/store"))
+
+# Columnas que se guardan por segmento (nombre de archivo -> dtype en disco)
+COLUMNAS = {
+    "fecha": "datetime64[D]",
+    "monto": "float64",
+    "comercio": "int32",
+    "giro": "int32",
+    "tipo": "int8",
+}
+
+# Segundos que se conserva un segmento que ya no está en el manifest antes de borrarlo: un
+# proceso que leyó el manifest anterior todavía puede estar abriendo sus archivos
+GRACIA_SEGMENTOS = float(os.environ.get("STORE_GRACIA_SEGUNDOS", 600))
+
+# Columna del CSV -> nombre de la columna codificada y de su vocabulario
+VOCABULARIOS = {
+    "comercio": "comercio",
+    "giro_comercio": "giro",
+    "tipo_venta": "tipo",
+}
+
+
+def _codificar(valores, vocab):
+    """
+    Codifica una serie de strings con el vocabulario dado (lista de strings).
+    Los valores nuevos se agregan al final del vocabulario, así los códigos
+    existentes nunca cambian.
+    """
+    indice = {v: i for i, v in enumerate(vocab)}
+    codigos, unicos = pd.factorize(valores.fillna("").astype(str))
+    remap = np.empty(len(unicos), dtype=np.int64)
+    for i, v in enumerate(unicos):
+        if v not in indice:
+            indice[v] = len(vocab)
+            vocab.append(v)
+        remap[i] = indice[v]
+    return remap[codigos]
+
+
+def _escribir_segmento(df, vocab, segment_dir):
+    """
+    Escribe un segmento columnar: un .npy por columna, ordenado por usuario
+    (respetando el orden original dentro de cada usuario) más el índice de offsets.
+    """
+    os.makedirs(segment_dir, exist_ok=True)
+
+    usuarios_cod, usuarios = pd.factorize(df["id"].astype(str).str.strip(), sort=True)
+    orden = np.argsort(usuarios_cod, kind="stable")
+
+    columnas = {
+        "fecha": pd.to_datetime(df["fecha"], format="%Y-%m-%d").to_numpy().astype("datetime64[D]"),
+        "monto": pd.to_numeric(df["monto"], errors="coerce").fillna(0.0).to_numpy(),
+    }
+    for col_csv, nombre in VOCABULARIOS.items():
+        columnas[nombre] = _codificar(df[col_csv], vocab[nombre])
+
+    for nombre, dtype in COLUMNAS.items():
+        np.save(os.path.join(segment_dir, f"{nombre}.npy"), columnas[nombre][orden].astype(dtype))
+
+    conteos = np.bincount(usuarios_cod, minlength=len(usuarios))
+    offsets = np.concatenate([[0], np.cumsum(conteos)]).astype(np.int64)
+    np.save(os.path.join(segment_dir, "usuarios.npy"), np.asarray(usuarios, dtype=str))
+    np.save(os.path.join(segment_dir, "offsets.npy"), offsets)
+
+    return {
+        "filas": int(len(df)),
+        "usuarios": int(len(usuarios)),
+        "fecha_min": str(columnas["fecha"].min()) if len(df) else None,
+        "fecha_max": str(columnas["fecha"].max()) if len(df) else None,
+    }
+
+
+def nombre_segmento(version, i):
+    """
+    Nombre de la carpeta de un segmento. Lleva la versión de la construcción o del lote que
+    lo escribió: nunca se reescribe un segmento que un manifest anterior todavía referencia
+    (los procesos que tienen abierto el store anterior lo leen con mmap).
+    """
+    return f"seg-{version}-{i:05d}"
+
+
+@contextmanager
+def bloqueo_archivo(path):
+    """
+    Lock exclusivo entre procesos (y entre hilos) sobre path. Lo usan los que escriben el
+    manifest del store y el índice de tiendas.
+    """
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def bloqueo_manifest(store_dir):
+    """
+    Se toma para todo el leer-modificar-publicar del manifest: dos ingestas a la vez no
+    pueden partir del mismo manifest y perder el segmento de una de ellas.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    return bloqueo_archivo(os.path.join(store_dir, "manifest.lock"))
+
+
+def leer_manifest(store_dir):
+    path = os.path.join(store_dir, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _escribir_manifest(store_dir, manifest):
+    tmp_path = os.path.join(store_dir, "manifest.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(store_dir, "manifest.json"))
+
+
+def publicar_manifest(store_dir, manifest, anterior=None):
+    """
+    Publica el manifest (con bloqueo_manifest ya tomado) y después borra los segmentos que
+    dejaron de estar en él hace más de GRACIA_SEGMENTOS. Los recién retirados quedan
+    anotados en "retirados" y se borran en alguna publicación posterior: un proceso que
+    leyó el manifest anterior alcanza a abrirlos, y los que ya los tienen abiertos con mmap
+    siguen leyéndolos aunque el archivo desaparezca del directorio.
+    """
+    ahora = time.time()
+    vigentes = {info["nombre"] for info in manifest["segmentos"]}
+    retirados = dict((anterior or {}).get("retirados", {}))
+    retirados.update(manifest.get("retirados", {}))
+    for nombre in os.listdir(store_dir):
+        if nombre.startswith("seg-") and nombre not in vigentes:
+            retirados.setdefault(nombre, ahora)
+    retirados = {
+        nombre: t for nombre, t in retirados.items()
+        if nombre not in vigentes and os.path.exists(os.path.join(store_dir, nombre))
+    }
+    vencidos = [nombre for nombre, t in retirados.items() if ahora - t >= GRACIA_SEGMENTOS]
+    manifest["retirados"] = {nombre: t for nombre, t in retirados.items() if nombre not in vencidos}
+
+    _escribir_manifest(store_dir, manifest)
+    for nombre in vencidos:
+        shutil.rmtree(os.path.join(store_dir, nombre), ignore_errors=True)
+
+
+def build_transaction_store(df_transacciones, store_dir=STORE_DIR):
+    """
+    Construye el store columnar a partir del DataFrame de transacciones
+    (mismas columnas que base_transacciones_final.csv).
+    Reemplaza cualquier store anterior en store_dir: el segmento nuevo se escribe en su
+    propia carpeta y los anteriores se retiran al publicar el manifest (ver publicar_manifest).
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    df_transacciones.columns = df_transacciones.columns.str.strip()
+
+    version = str(time.time_ns())
+    vocab = {nombre: [] for nombre in VOCABULARIOS.values()}
+    segmento = nombre_segmento(version, 0)
+    info = _escribir_segmento(df_transacciones, vocab, os.path.join(store_dir, segmento))
+    info["nombre"] = segmento
+
+    manifest = {
+        "version": version,
+        "segmentos": [info],
+        "vocab": vocab,
+    }
+    with bloqueo_manifest(store_dir):
+        publicar_manifest(store_dir, manifest, leer_manifest(store_dir))
+    return manifest
+
+
+def agregar_segmento(df_transacciones, store_dir=STORE_DIR):
+    """
+    Agrega un lote de transacciones nuevas como un segmento delta del store (append-only).
+    El vocabulario solo crece, así los códigos de los segmentos anteriores siguen valiendo.
+    Cada usuario del lote recibe la nueva versión en `versiones_usuario`; los demás
+    conservan la suya, así solo se invalidan los caches de los usuarios afectados.
+    """
+    df_transacciones.columns = df_transacciones.columns.str.strip()
+    with bloqueo_manifest(store_dir):
+        manifest = leer_manifest(store_dir)
+
+        version = str(time.time_ns())
+        segmento = nombre_segmento(version, len(manifest["segmentos"]))
+        info = _escribir_segmento(df_transacciones, manifest["vocab"], os.path.join(store_dir, segmento))
+        info["nombre"] = segmento
+
+        manifest.setdefault("version_base", manifest["version"])
+        manifest["version"] = version
+        manifest["segmentos"].append(info)
+        versiones = manifest.setdefault("versiones_usuario", {})
+        for u in df_transacciones["id"].astype(str).str.strip().unique().tolist():
+            versiones[u] = version
+        publicar_manifest(store_dir, manifest)
+    return manifest
+
+
+class Segmento:
+    def __init__(self, segment_dir):
+        self.columnas = {
+            nombre: np.load(os.path.join(segment_dir, f"{nombre}.npy"), mmap_mode="r")
+            for nombre in COLUMNAS
+        }
+        self.usuarios = np.load(os.path.join(segment_dir, "usuarios.npy"))
+        self.offsets = np.load(os.path.join(segment_dir, "offsets.npy"))
+        self.indice = {u: i for i, u in enumerate(self.usuarios.tolist())}
+
+    def rango(self, user_id):
+        i = self.indice.get(user_id)
+        if i is None:
+            return None
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+
+class TransactionStore:
+    """
+    Lectura del store columnar. Las columnas se abren con mmap, por lo que
+    el slice de un usuario de un solo segmento no copia memoria.
+    """
+
+    def __init__(self, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest["version"]
+        self.version_base = self.manifest.get("version_base", self.version)
+        self.versiones_usuario = self.manifest.get("versiones_usuario", {})
+        self.vocab = {nombre: np.asarray(v, dtype=object) for nombre, v in self.manifest["vocab"].items()}
+        self.segmentos = [
+            Segmento(os.path.join(store_dir, info["nombre"])) for info in self.manifest["segmentos"]
+        ]
+
+    def version_usuario(self, user_id):
+        """
+        Versión de los datos de un usuario: la del último lote que lo incluyó,
+        o la de la construcción del store si nunca se le agregó nada.
+        """
+        return self.versiones_usuario.get(user_id, self.version_base)
+
+    def __contains__(self, user_id):
+        return any(user_id in seg.indice for seg in self.segmentos)
+
+    def usuarios(self):
+        vistos = {}
+        for seg in self.segmentos:
+            for u in seg.indice:
+                vistos[u] = True
+        return list(vistos)
+
+    def columnas_usuario(self, user_id):
+        """
+        Regresa un dict columna -> array con las filas del usuario, o None si no existe.
+        """
+        partes = []
+        for seg in self.segmentos:
+            r = seg.rango(user_id)
+            if r is not None:
+                partes.append({nombre: col[r[0]:r[1]] for nombre, col in seg.columnas.items()})
+
+        if not partes:
+            return None
+        if len(partes) == 1:
+            return partes[0]
+        return {nombre: np.concatenate([p[nombre] for p in partes]) for nombre in COLUMNAS}
+
+    def decodificar(self, nombre, codigos):
+        return self.vocab[nombre][codigos]
+
+
+_store = None
+_store_mtime = None
+_lock = threading.Lock()
+
+
+def get_store(store_dir=STORE_DIR):
+    """
+    Regresa el store cargado (una sola vez por proceso) o None si no se ha construido.
+    Si el manifest cambia en disco se vuelve a abrir.
+    """
+    global _store, _store_mtime
+    manifest_path = os.path.join(store_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+
+    mtime = os.path.getmtime(manifest_path)
+    with _lock:
+        if _store is None or _store.store_dir != store_dir or _store_mtime != mtime:
+            try:
+                _store = TransactionStore(store_dir)
+            except FileNotFoundError:
+                # Se publicó otro manifest mientras se abría este y sus segmentos ya no están
+                mtime = os.path.getmtime(manifest_path)
+                _store = TransactionStore(store_dir)
+            _store_mtime = mtime
+        return _store
@@ -0,0 +1,193 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+import pandas as pd
+from src.past.store import get_store, STORE_DIR
+from src.past.fechas import clave_mes, clave_semana, dia_mes, dia_semana, rango_anio
+
+SIN_PATRON, MENSUAL, SEMANAL = 0, 1, 2
+TIPOS = {MENSUAL: "mensual", SEMANAL: "semanal"}
+
+
+def _orden_agrupado(grupo, sub):
+    """
+    Orden en el que el detector original recorría las filas: por grupo, dentro de cada
+    grupo por sub-grupo (mes o semana) en orden de primera aparición y luego por fila.
+    Regresa ese orden y el código de cada par (grupo, sub-grupo).
+    """
+    par, _ = pd.factorize(grupo * 1_000_000 + sub)
+    return np.lexsort((np.arange(len(grupo)), par, grupo)), par
+
+
+def _moda(grupo, valor, n_grupos):
+    """
+    Valor más frecuente por grupo (con grupo y valor ya en orden de recorrido).
+    Los empates se resuelven por primera aparición, igual que Counter.most_common(1).
+    """
+    moda = np.full(n_grupos, -1, dtype=np.int64)
+    if not len(grupo):
+        return moda
+    codigo, unicos = pd.factorize(grupo * 64 + valor)
+    conteo = np.bincount(codigo)
+    grupo_cod, valor_cod = unicos // 64, unicos % 64
+    orden = np.lexsort((np.arange(len(unicos)), -conteo, grupo_cod))
+    primero = np.r_[True, grupo_cod[orden][1:] != grupo_cod[orden][:-1]]
+    moda[grupo_cod[orden][primero]] = valor_cod[orden][primero]
+    return moda
+
+
+def _montos_en_moda(grupo, valor, montos, moda, n_grupos):
+    en_moda = valor == moda[grupo]
+    conteo = np.bincount(grupo[en_moda], minlength=n_grupos)
+    suma = np.bincount(grupo[en_moda], weights=montos[en_moda], minlength=n_grupos)
+    return conteo, suma
+
+
+def detectar_recurrentes(grupo, dias, montos, n_grupos=None):
+    """
+    Detector vectorizado de pagos recurrentes.
+    grupo: código por fila (un grupo = un comercio de un usuario), dias: datetime64[D] válidos.
+    Regresa por grupo (tipo, dia_pago, promedio_monto):
+    - mensual: al menos 3 meses distintos y al menos 3 pagos en el día del mes más frecuente.
+    - semanal: si no es mensual, semanas con al menos 3 pagos y al menos 3 de ellos en el día
+      de la semana más frecuente (0=Lunes, 6=Domingo).
+    """
+    grupo = np.asarray(grupo, dtype=np.int64)
+    montos = np.asarray(montos, dtype=np.float64)
+    n_grupos = int(grupo.max()) + 1 if n_grupos is None and len(grupo) else (n_grupos or 0)
+
+    tipo = np.zeros(n_grupos, dtype=np.int8)
+    dia_pago = np.full(n_grupos, -1, dtype=np.int64)
+    promedio = np.zeros(n_grupos, dtype=np.float64)
+    if not len(grupo):
+        return tipo, dia_pago, promedio
+
+    # --- Mensual ---
+    orden, par = _orden_agrupado(grupo, clave_mes(dias))
+    _, primeras = np.unique(par, return_index=True)
+    n_meses = np.bincount(grupo[primeras], minlength=n_grupos)
+
+    g, dia, m = grupo[orden], dia_mes(dias)[orden], montos[orden]
+    moda = _moda(g, dia, n_grupos)
+    conteo, suma = _montos_en_moda(g, dia, m, moda, n_grupos)
+
+    mensual = (n_meses >= 3) & (conteo >= 3)
+    tipo[mensual] = MENSUAL
+    dia_pago[mensual] = moda[mensual]
+    promedio[mensual] = suma[mensual] / conteo[mensual]
+
+    # --- Semanal (solo comercios que no resultaron mensuales) ---
+    orden, par = _orden_agrupado(grupo, clave_semana(dias))
+    semana_valida = np.bincount(par)[par] >= 3
+    orden = orden[semana_valida[orden] & ~mensual[grupo[orden]]]
+
+    g, wd, m = grupo[orden], dia_semana(dias)[orden], montos[orden]
+    moda = _moda(g, wd, n_grupos)
+    conteo, suma = _montos_en_moda(g, wd, m, moda, n_grupos)
+
+    semanal = ~mensual & (conteo >= 3)
+    tipo[semanal] = SEMANAL
+    dia_pago[semanal] = moda[semanal]
+    promedio[semanal] = suma[semanal] / conteo[semanal]
+
+    return tipo, dia_pago, promedio
+
+
+# --- Batch para toda la base de clientes ---
+
+def _tabla_path(year, store_dir):
+    return os.path.join(store_dir, f"suscripciones_{year}.csv")
+
+
+def detectar_suscripciones_batch(year=2022, store_dir=STORE_DIR):
+    """
+    Corre el detector sobre todos los usuarios del store en una sola pasada y guarda
+    la tabla de suscripciones (una fila por usuario-comercio recurrente) para ese año.
+    """
+    inicio = time.time()
+    store = get_store(store_dir)
+    if store is None:
+        print(f"No hay store construido en: {store_dir}")
+        return None
+
+    # Todas las filas agrupadas por usuario, en el mismo orden que columnas_usuario
+    usuarios = store.usuarios()
+    codigo_usuario = {u: i for i, u in enumerate(usuarios)}
+    partes = {"usuario": [], "fecha": [], "monto": [], "comercio": []}
+    for seg in store.segmentos:
+        conteos = np.diff(seg.offsets)
+        codigos = np.array([codigo_usuario[u] for u in seg.usuarios.tolist()], dtype=np.int64)
+        partes["usuario"].append(np.repeat(codigos, conteos))
+        for nombre in ("fecha", "monto", "comercio"):
+            partes[nombre].append(np.asarray(seg.columnas[nombre]))
+    cols = {nombre: np.concatenate(arrays) for nombre, arrays in partes.items()}
+    orden = np.argsort(cols["usuario"], kind="stable")
+
+    ini, fin = rango_anio(year)
+    dias = cols["fecha"][orden]
+    en_anio = (dias >= ini) & (dias < fin)
+    orden = orden[en_anio]
+
+    usuario = cols["usuario"][orden]
+    comercio = cols["comercio"][orden].astype(np.int64)
+    grupo, unicos = pd.factorize(usuario * len(store.vocab["comercio"]) + comercio)
+    tipo, dia_pago, promedio = detectar_recurrentes(grupo, cols["fecha"][orden], cols["monto"][orden], len(unicos))
+
+    encontrados = np.flatnonzero(tipo)
+    grupo_usuario = unicos[encontrados] // len(store.vocab["comercio"])
+    grupo_comercio = unicos[encontrados] % len(store.vocab["comercio"])
+    tabla = pd.DataFrame({
+        "id": np.asarray(usuarios, dtype=object)[grupo_usuario],
+        "comercio": store.decodificar("comercio", grupo_comercio),
+        "tipo": [TIPOS[t] for t in tipo[encontrados].tolist()],
+        "dia_pago": dia_pago[encontrados],
+        "promedio_monto": promedio[encontrados],
+    })
+
+    tabla.to_csv(_tabla_path(year, store_dir), index=False, float_format="%.17g")
+    with open(_tabla_path(year, store_dir) + ".json", "w", encoding="utf-8") as f:
+        json.dump({"version": store.version, "year": year, "usuarios": len(usuarios)}, f)
+
+    duracion = time.time() - inicio
+    print(f"Suscripciones {year}: {len(tabla)} filas para {len(usuarios)} usuarios en {duracion:.2f}s")
+    return tabla
+
+
+_tablas = {}
+
+
+def get_suscripciones_precalculadas(user_id, year, store_dir=STORE_DIR):
+    """
+    Regresa el resultado de analizar_gastos_usuario precalculado para (usuario, año),
+    o None si la tabla es anterior a la versión actual de los datos del usuario.
+    """
+    path = _tabla_path(year, store_dir)
+    store = get_store(store_dir)
+    if store is None or not os.path.exists(path + ".json"):
+        return None
+
+    cache = _tablas.get(year)
+    if cache is None or cache[0] != os.path.getmtime(path + ".json"):
+        with open(path + ".json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        tabla = pd.read_csv(path, float_precision="round_trip", keep_default_na=False, dtype={"id": str, "comercio": str})
+        por_usuario = {}
+        for fila in tabla.itertuples(index=False):
+            por_usuario.setdefault(fila.id, {})[fila.comercio] = {
+                "tipo": fila.tipo,
+                "dia_pago": int(fila.dia_pago),
+                "promedio_monto": float(fila.promedio_monto),
+            }
+        cache = (os.path.getmtime(path + ".json"), meta["version"], por_usuario)
+        _tablas[year] = cache
+
+    if user_id not in store or int(store.version_usuario(user_id)) > int(cache[1]):
+        return None
+    return cache[2].get(user_id, {})
+
+
+if __name__ == "__main__":
+    # python -m src.past.suscripciones 2022
+    detectar_suscripciones_batch(int(sys.argv[1]) if len(sys.argv) > 1 else 2022)
@@ -0,0 +1,187 @@
+import io
+import os
+import threading
+import tempfile
+import json
+import numpy as np
+import pandas as pd
+from src.past.store import bloqueo_archivo
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TRANSACCIONES_PATH = os.path.abspath(os.path.join(BASE_DIR, "../../data/base_transacciones_final.csv"))
+INDICE_PATH = os.path.abspath(os.path.join(BASE_DIR, "../../data/store/tiendas.npz"))
+
+COLUMNAS = ["id", "comercio", "monto"]
+CHUNK_SIZE = 500_000
+
+
+class IndiceTiendas:
+    """
+    Visitas, usuarios únicos y monto total por comercio.
+    Se mantiene el conjunto de pares (comercio, usuario) para que los usuarios
+    únicos sigan siendo exactos cuando se agregan transacciones nuevas.
+    """
+
+    def __init__(self):
+        self.comercios = {}
+        self.usuarios = {}
+        self.visitas = np.zeros(0, dtype=np.int64)
+        self.monto_total = np.zeros(0, dtype=np.float64)
+        self.pares = np.zeros(0, dtype=np.int64)
+        self.usuarios_unicos = np.zeros(0, dtype=np.int64)
+        # Bytes del CSV ya procesados y su encabezado
+        self.offset = 0
+        self.encabezado = None
+
+    def _codigos(self, valores, vocab):
+        codigos, unicos = pd.factorize(valores)
+        remap = np.array([vocab.setdefault(v, len(vocab)) for v in unicos], dtype=np.int64)
+        return remap[codigos]
+
+    def agregar(self, df):
+        """
+        Suma un lote de transacciones (columnas id, comercio, monto) al índice.
+        """
+        if df.empty:
+            return
+        comercio = self._codigos(df["comercio"].astype(str), self.comercios)
+        usuario = self._codigos(df["id"].astype(str).str.strip(), self.usuarios)
+        monto = pd.to_numeric(df["monto"], errors="coerce").fillna(0.0).to_numpy()
+
+        n = len(self.comercios)
+        self.visitas = np.bincount(comercio, minlength=n) + np.pad(self.visitas, (0, n - len(self.visitas)))
+        self.monto_total = np.pad(self.monto_total, (0, n - len(self.monto_total)))
+        np.add.at(self.monto_total, comercio, monto)
+
+        nuevos = np.unique((comercio << 32) | usuario)
+        self.pares = np.union1d(self.pares, nuevos)
+        self.usuarios_unicos = np.bincount(self.pares >> 32, minlength=n)
+
+    def stats(self, tienda):
+        i = self.comercios.get(tienda)
+        if i is None:
+            return None
+        return {
+            "visitas": int(self.visitas[i]),
+            "usuarios_unicos": int(self.usuarios_unicos[i]),
+            "monto_total": round(float(self.monto_total[i]), 2),
+        }
+
+    def guardar(self, path=INDICE_PATH, reemplazar=False):
+        """
+        Escribe el índice en un temporal propio y lo publica con os.replace, con un lock de
+        archivo para que dos procesos no se pisen. Si en disco ya hay uno que procesó más
+        bytes del CSV se deja ese, salvo con reemplazar=True (construcción completa).
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with bloqueo_archivo(path + ".lock"):
+            if not reemplazar and os.path.exists(path) and self.offset < _offset_guardado(path):
+                return False
+            fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.savez_compressed(
+                        f,
+                        comercios=np.asarray(list(self.comercios), dtype=str),
+                        usuarios=np.asarray(list(self.usuarios), dtype=str),
+                        visitas=self.visitas,
+                        monto_total=self.monto_total,
+                        pares=self.pares,
+                        meta=np.asarray(json.dumps({"offset": self.offset, "encabezado": self.encabezado})),
+                    )
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        return True
+
+    @classmethod
+    def cargar(cls, path=INDICE_PATH):
+        indice = cls()
+        with np.load(path) as data:
+            indice.comercios = {c: i for i, c in enumerate(data["comercios"].tolist())}
+            indice.usuarios = {u: i for i, u in enumerate(data["usuarios"].tolist())}
+            indice.visitas = data["visitas"]
+            indice.monto_total = data["monto_total"]
+            indice.pares = data["pares"]
+            meta = json.loads(str(data["meta"]))
+        indice.usuarios_unicos = np.bincount(indice.pares >> 32, minlength=len(indice.comercios))
+        indice.offset = meta["offset"]
+        indice.encabezado = meta["encabezado"]
+        return indice
+
+    def refrescar(self, csv_path=TRANSACCIONES_PATH):
+        """
+        Procesa solo los bytes agregados al CSV desde la última vez.
+        Regresa True si el índice cambió. Si el archivo se hizo más chico se reconstruye.
+        """
+        size = os.path.getsize(csv_path)
+        if size == self.offset:
+            return False
+        if size < self.offset:
+            self.__init__()
+
+        if self.offset == 0:
+            with open(csv_path, "r", encoding="utf-8") as f:
+                self.encabezado = [c.strip() for c in f.readline().split(",")]
+            for chunk in pd.read_csv(csv_path, usecols=COLUMNAS, chunksize=CHUNK_SIZE):
+                self.agregar(chunk)
+            self.offset = size
+            return True
+
+        with open(csv_path, "rb") as f:
+            f.seek(self.offset)
+            cola = f.read(size - self.offset)
+        # Solo líneas completas; una línea a medio escribir se procesa en el siguiente refresco
+        fin = cola.rfind(b"\n") + 1
+        if fin == 0:
+            return False
+        df = pd.read_csv(io.BytesIO(cola[:fin]), header=None, names=self.encabezado, usecols=COLUMNAS)
+        self.agregar(df)
+        self.offset += fin
+        return True
+
+
+def _offset_guardado(path):
+    with np.load(path) as data:
+        return json.loads(str(data["meta"]))["offset"]
+
+
+def build_indice_tiendas(csv_path=TRANSACCIONES_PATH, path=INDICE_PATH):
+    """
+    Construye el índice en una sola pasada (por chunks) sobre el CSV de transacciones y lo guarda.
+    """
+    indice = IndiceTiendas()
+    indice.refrescar(csv_path)
+    indice.guardar(path, reemplazar=True)
+    print(f"Índice de {len(indice.comercios)} tiendas guardado en: {path}")
+    return indice
+
+
+# Un índice por archivo: el de data/store y, por ejemplo, el de un store de prueba
+_indices = {}
+_lock = threading.Lock()
+
+
+def get_indice_tiendas(csv_path=TRANSACCIONES_PATH, path=INDICE_PATH, guardar=False):
+    """
+    Carga el índice una vez por proceso. Si el CSV creció desde la última carga
+    se procesan solo las filas nuevas, en memoria. A disco se escribe solo cuando todavía
+    no existe o desde la ingesta (guardar=True): los workers de los pools no reescriben el
+    archivo en cada refresco.
+    Regresa None si no hay ni índice ni CSV.
+    """
+    with _lock:
+        indice = _indices.get(path)
+        if indice is None:
+            if os.path.exists(path):
+                indice = IndiceTiendas.cargar(path)
+            elif os.path.exists(csv_path):
+                indice = IndiceTiendas()
+            else:
+                return None
+            _indices[path] = indice
+
+        if os.path.exists(csv_path) and indice.refrescar(csv_path) and (guardar or not os.path.exists(path)):
+            indice.guardar(path)
+        return indice
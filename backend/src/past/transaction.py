@@ -1,3 +1,9 @@
+import numpy as np
+import pandas as pd
+from src.past.fechas import parse_dias, anio, rango_anio, rango_mes
+from src.past.columnas import ColumnaCodificada, Tabla, Fila, campo
+
+
 class Transaction:
     def __init__(self, id, date, merchant, merchant_category, sale_type, amount):
         self.id = id
@@ -5,8 +11,194 @@ class Transaction:
         self.merchant = merchant
         self.merchant_category = merchant_category
         self.sale_type = sale_type
-        self.amount = float(amount) if amount != "" else 0.0 
+        self.amount = float(amount) if amount != "" else 0.0
+
+    def __repr__(self):
+        return (f"Transaction(id={self.id}, date={self.date}, "
+                f"merchant={self.merchant}, amount={self.amount})")
+
+
+class _FiltrosFecha:
+    """
+    Filtros por año/mes compartidos por TransactionList y TransactionBatch.
+    Usan búsqueda binaria sobre las fechas ordenadas (`dias`) y regresan
+    las filas en su orden original con `tomar`.
+    """
+
+    def _ordenar(self):
+        dias = self.dias
+        if self._orden is None:
+            if not np.isnat(dias).any() and not (dias[1:] < dias[:-1]).any():
+                self._orden = np.arange(len(dias))
+                self._dias_ordenados = dias
+            else:
+                self._orden = np.argsort(dias, kind="stable")
+                self._dias_ordenados = dias[self._orden]
+        return self._orden, self._dias_ordenados
+
+    def _indices_rango(self, inicio, fin):
+        orden, dias = self._ordenar()
+        lo, hi = np.searchsorted(dias, [inicio, fin])
+        return orden[lo:hi]
+
+    def del_anio(self, year):
+        return self.tomar(self._indices_rango(*rango_anio(year)))
+
+    def del_mes(self, month):
+        """
+        Transacciones de ese mes en cualquier año.
+        """
+        _, dias = self._ordenar()
+        validos = dias[~np.isnat(dias)]
+        if not len(validos):
+            return self.tomar(np.zeros(0, dtype=np.int64))
+        anios = range(int(anio(validos[:1])[0]), int(anio(validos[-1:])[0]) + 1)
+        partes = [self._indices_rango(*rango_mes(y, month)) for y in anios]
+        return self.tomar(np.concatenate(partes))
+
+
+class TransactionList(_FiltrosFecha, list):
+    """
+    Lista de Transaction que además guarda sus fechas como datetime64[D].
+    Las fechas se parsean una sola vez y los filtros por año/mes usan búsqueda
+    binaria sobre las fechas ordenadas, regresando las filas en su orden original.
+    """
+
+    def __init__(self, transactions=(), dias=None):
+        super().__init__(transactions)
+        self._dias = dias
+        self._orden = None
+        self._dias_ordenados = None
+
+    @property
+    def dias(self):
+        if self._dias is None or len(self._dias) != len(self):
+            self._dias = parse_dias([t.date for t in self])
+            self._orden = None
+        return self._dias
+
+    def tomar(self, indices):
+        indices = np.sort(indices)
+        return TransactionList([self[i] for i in indices.tolist()], dias=self.dias[indices])
+
+    def columna(self, nombre):
+        """
+        Valores de un atributo de Transaction para todas las filas, como arreglo de NumPy.
+        """
+        dtype = np.float64 if nombre == "amount" else object
+        return np.array([getattr(t, nombre) for t in self], dtype=dtype)
+
+
+class TransactionRow(Fila):
+    """
+    Vista de una fila de TransactionBatch con los mismos atributos que Transaction.
+    """
+
+    __slots__ = ()
+
+    id = campo("id")
+    date = campo("date")
+    merchant = campo("merchant")
+    merchant_category = campo("merchant_category")
+    sale_type = campo("sale_type")
+    amount = campo("amount")
 
     def __repr__(self):
         return (f"Transaction(id={self.id}, date={self.date}, "
-                f"merchant={self.merchant}, amount={self.amount})")
\ No newline at end of file
+                f"merchant={self.merchant}, amount={self.amount})")
+
+
+class TransactionBatch(_FiltrosFecha, Tabla):
+    """
+    Transacciones guardadas como columnas: los strings (id, fecha, comercio, giro y tipo
+    de venta) codificados como diccionario y los montos en un arreglo float64.
+    Se puede iterar como lista de Transaction (vistas TransactionRow) y filtrar por año/mes
+    igual que TransactionList.
+    """
+
+    Fila = TransactionRow
+    CAMPOS = ("id", "date", "merchant", "merchant_category", "sale_type", "amount")
+
+    def __init__(self, columnas, dias=None):
+        super().__init__(columnas)
+        self._dias = dias
+        self._orden = None
+        self._dias_ordenados = None
+
+    def __repr__(self):
+        return f"<TransactionBatch {len(self)} transacciones>"
+
+    @classmethod
+    def vacio(cls):
+        columnas = {nombre: ColumnaCodificada.desde_valores([]) for nombre in cls.CAMPOS[:-1]}
+        columnas["amount"] = np.zeros(0, dtype=np.float64)
+        return cls(columnas, dias=np.zeros(0, dtype="datetime64[D]"))
+
+    @classmethod
+    def desde_transacciones(cls, transactions):
+        """
+        Convierte una lista de Transaction (o de vistas de fila).
+        """
+        dias = getattr(transactions, "_dias", None)
+        transactions = list(transactions)
+        columnas = {
+            nombre: ColumnaCodificada.desde_valores([getattr(t, nombre) for t in transactions])
+            for nombre in cls.CAMPOS[:-1]
+        }
+        columnas["amount"] = np.array([t.amount for t in transactions], dtype=np.float64)
+        return cls(columnas, dias=dias if dias is not None and len(dias) == len(transactions) else None)
+
+    @classmethod
+    def desde_registros(cls, registros):
+        """
+        Convierte los dicts de los JSON por usuario (id, fecha, comercio, giro_comercio, tipo_venta, monto).
+        """
+        llaves = ("id", "fecha", "comercio", "giro_comercio", "tipo_venta")
+        columnas = {
+            nombre: ColumnaCodificada.desde_valores([r[llave] for r in registros])
+            for nombre, llave in zip(cls.CAMPOS[:-1], llaves)
+        }
+        columnas["amount"] = np.array(
+            [float(r["monto"]) if r["monto"] != "" else 0.0 for r in registros], dtype=np.float64
+        )
+        return cls(columnas)
+
+    @property
+    def dias(self):
+        if self._dias is None:
+            # Solo se parsean las fechas distintas
+            fechas = self.columnas["date"]
+            self._dias = parse_dias(fechas.vocab)[fechas.codigos]
+        return self._dias
+
+    def subconjunto(self, indices):
+        batch = super().subconjunto(indices)
+        if self._dias is not None:
+            batch._dias = self._dias[indices]
+        return batch
+
+    def tomar(self, indices):
+        return self.subconjunto(np.sort(indices))
+
+    def to_frame(self):
+        """
+        DataFrame con las columnas del CSV de transacciones.
+        """
+        return pd.DataFrame({
+            "id": self.columna("id"),
+            "fecha": self.columna("date"),
+            "comercio": self.columna("merchant"),
+            "giro_comercio": self.columna("merchant_category"),
+            "tipo_venta": self.columna("sale_type"),
+            "monto": self.columna("amount"),
+        })
+
+
+def como_transaction_list(transactions):
+    """
+    Regresa una TransactionList o TransactionBatch tal cual; cualquier otra secuencia
+    de Transaction se envuelve en una TransactionList.
+    """
+    if isinstance(transactions, (TransactionList, TransactionBatch)):
+        return transactions
+    return TransactionList(transactions)
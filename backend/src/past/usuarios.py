@@ -0,0 +1,65 @@
+import os
+from src.cache import LRUCache, singleflight
+from src.past.read import get_transaction, get_transaction_year, get_estado_from_person_id, get_data_version
+from src.past.resumen import resumen_wrapped
+
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 2048))
+
+
+class DatosUsuario:
+    """
+    Transacciones ya parseadas de un usuario y los agregados que se derivan de ellas.
+    Todo lo derivado se calcula al primer uso y se reutiliza entre endpoints.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.version = get_data_version(user_id)
+        self.movements = get_transaction(user_id)
+        self._por_anio = {}
+        self._resumenes = {}
+        self._derivados = {}
+        self._estado = None
+
+    def anio(self, year):
+        if year not in self._por_anio:
+            self._por_anio[year] = get_transaction_year(self.movements, year)
+        return self._por_anio[year]
+
+    def resumen(self, year):
+        # Los sliders piden el mismo resumen a la vez: solo uno lo calcula
+        if year not in self._resumenes:
+            key = ("resumen", self.user_id, year, self.version)
+            self._resumenes[year] = singleflight.hacer(key, lambda: resumen_wrapped(self.anio(year)))
+        return self._resumenes[year]
+
+    def derivado(self, nombre, year, func):
+        """
+        Cachea func(transacciones del año) bajo (nombre, year).
+        """
+        key = (nombre, year)
+        if key not in self._derivados:
+            self._derivados[key] = singleflight.hacer(
+                (nombre, self.user_id, year, self.version), lambda: func(self.anio(year))
+            )
+        return self._derivados[key]
+
+    def estado(self):
+        """
+        Regresa (nombre_estado, coordenadas) o (None, None) si el cliente no existe.
+        """
+        if self._estado is None:
+            self._estado = get_estado_from_person_id(self.user_id) or (None, None)
+        return self._estado
+
+
+usuarios_cache = LRUCache(maxsize=USER_CACHE_SIZE, nombre="usuarios")
+
+
+def datos_usuario(user_id):
+    datos = usuarios_cache.get_or_set(user_id, lambda: DatosUsuario(user_id))
+    # Si otro proceso ingirió transacciones del usuario, la versión ya no coincide
+    if datos.version != get_data_version(user_id):
+        datos = DatosUsuario(user_id)
+        usuarios_cache.set(user_id, datos)
+    return datos
@@ -3,53 +3,43 @@ import datetime
 import json
 import os
 from collections import defaultdict
-from flask import Flask, request, jsonify
 from src.past.read import total_visitas_en_tienda
-import requests
+from src.past.resumen import ResumenWrapped, resumen_wrapped
 from src.future.location import mapeo_categorias
-
-app = Flask(__name__)
+from src.future.places_index import buscar_lugares
+from src.metrics import span, medido, AGGREGATE, EXTERNAL
 
 def yearly_total_spent(transactions):
+    if isinstance(transactions, ResumenWrapped):
+        return round(transactions.total, 2)
     total = sum(t.amount for t in transactions)
     return round(total, 2)
 
+@medido(AGGREGATE)
 def topCommerce(transactions, top_n=5):
-    stats = defaultdict(lambda: {"count": 0, "total": 0.0, "category": None})
-
-    for t in transactions:
-        stats[t.merchant]["count"] += 1
-        stats[t.merchant]["total"] += t.amount
-        stats[t.merchant]["category"] = t.merchant_category  
-
-    sorted_stats = sorted(stats.items(), key=lambda x: x[1]["count"], reverse=True)
+    resumen = resumen_wrapped(transactions)
 
     result = [
         {
             "commerce": merchant,
-            "count": data["count"],
-            "total": round(data["total"], 2),
-            "category": data["category"]
+            "count": count,
+            "total": round(total, 2),
+            "category": category
         }
-        for merchant, data in sorted_stats[:top_n]
+        for merchant, count, total, category in resumen.top_comercios(top_n)
     ]
 
     return result
 
+@medido(AGGREGATE)
 def favoriteCommerce(transacciones_usuario):
-    visitas = defaultdict(int)
-    gastos = defaultdict(float)
-
-    for t in transacciones_usuario:
-        visitas[t.merchant] += 1
-        gastos[t.merchant] += t.amount
+    resumen = resumen_wrapped(transacciones_usuario)
 
-    if not visitas:
+    if not resumen.n:
         return {"error": "El usuario no tiene transacciones registradas."}
 
-    tienda_top = max(visitas.items(), key=lambda x: x[1])[0]
-    visitas_usuario = visitas[tienda_top]
-    gasto_promedio = round(gastos[tienda_top] / visitas_usuario, 2)
+    tienda_top, visitas_usuario, gasto_total, _ = resumen.top_comercios(1)[0]
+    gasto_promedio = round(gasto_total / visitas_usuario, 2)
 
     total_visitas = total_visitas_en_tienda(tienda_top) / 100
     porcentaje_usuario = round(100-(visitas_usuario / total_visitas) * 100,2)
@@ -61,21 +51,15 @@ def favoriteCommerce(transacciones_usuario):
         "gasto_promedio": gasto_promedio
     }
 
+@medido(AGGREGATE)
 def favoriteCategory(transactions, yearly_total_spent):
-    if not transactions:
-        return {"error": "No transactions available."}
+    resumen = resumen_wrapped(transactions)
 
-    stats = defaultdict(lambda: {"count": 0, "total": 0.0})
+    if not resumen.n:
+        return {"error": "No transactions available."}
 
-    for t in transactions:
-        category = t.merchant_category
-        stats[category]["count"] += 1
-        stats[category]["total"] += t.amount
+    favorite_category, count, total_spent = resumen.top_categorias(1)[0]
 
-    favorite_category, data = max(stats.items(), key=lambda x: x[1]["count"])
-    
-    count = data["count"]
-    total_spent = data["total"]
     average_spent = round(total_spent / count, 2) if count > 0 else 0.0
     percentage_spent = round((total_spent / yearly_total_spent) * 100, 2) if yearly_total_spent > 0 else 0.0
 
@@ -87,6 +71,7 @@ def favoriteCategory(transactions, yearly_total_spent):
         "total_spent_in_category": round(total_spent, 2)
     }
 
+@medido(AGGREGATE)
 def topCategories(transactions, top_n=5):
     """
     Returns the top N most frequent merchant categories with total spending.
@@ -98,29 +83,20 @@ def topCategories(transactions, top_n=5):
         ...
     ]
     """
-    stats = defaultdict(lambda: {"count": 0, "total": 0.0})
-
-    for t in transactions:
-        stats[t.merchant_category]["count"] += 1
-        stats[t.merchant_category]["total"] += t.amount
-
-    sorted_stats = sorted(
-        stats.items(),
-        key=lambda x: x[1]["count"],
-        reverse=True
-    )
+    resumen = resumen_wrapped(transactions)
 
     result = [
         {
             "category": category,
-            "count": data["count"],
-            "total": round(data["total"], 2)
+            "count": count,
+            "total": round(total, 2)
         }
-        for category, data in sorted_stats[:top_n]
+        for category, count, total in resumen.top_categorias(top_n)
     ]
 
     return result
 
+@medido(AGGREGATE)
 def dayMoreSpent(transactions):
     """
     Returns the date with the highest total spending and the amount spent that day.
@@ -135,23 +111,15 @@ def dayMoreSpent(transactions):
         ]
     }
     """
-    spending_by_day = defaultdict(float)
-    merchants_by_day = defaultdict(list)
-
-    for t in transactions:
-        spending_by_day[t.date] += t.amount
-        merchants_by_day[t.date].append((t.merchant, t.amount))
+    resumen = resumen_wrapped(transactions)
 
-    if not spending_by_day:
+    if not resumen.n:
         return json.dumps({"date": None, "total": 0.0, "top3_merchants": []}, indent=4)
 
-    max_day, total = max(spending_by_day.items(), key=lambda x: x[1])
+    max_day, total, merchant_totals = resumen.dia_mayor_gasto()
 
     # Calcular top 3 merchants para ese día
-    merchant_totals = defaultdict(float)
-    for merchant, amount in merchants_by_day[max_day]:
-        merchant_totals[merchant] += amount
-    top3 = sorted(merchant_totals.items(), key=lambda x: x[1], reverse=True)[:3]
+    top3 = sorted(merchant_totals, key=lambda x: x[1], reverse=True)[:3]
     top3_merchants = [{"merchant": m, "amount": round(a, 2)} for m, a in top3]
 
     result = [{
@@ -162,42 +130,30 @@ def dayMoreSpent(transactions):
 
     return result
 
+@medido(AGGREGATE)
 def annual_summary(transactions):
-    if not transactions:
-        return {"error": "No transactions recorded."}
+    resumen = resumen_wrapped(transactions)
 
-    total_spent = sum(t.amount for t in transactions)
-    transaction_days = {t.date for t in transactions}
-    total_transactions = len(transactions)
-    unique_merchants = {t.merchant for t in transactions}
+    if not resumen.n:
+        return {"error": "No transactions recorded."}
 
     return {
-        "total_spent": round(total_spent, 2),
-        "transaction_days_count": len(transaction_days),
-        "total_transactions": total_transactions,
-        "unique_merchants_count": len(unique_merchants)
+        "total_spent": round(resumen.total, 2),
+        "transaction_days_count": len(resumen.dias),
+        "total_transactions": resumen.n,
+        "unique_merchants_count": len(resumen.comercios)
     }
 
 def get_top_places_by_categories(state_name, latitude, longitude, category_ids, radius=10000, limit=3):
-    url = "https://api.foursquare.com/v3/places/search"
-    headers = {
-        "Accept": "application/json",
-        "Authorization": "fsq3jRQ+AaizYAQIJjSe31snrDAUyobhW0O3D+lqZnKzk/Q="  # Tu API key
-    }
+    # Primero el índice local de lugares; la API solo para categorías sin datos (ver src/future/places_index.py)
+    with span(EXTERNAL, "buscar_lugares"):
+        respuestas = buscar_lugares(latitude, longitude, category_ids, radius, limit)
 
     categorias_resultado = []
 
     for category_id in category_ids:
-        params = {
-            "ll": f"{latitude},{longitude}",
-            "radius": radius,
-            "limit": limit,
-            "categories": category_id
-        }
-
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            data = response.json().get("results", [])
+        status_code, data = respuestas[category_id]
+        if status_code == 200:
             places = []
 
             category_name = None
@@ -217,7 +173,7 @@ def get_top_places_by_categories(state_name, latitude, longitude, category_ids,
                 "results": places
             })
         else:
-            print(f"Error con categoría {category_id}: {response.status_code}")
+            print(f"Error con categoría {category_id}: {status_code}")
             categorias_resultado.append({
                 "category": f"Error ({category_id})",
                 "results": []
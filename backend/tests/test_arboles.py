@@ -0,0 +1,80 @@
+# Paridad exacta de los árboles aplanados (src/future/arboles.py) contra sklearn
+import os
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingClassifier, GradientBoostingRegressor
+from src.future.arboles import MODELOS, ParidadArboles, aplanar, entradas_prueba, verificar_paridad
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FILAS = 3000
+
+
+def _datos(n=600, features=5, semilla=0):
+    rng = np.random.default_rng(semilla)
+    # Pocos valores distintos por feature: muchos umbrales compartidos entre árboles
+    X = np.round(rng.normal(size=(n, features)) * 10, 1)
+    return X, X[:, 0] + 0.5 * X[:, 1] * X[:, 2] + rng.normal(size=n)
+
+
+def _modelos_chicos():
+    X, y = _datos()
+    return {
+        "binaria": GradientBoostingClassifier(n_estimators=30, max_depth=3, random_state=0).fit(X, y > 0),
+        "multiclase": GradientBoostingClassifier(n_estimators=20, max_depth=3, random_state=0).fit(
+            X, np.digitize(y, [-5, 0, 5])
+        ),
+        "regresion": GradientBoostingRegressor(n_estimators=30, max_depth=4, random_state=0).fit(X, y),
+    }
+
+
+def _modelos_pkl():
+    modelos = {}
+    for ruta, llaves in MODELOS.items():
+        path = os.path.join(BACKEND_DIR, ruta)
+        if not os.path.exists(path):
+            continue
+        obj = joblib.load(path)
+        for llave in llaves:
+            modelos[f"{os.path.basename(ruta)}:{llave}"] = obj[llave]
+    return modelos
+
+
+def _revisar(modelo):
+    planos = aplanar(modelo, verificar=False)
+    X = entradas_prueba(planos, FILAS, np.random.default_rng(0))
+
+    # Las filas delicadas: exactamente en un umbral y un paso de float32 arriba de él
+    tercio = FILAS // 3
+    umbrales = set(planos.threshold[planos.feature >= 0].tolist())
+    assert all(v in umbrales for v in X[:tercio].ravel().tolist())
+    umbrales32 = set(np.asarray(list(umbrales)).astype(np.float32).tolist())
+    abajo = np.nextafter(X[tercio:2 * tercio].astype(np.float32), np.float32(-np.inf))
+    assert all(v in umbrales32 for v in abajo.ravel().tolist())
+
+    assert np.array_equal(planos.predict(X), modelo.predict(X))
+    if hasattr(modelo, "predict_proba"):
+        assert np.array_equal(planos.predict_proba(X), modelo.predict_proba(X))
+        clases, proba = planos.predict_y_proba(X)
+        assert np.array_equal(clases, modelo.predict(X))
+        assert np.array_equal(proba, modelo.predict_proba(X))
+
+
+@pytest.mark.parametrize("tipo", ["binaria", "multiclase", "regresion"])
+def test_paridad_modelos_chicos(tipo):
+    _revisar(_modelos_chicos()[tipo])
+
+
+@pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+@pytest.mark.parametrize("nombre", sorted(_modelos_pkl()))
+def test_paridad_modelos_entrenados(nombre):
+    _revisar(_modelos_pkl()[nombre])
+
+
+def test_paridad_detecta_diferencias():
+    modelo = _modelos_chicos()["regresion"]
+    planos = aplanar(modelo)
+    # Un ulp en las hojas ya tiene que notarse
+    planos.tabla = np.nextafter(planos.tabla, np.inf)
+    with pytest.raises(ParidadArboles):
+        verificar_paridad(planos, modelo)